@@ -1,10 +1,22 @@
-from flask import Flask, request, redirect, jsonify, json, render_template
+from flask import Flask, request, redirect, jsonify, json, render_template, g, Response
 import time
 import jiosaavn
+import upstream
+import cache
+import catalog
+import metrics
+import singleflight
+import timing
+import typeahead
+import http_cache
+import fast_json
+import projection
+import search_index
 import os
 import logging
 from traceback import print_exc
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
 
 # Configure logging
@@ -14,10 +26,126 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
+# Maximum number of songs per /song/get-multiple/ request
+MAX_SONGS = int(os.environ.get("MAX_SONGS_PER_REQUEST", 5000))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, serializing responses with fast_json (orjson
+    when installed) and reporting serialization as the jsonify phase. Debug
+    mode keeps Flask's indented output."""
+
+    def dumps(self, obj, **kwargs):
+        with timing.phase('jsonify'):
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with timing.phase('jsonify'):
+            body = fast_json.dumps(obj, self.default) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.secret_key = os.environ.get("SECRET", 'jiosaavnapi_agk')
 CORS(app)
 
+@app.before_request
+def reset_cache_state():
+    cache.reset_state()
+
+# Phase timings (timing.py) for SERVER_TIMING=true or ?debug=timing
+@app.before_request
+def start_timing():
+    g.timing_debug = request.args.get('debug') == 'timing'
+    if timing.begin(g.timing_debug):
+        g.timing_start = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    if not timing.active():
+        return response
+    summary = timing.summary(time.perf_counter() - g.timing_start)
+    response.headers['Server-Timing'] = timing.header(summary)
+    if g.timing_debug and response.mimetype == 'application/json' and not response.direct_passthrough:
+        response.set_data(timing.debug_body(response.get_data(), summary))
+    return response
+
+@app.teardown_request
+def end_timing(error=None):
+    timing.end()
+
+# Route metrics use the URL rule, not the path, so the label set stays small
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_start = metrics.request_started(g.metrics_route)
+
+@app.after_request
+def set_metrics_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'metrics_start' in g:
+        metrics.request_finished(g.metrics_route, request.method,
+                                 g.get('metrics_status', 500), g.metrics_start)
+
+# Tell clients whether the answer came from cache (fresh), was served past
+# its TTL while being refreshed (stale) or was fetched for this request
+@app.after_request
+def add_cache_header(response):
+    state = cache.response_state()
+    if state:
+        response.headers['X-Cache'] = state
+    return response
+
+# Serialized responses are cached with their compressed variants (http_cache.py);
+# a hit skips the route and serialization entirely
+@app.before_request
+def serve_cached_response():
+    if g.timing_debug or not http_cache.applies(request.method, 200):
+        return None
+    g.response_key = http_cache.response_key(request.path, request.args.items(multi=True))
+    entry = http_cache.lookup_response(g.response_key)
+    if entry is None:
+        return None
+    g.cached_response = entry
+    cache.note_state('fresh')
+    return Response(entry.body, content_type=entry.content_type)
+
+# ETag, If-None-Match, Cache-Control from the data-type TTLs and compression.
+# Bodies wrapped for ?debug=timing differ on every request and are not cached.
+@app.after_request
+def add_http_cache_headers(response):
+    if response.direct_passthrough:
+        return response
+    if g.get('timing_debug'):
+        if http_cache.applies(request.method, response.status_code):
+            response.headers['Cache-Control'] = http_cache.NO_STORE
+        return response
+    entry = g.get('cached_response')
+    cached = entry is not None
+    if not cached:
+        entry = http_cache.Entry(response.get_data(), response.content_type)
+    status, body, headers = http_cache.respond(
+        request.method, response.status_code, entry, response.headers.get('Cache-Control'),
+        request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'),
+        key=g.get('response_key'), cached=cached)
+    response.status_code = status
+    if body is not entry.body:
+        response.set_data(body)
+    if status == 304:
+        # Werkzeug sends no body for a 304
+        response.headers.pop('Content-Length', None)
+    for name, value in headers:
+        response.headers[name] = value
+    return response
+
 # Add error handler for 500 errors
 @app.errorhandler(500)
 def internal_error(error):
@@ -35,6 +163,11 @@ def not_found_error(error):
         "error": "Resource not found"
     }), 404
 
+def requested_fields():
+    """Fields to keep from ?fields=id,song,... (projection.py), None for all."""
+    return projection.parse(request.args.get('fields'))
+
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -59,7 +192,7 @@ def search():
         if query:
             logger.info(f"Searching for song: {query} with limit: {limit}")
             result = jiosaavn.search_songs_new_api(query, limit)
-            return jsonify(result)
+            return jsonify(projection.project(result, requested_fields()))
         else:
             error = {
                 "status": False,
@@ -81,8 +214,9 @@ def get_song():
     lyrics_ = request.args.get('lyrics')
     if lyrics_ and lyrics_.lower() != 'false':
         lyrics = True
+    fields = requested_fields()
     if id:
-        resp = jiosaavn.get_song(id, lyrics)
+        resp = jiosaavn.get_song(id, projection.wants_lyrics(fields, lyrics), projection.wants_media(fields))
         if not resp:
             error = {
                 "status": False,
@@ -90,7 +224,7 @@ def get_song():
             }
             return jsonify(error)
         else:
-            return jsonify(resp)
+            return jsonify(projection.project_record(resp, fields))
     else:
         error = {
             "status": False,
@@ -99,7 +233,7 @@ def get_song():
         return jsonify(error)
 
 
-@app.route('/song/get-multiple/')
+@app.route('/song/get-multiple/', methods=['GET', 'POST'])
 def get_multiple_songs():
     try:
         lyrics = False
@@ -108,6 +242,14 @@ def get_multiple_songs():
         
         if lyrics_ and lyrics_.lower() != 'false':
             lyrics = True
+
+        # Large ID lists do not fit in a URL: accept {"ids": [...]} as a POST body
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            if isinstance(body.get('ids'), list):
+                ids = ','.join(str(id) for id in body['ids'])
+            elif body.get('ids'):
+                ids = str(body['ids'])
             
         if not ids:
             error = {
@@ -127,7 +269,6 @@ def get_multiple_songs():
             return jsonify(error)
         
         # Add practical limits
-        MAX_SONGS = 100  # Maximum number of songs per request
         if len(song_ids) > MAX_SONGS:
             error = {
                 "status": False,
@@ -138,7 +279,9 @@ def get_multiple_songs():
         logger.info(f"Fetching multiple songs: {len(song_ids)} songs")
         
         # Get songs data using the new function
-        songs_data = jiosaavn.get_multiple_songs(song_ids, lyrics)
+        fields = requested_fields()
+        songs_data = jiosaavn.get_multiple_songs(song_ids, projection.wants_lyrics(fields, lyrics),
+                                                 projection.wants_media(fields))
         
         if not songs_data:
             error = {
@@ -147,7 +290,7 @@ def get_multiple_songs():
             }
             return jsonify(error)
         
-        return jsonify(songs_data)
+        return jsonify(projection.project(songs_data, fields))
         
     except Exception as e:
         logger.error(f"Error in get_multiple_songs endpoint: {str(e)}")
@@ -165,9 +308,10 @@ def playlist():
     if lyrics_ and lyrics_.lower() != 'false':
         lyrics = True
     if query:
+        fields = requested_fields()
         id = jiosaavn.get_playlist_id(query)
-        songs = jiosaavn.get_playlist(id, lyrics)
-        return jsonify(songs)
+        songs = jiosaavn.get_playlist(id, projection.wants_lyrics(fields, lyrics), projection.wants_media(fields))
+        return jsonify(projection.project(songs, fields))
     else:
         error = {
             "status": False,
@@ -185,9 +329,10 @@ def album():
         lyrics = True
     if query:
         # Query is expected to be an album link. Use saavn.dev adapter
-        result = jiosaavn.get_album_by_link(query, lyrics)
+        fields = requested_fields()
+        result = jiosaavn.get_album_by_link(query, projection.wants_lyrics(fields, lyrics))
         status_code = 200 if result and result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, fields)), status_code
     else:
         error = {
             "success": False,
@@ -234,25 +379,29 @@ def result():
     if lyrics_ and lyrics_.lower() != 'false':
         lyrics = True
 
+    fields = requested_fields()
+    lyrics = projection.wants_lyrics(fields, lyrics)
+    media = projection.wants_media(fields)
+
     if 'saavn' not in query:
-        return jsonify(jiosaavn.search_for_song(query, lyrics, True))
+        return jsonify(projection.project(jiosaavn.search_for_song(query, lyrics, True), fields))
     try:
         if '/song/' in query:
             print("Song")
             song_id = jiosaavn.get_song_id(query)
-            song = jiosaavn.get_song(song_id, lyrics)
-            return jsonify(song)
+            song = jiosaavn.get_song(song_id, lyrics, media)
+            return jsonify(projection.project_record(song, fields))
 
         elif '/album/' in query:
             print("Album")
             result = jiosaavn.get_album_by_link(query, lyrics)
-            return jsonify(result)
+            return jsonify(projection.project(result, fields))
 
         elif '/playlist/' or '/featured/' in query:
             print("Playlist")
             id = jiosaavn.get_playlist_id(query)
-            songs = jiosaavn.get_playlist(id, lyrics)
-            return jsonify(songs)
+            songs = jiosaavn.get_playlist(id, lyrics, media)
+            return jsonify(projection.project(songs, fields))
 
     except Exception as e:
         print_exc()
@@ -272,6 +421,50 @@ def keep_alive():
     })
 
 
+@app.route('/stats/')
+def stats():
+    response = jsonify({
+        "status": True,
+        "upstream": upstream.pool_stats(),
+        "cache": cache.stats(),
+        "catalog": catalog.stats(),
+        "search_index": search_index.stats(),
+        "typeahead": typeahead.stats(),
+        "singleflight": singleflight.stats()
+    })
+    response.headers['Cache-Control'] = http_cache.NO_STORE
+    return response
+
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE,
+                    headers={'Cache-Control': http_cache.NO_STORE})
+
+
+@app.route('/autocomplete/')
+def autocomplete_route():
+    try:
+        query = request.args.get('query', '').lstrip()
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": 'Query is required!'
+            }), 400
+        limit = typeahead.parse_limit(request.args.get('limit'))
+        result = jiosaavn.autocomplete(query, limit)
+        if not (result and result.get('success')):
+            cache.note_failure()
+            result = jiosaavn.local_autocomplete(query, limit)
+        return jsonify(projection.project(result, requested_fields()))
+    except Exception as e:
+        logger.error(f"Error in autocomplete_route: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": 'An error occurred while processing your request'
+        }), 500
+
+
 @app.route('/search/')
 def global_search_route():
     try:
@@ -284,7 +477,7 @@ def global_search_route():
         logger.info(f"Global search for: {query}")
         result = jiosaavn.global_search(query)
         status_code = 200 if result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in global_search_route: {str(e)}")
         return jsonify({
@@ -305,7 +498,7 @@ def artist_details_route():
         logger.info(f"Artist details for: {artist_id}")
         result = jiosaavn.get_artist_details(artist_id)
         status_code = 200 if result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in artist_details_route: {str(e)}")
         return jsonify({
@@ -326,7 +519,7 @@ def song_suggestions_route():
         logger.info(f"Song suggestions for: {song_id}")
         result = jiosaavn.get_song_suggestions(song_id)
         status_code = 200 if result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in song_suggestions_route: {str(e)}")
         return jsonify({
@@ -348,7 +541,7 @@ def search_playlists_route():
         result = jiosaavn.search_playlists(query)
         # If upstream returned an HTTP status, prefer that; otherwise map success
         status_code = result.get('status') or (200 if result.get('success') else 500)
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in search_playlists_route: {str(e)}")
         return jsonify({
@@ -369,7 +562,7 @@ def search_albums_route():
         logger.info(f"Search albums for: {query}")
         result = jiosaavn.search_albums(query)
         status_code = result.get('status') or (200 if result.get('success') else 500)
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in search_albums_route: {str(e)}")
         return jsonify({
@@ -390,7 +583,7 @@ def search_artists_route():
         logger.info(f"Search artists for: {query}")
         result = jiosaavn.search_artists(query)
         status_code = result.get('status') or (200 if result.get('success') else 500)
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in search_artists_route: {str(e)}")
         return jsonify({
@@ -415,7 +608,7 @@ def artist_songs_route():
         logger.info(f"Artist songs for: {artist_id}, sortBy: {sort_by}, sortOrder: {sort_order}")
         result = jiosaavn.get_artist_songs(artist_id, sort_by, sort_order)
         status_code = 200 if result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in artist_songs_route: {str(e)}")
         return jsonify({
@@ -440,7 +633,7 @@ def artist_albums_route():
         logger.info(f"Artist albums for: {artist_id}, sortBy: {sort_by}, sortOrder: {sort_order}")
         result = jiosaavn.get_artist_albums(artist_id, sort_by, sort_order)
         status_code = 200 if result.get('success') else 500
-        return jsonify(result), status_code
+        return jsonify(projection.project(result, requested_fields())), status_code
     except Exception as e:
         logger.error(f"Error in artist_albums_route: {str(e)}")
         return jsonify({
@@ -0,0 +1,518 @@
+"""ASGI version of the routes in app.py, backed by jiosaavn_async.
+
+Run with any ASGI server, for example:
+    uvicorn asgi:app --port 5100
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+Responses are serialized like app.py's jsonify (fast_json.py: sorted keys,
+compact separators, trailing newline) so both servers return identical JSON.
+"""
+import os
+import json
+import time
+import logging
+import urllib.parse
+
+import cache
+import catalog
+import fast_json
+import http_cache
+import jiosaavn_async
+import metrics
+import projection
+import search_index
+import singleflight
+import timing
+import typeahead
+import upstream
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_SONGS = int(os.environ.get("MAX_SONGS_PER_REQUEST", 5000))
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+routes = {}
+
+
+def route(path):
+    def decorator(handler):
+        routes[path] = handler
+        return handler
+    return decorator
+
+
+class Response:
+    def __init__(self, body, status=200, content_type="application/json", headers=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or []
+
+
+def jsonify(obj, status=200):
+    with timing.phase('jsonify'):
+        body = fast_json.dumps(obj) + b"\n"
+    return Response(body, status)
+
+
+def parse_lyrics_flag(args):
+    lyrics_ = args.get('lyrics')
+    return bool(lyrics_ and lyrics_.lower() != 'false')
+
+
+def requested_fields(args):
+    return projection.parse(args.get('fields'))
+
+
+@route('/')
+async def home(args):
+    with open(TEMPLATE_PATH, 'rb') as f:
+        return Response(f.read(), content_type="text/html; charset=utf-8")
+
+
+@route('/song/')
+async def search(args):
+    try:
+        query = args.get('query')
+        limit = args.get('limit', 10)
+        try:
+            limit = int(limit)
+            if limit < 1:
+                limit = 10
+            elif limit > 50:
+                limit = 50
+        except (ValueError, TypeError):
+            limit = 10
+
+        if query:
+            logger.info(f"Searching for song: {query} with limit: {limit}")
+            result = await jiosaavn_async.search_songs_new_api(query, limit)
+            return jsonify(projection.project(result, requested_fields(args)))
+        return jsonify({
+            "status": False,
+            "error": 'Query is required to search songs!'
+        })
+    except Exception as e:
+        logger.error(f"Error in search endpoint: {str(e)}")
+        return jsonify({
+            "status": False,
+            "error": "An error occurred while processing your request"
+        }, 500)
+
+
+@route('/song/get/')
+async def get_song(args):
+    lyrics = parse_lyrics_flag(args)
+    fields = requested_fields(args)
+    id = args.get('id')
+    if id:
+        resp = await jiosaavn_async.get_song(id, projection.wants_lyrics(fields, lyrics), projection.wants_media(fields))
+        if not resp:
+            return jsonify({
+                "status": False,
+                "error": 'Invalid Song ID received!'
+            })
+        return jsonify(projection.project_record(resp, fields))
+    return jsonify({
+        "status": False,
+        "error": 'Song ID is required to get a song!'
+    })
+
+
+@route('/song/get-multiple/')
+async def get_multiple_songs(args):
+    try:
+        lyrics = parse_lyrics_flag(args)
+        ids = args.get('ids')
+        body = args.get_json()
+        if isinstance(body, dict):
+            if isinstance(body.get('ids'), list):
+                ids = ','.join(str(id) for id in body['ids'])
+            elif body.get('ids'):
+                ids = str(body['ids'])
+        if not ids:
+            return jsonify({
+                "status": False,
+                "error": 'Song IDs are required! Please provide comma-separated IDs in the "ids" parameter.'
+            })
+
+        song_ids = [id.strip() for id in ids.split(',') if id.strip()]
+        if not song_ids:
+            return jsonify({
+                "status": False,
+                "error": 'No valid song IDs provided!'
+            })
+
+        if len(song_ids) > MAX_SONGS:
+            return jsonify({
+                "status": False,
+                "error": f'Too many song IDs! Maximum {MAX_SONGS} songs allowed per request. You provided {len(song_ids)} songs.'
+            })
+
+        logger.info(f"Fetching multiple songs: {len(song_ids)} songs")
+        fields = requested_fields(args)
+        songs_data = await jiosaavn_async.get_multiple_songs(song_ids, projection.wants_lyrics(fields, lyrics),
+                                                             projection.wants_media(fields))
+        if not songs_data:
+            return jsonify({
+                "status": False,
+                "error": 'Failed to fetch songs data!'
+            })
+        return jsonify(projection.project(songs_data, fields))
+    except Exception as e:
+        logger.error(f"Error in get_multiple_songs endpoint: {str(e)}")
+        return jsonify({
+            "status": False,
+            "error": "An error occurred while processing your request"
+        }, 500)
+
+
+@route('/playlist/')
+async def playlist(args):
+    lyrics = parse_lyrics_flag(args)
+    query = args.get('query')
+    if query:
+        fields = requested_fields(args)
+        id = await jiosaavn_async.get_playlist_id(query)
+        songs = await jiosaavn_async.get_playlist(id, projection.wants_lyrics(fields, lyrics),
+                                                  projection.wants_media(fields))
+        return jsonify(projection.project(songs, fields))
+    return jsonify({
+        "status": False,
+        "error": 'Query is required to search playlists!'
+    })
+
+
+@route('/album/')
+async def album(args):
+    lyrics = parse_lyrics_flag(args)
+    query = args.get('query')
+    if query:
+        fields = requested_fields(args)
+        result = await jiosaavn_async.get_album_by_link(query, projection.wants_lyrics(fields, lyrics))
+        status_code = 200 if result and result.get('success') else 500
+        return jsonify(projection.project(result, fields), status_code)
+    return jsonify({
+        "success": False,
+        "error": 'Query (album link) is required to fetch album!'
+    }, 400)
+
+
+@route('/lyrics/')
+async def lyrics(args):
+    query = args.get('query')
+    if query:
+        try:
+            if 'http' in query and 'saavn' in query:
+                id = await jiosaavn_async.get_song_id(query)
+                lyrics = await jiosaavn_async.get_lyrics(id)
+            else:
+                lyrics = await jiosaavn_async.get_lyrics(query)
+            return jsonify({"status": True, "lyrics": lyrics})
+        except Exception as e:
+            return jsonify({
+                "status": False,
+                "error": str(e)
+            })
+    return jsonify({
+        "status": False,
+        "error": 'Query containing song link or id is required to fetch lyrics!'
+    })
+
+
+@route('/result/')
+async def result(args):
+    fields = requested_fields(args)
+    lyrics = projection.wants_lyrics(fields, parse_lyrics_flag(args))
+    media = projection.wants_media(fields)
+    query = args.get('query')
+
+    if 'saavn' not in query:
+        return jsonify(projection.project(await jiosaavn_async.search_for_song(query, lyrics, True), fields))
+    try:
+        if '/song/' in query:
+            song_id = await jiosaavn_async.get_song_id(query)
+            return jsonify(projection.project_record(await jiosaavn_async.get_song(song_id, lyrics, media), fields))
+        elif '/album/' in query:
+            return jsonify(projection.project(await jiosaavn_async.get_album_by_link(query, lyrics), fields))
+        else:
+            id = await jiosaavn_async.get_playlist_id(query)
+            return jsonify(projection.project(await jiosaavn_async.get_playlist(id, lyrics, media), fields))
+    except Exception as e:
+        logger.exception("Error in result endpoint")
+        return jsonify({
+            "status": True,
+            "error": str(e)
+        })
+
+
+@route('/keep-alive/')
+async def keep_alive(args):
+    return jsonify({
+        "status": True,
+        "message": f"Service is running at {time.strftime('%Y-%m-%d %H:%M:%S')}"
+    })
+
+
+@route('/stats/')
+async def stats(args):
+    response = jsonify({
+        "status": True,
+        "upstream": upstream.pool_stats(),
+        "cache": cache.stats(),
+        "catalog": catalog.stats(),
+        "search_index": search_index.stats(),
+        "typeahead": typeahead.stats(),
+        "singleflight": singleflight.stats()
+    })
+    response.headers.append((b"cache-control", http_cache.NO_STORE.encode()))
+    return response
+
+
+@route('/metrics')
+async def metrics_route(args):
+    return Response(metrics.render().encode(), content_type=metrics.CONTENT_TYPE,
+                    headers=[(b"cache-control", http_cache.NO_STORE.encode())])
+
+
+def query_route(path, func, missing_error, log_label, http_status=False):
+    """Routes that take ?query=, return 400 without it and map success to 200/500."""
+    async def handler(args):
+        try:
+            query = args.get('query')
+            if not query:
+                return jsonify({"success": False, "error": missing_error}, 400)
+            logger.info(f"{log_label}: {query}")
+            result = await func(query)
+            if http_status:
+                status_code = result.get('status') or (200 if result.get('success') else 500)
+            else:
+                status_code = 200 if result.get('success') else 500
+            return jsonify(projection.project(result, requested_fields(args)), status_code)
+        except Exception as e:
+            logger.error(f"Error in {path} route: {str(e)}")
+            return jsonify({
+                "success": False,
+                "error": 'An error occurred while processing your request'
+            }, 500)
+    routes[path] = handler
+
+
+def id_route(path, func, missing_error, log_label, sorted_=False):
+    """Routes that take ?id= (and optionally sortBy/sortOrder)."""
+    async def handler(args):
+        try:
+            item_id = args.get('id')
+            if not item_id:
+                return jsonify({"success": False, "error": missing_error}, 400)
+            if sorted_:
+                sort_by = args.get('sortBy', 'latest')
+                sort_order = args.get('sortOrder', 'desc')
+                logger.info(f"{log_label}: {item_id}, sortBy: {sort_by}, sortOrder: {sort_order}")
+                result = await func(item_id, sort_by, sort_order)
+            else:
+                logger.info(f"{log_label}: {item_id}")
+                result = await func(item_id)
+            status_code = 200 if result.get('success') else 500
+            return jsonify(projection.project(result, requested_fields(args)), status_code)
+        except Exception as e:
+            logger.error(f"Error in {path} route: {str(e)}")
+            return jsonify({
+                "success": False,
+                "error": 'An error occurred while processing your request'
+            }, 500)
+    routes[path] = handler
+
+
+@route('/autocomplete/')
+async def autocomplete(args):
+    try:
+        query = args.get('query', '').lstrip()
+        if not query:
+            return jsonify({"success": False, "error": 'Query is required!'}, 400)
+        limit = typeahead.parse_limit(args.get('limit'))
+        latest = True
+        if await cache.run_blocking(jiosaavn_async.autocomplete_needs_upstream, query, limit):
+            latest = await typeahead.settle(client_key(args.scope))
+        # A newer keystroke from the same client takes the upstream call
+        result = await jiosaavn_async.autocomplete(query, limit) if latest else None
+        if not (result and result.get('success')):
+            cache.note_failure()
+            result = await cache.run_blocking(jiosaavn_async.local_autocomplete, query, limit)
+        return jsonify(projection.project(result, requested_fields(args)))
+    except Exception as e:
+        logger.error(f"Error in autocomplete route: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": 'An error occurred while processing your request'
+        }, 500)
+
+
+query_route('/search/', jiosaavn_async.global_search, 'Query is required to search!', "Global search for")
+query_route('/search/playlists/', jiosaavn_async.search_playlists, 'Query is required!',
+            "Search playlists for", http_status=True)
+query_route('/search/albums/', jiosaavn_async.search_albums, 'Query is required!',
+            "Search albums for", http_status=True)
+query_route('/search/artists/', jiosaavn_async.search_artists, 'Query is required!',
+            "Search artists for", http_status=True)
+id_route('/artist/', jiosaavn_async.get_artist_details, 'Artist id is required!', "Artist details for")
+id_route('/song/suggestions/', jiosaavn_async.get_song_suggestions, 'Song id is required!', "Song suggestions for")
+id_route('/artist/songs/', jiosaavn_async.get_artist_songs, 'Artist ID is required!', "Artist songs for", sorted_=True)
+id_route('/artist/albums/', jiosaavn_async.get_artist_albums, 'Artist ID is required!', "Artist albums for", sorted_=True)
+
+
+class Args(dict):
+    """Query parameters (first value wins, like request.args.get) plus the
+    request body for POST routes."""
+
+    def __init__(self, query_string, body=b"", scope=None):
+        super().__init__()
+        for key, value in urllib.parse.parse_qsl(query_string.decode('latin-1'), keep_blank_values=True):
+            self.setdefault(key, value)
+        self.body = body
+        self.scope = scope
+
+    def get_json(self):
+        if not self.body:
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+POST_ROUTES = {'/song/get-multiple/'}
+
+
+def request_header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def client_key(scope):
+    forwarded = request_header(scope, b"x-forwarded-for")
+    if forwarded:
+        address = forwarded.split(',')[0].strip()
+    else:
+        address = (scope.get('client') or ('',))[0]
+    return typeahead.client_key(address, request_header(scope, b"user-agent"))
+
+
+async def dispatch(scope, receive):
+    path = scope['path']
+    handler = routes.get(path)
+    if handler is None:
+        if not path.endswith('/') and path + '/' in routes:
+            # Same as Flask's strict_slashes redirect
+            location = path + '/'
+            if scope.get('query_string'):
+                location += '?' + scope['query_string'].decode('latin-1')
+            return Response(b"", 308, "text/plain", [(b"location", location.encode('latin-1'))])
+        return jsonify({"status": False, "error": "Resource not found"}, 404)
+    body = b""
+    if scope['method'] == 'POST' and path in POST_ROUTES:
+        body = await read_body(receive)
+    elif scope['method'] not in ('GET', 'HEAD', 'OPTIONS'):
+        return jsonify({"status": False, "error": "Method not allowed"}, 405)
+    try:
+        return await handler(Args(scope.get('query_string', b''), body, scope))
+    except Exception as e:
+        logger.error(f"Internal Server Error: {str(e)}")
+        return jsonify({
+            "status": False,
+            "error": "Internal Server Error. Please try again later."
+        }, 500)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await upstream.close_async_session()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    cache.reset_state()
+    query_string = scope.get('query_string', b'')
+    debug_timing = b'debug=timing' in query_string and Args(query_string).get('debug') == 'timing'
+    timed = timing.begin(debug_timing)
+    route = scope['path'] if scope['path'] in routes else "unmatched"
+    start = metrics.request_started(route)
+    key = entry = None
+    if not debug_timing and http_cache.applies(scope['method'], 200):
+        key = http_cache.response_key(
+            scope['path'], urllib.parse.parse_qsl(query_string.decode('latin-1'), keep_blank_values=True))
+        entry = http_cache.lookup_response(key)
+    try:
+        if entry is not None:
+            cache.note_state("fresh")
+            response = Response(entry.body, content_type=entry.content_type)
+        else:
+            response = await dispatch(scope, receive)
+    except BaseException:
+        metrics.request_finished(route, scope['method'], 500, start)
+        raise
+    body = response.body
+    status = response.status
+    extra_headers = []
+    state = cache.response_state()
+    if state:
+        extra_headers.append((b"x-cache", state.encode()))
+    if debug_timing:
+        if http_cache.applies(scope['method'], status):
+            extra_headers.append((b"cache-control", http_cache.NO_STORE.encode()))
+    else:
+        route_cache_control = None
+        for name, value in response.headers:
+            if name == b"cache-control":
+                route_cache_control = value.decode('latin-1')
+        cached = entry is not None
+        if not cached:
+            entry = http_cache.Entry(body, response.content_type)
+        status, body, headers = http_cache.respond(
+            scope['method'], status, entry, route_cache_control,
+            request_header(scope, b"accept-encoding"), request_header(scope, b"if-none-match"),
+            key=key, cached=cached)
+        extra_headers += [(name.lower().encode(), value.encode('latin-1')) for name, value in headers
+                          if name != "Cache-Control" or route_cache_control is None]
+    metrics.request_finished(route, scope['method'], status, start)
+    if timed:
+        summary = timing.summary(time.perf_counter() - start)
+        extra_headers.append((b"server-timing", timing.header(summary).encode()))
+        if debug_timing and response.content_type == "application/json":
+            body = timing.debug_body(body, summary)
+    if status == 304:
+        headers = [(b"access-control-allow-origin", b"*")] + response.headers + extra_headers
+        body = b""
+    else:
+        headers = [
+            (b"content-type", response.content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ] + response.headers + extra_headers
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b"" if scope['method'] == 'HEAD' else body})
+
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get("PORT", 5100))
+    uvicorn.run("asgi:app", host='0.0.0.0', port=port)
@@ -0,0 +1,83 @@
+"""Microbenchmark for helper.decrypt_url.
+
+Compares the per-URL cost of:
+- legacy: a new pyDes cipher per call (the previous implementation)
+- cold: decrypt_url with the reused cipher and an empty memo
+- memo: decrypt_url on already decrypted URLs
+- batch: decrypt_urls over a whole track list with an empty memo
+
+Run from the repository root:
+    python benchmarks/bench_decrypt.py [--tracks 300] [--repeat 5]
+"""
+import os
+import sys
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helper  # noqa: E402
+from pyDes import des, ECB, PAD_PKCS5  # noqa: E402
+
+
+def make_encrypted_urls(count):
+    cipher = des(helper.DES_KEY, ECB, b"\0\0\0\0\0\0\0\0", pad=None, padmode=PAD_PKCS5)
+    urls = []
+    for i in range(count):
+        plain = f"https://aac.saavncdn.com/{i % 999:03d}/{i:032x}_96.mp4".encode()
+        urls.append(base64.b64encode(cipher.encrypt(plain, padmode=PAD_PKCS5)).decode())
+    return urls
+
+
+def legacy_decrypt_url(url):
+    des_cipher = des(b"38346591", ECB, b"\0\0\0\0\0\0\0\0",
+                     pad=None, padmode=PAD_PKCS5)
+    enc_url = base64.b64decode(url.strip())
+    dec_url = des_cipher.decrypt(enc_url, padmode=PAD_PKCS5).decode('utf-8')
+    return dec_url.replace("_96.mp4", "_320.mp4")
+
+
+def clear_memo():
+    with helper._decrypted_lock:
+        helper._decrypted.clear()
+
+
+def measure(label, urls, repeat, fn, reset=True):
+    best = None
+    for _ in range(repeat):
+        if reset:
+            clear_memo()
+        start = time.perf_counter()
+        fn(urls)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    per_url = best / len(urls) * 1e6
+    print(f"{label:<8} {per_url:10.2f} us/url")
+    return per_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    urls = make_encrypted_urls(args.tracks)
+    expected = [legacy_decrypt_url(u) for u in urls]
+    assert helper.decrypt_urls(urls) == expected
+    clear_memo()
+    assert [helper.decrypt_url(u) for u in urls] == expected
+
+    backend = "pycryptodome" if helper.FastDES is not None else "pyDes"
+    print(f"{args.tracks} URLs, best of {args.repeat}, DES backend: {backend}")
+    legacy = measure("legacy", urls, args.repeat, lambda us: [legacy_decrypt_url(u) for u in us])
+    cold = measure("cold", urls, args.repeat, lambda us: [helper.decrypt_url(u) for u in us])
+    helper.decrypt_urls(urls)
+    memo = measure("memo", urls, args.repeat, lambda us: [helper.decrypt_url(u) for u in us], reset=False)
+    batch = measure("batch", urls, args.repeat, helper.decrypt_urls)
+    print(f"speedup vs legacy: cold {legacy / cold:.1f}x, batch {legacy / batch:.1f}x, memo {legacy / memo:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Response serialization time of the stdlib encoder against orjson
+(fast_json.py), over the normalized fixture responses and two large
+synthetic ones: a 300-track playlist with lyrics, and an album whose titles
+and lyrics are in Devanagari, which the stdlib escapes and orjson writes as
+UTF-8. Both outputs are checked to parse to the same data.
+
+Run from the repository root:
+    python benchmarks/bench_json.py [--repeat 5] [--number 100]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import normalize  # noqa: E402
+import fast_json  # noqa: E402
+
+FIXTURES = os.path.join(HERE, "fixtures")
+
+LYRICS = ("Tere bina jee na lage, raatein lambi hain<br>" * 30).rstrip("<br>")
+DEVANAGARI_LYRICS = ("तेरे बिना जी ना लगे, रातें लम्बी हैं<br>" * 30).rstrip("<br>")
+
+
+def normalized_fixtures():
+    payloads = {}
+    for name, normalizer in normalize.COMPILED.items():
+        with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+            payloads[name] = normalizer(json.loads(f.read()))
+    return payloads
+
+
+def large_playlist(album, tracks=300):
+    """A playlist response of `tracks` songs with lyrics, built from the
+    album fixture's songs."""
+    songs = album["data"]["songs"]
+    playlist = []
+    for i in range(tracks):
+        song = copy.deepcopy(songs[i % len(songs)])
+        song["id"] = f"{song['id']}{i:03d}"
+        song["lyrics"] = LYRICS
+        playlist.append(song)
+    return {"listname": "Stub Top 300", "firstname": "Stub", "listid": "1", "songs": playlist}
+
+
+def devanagari_album(album):
+    album = copy.deepcopy(album)
+    for song in album["data"]["songs"]:
+        song["song"] = "तेरे बिना " + song["song"]
+        song["lyrics"] = DEVANAGARI_LYRICS
+    return album
+
+
+def measure(fn, obj, repeat, number):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(obj)
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=100)
+    args = parser.parse_args()
+
+    if fast_json.orjson is None:
+        sys.exit("orjson is not installed: pip install orjson")
+
+    payloads = normalized_fixtures()
+    payloads["playlist_300_lyrics"] = large_playlist(payloads["album"])
+    payloads["album_devanagari"] = devanagari_album(payloads["album"])
+
+    print(f"{'payload':<22} {'size':>8} {'stdlib':>10} {'orjson':>10} {'speedup':>8}")
+    total_stdlib = total_orjson = 0.0
+    for name, obj in payloads.items():
+        expected = fast_json.stdlib_dumps(obj)
+        if json.loads(fast_json.orjson_dumps(obj)) != json.loads(expected):
+            sys.exit(f"{name}: orjson output differs from the stdlib encoder")
+        stdlib_time = measure(fast_json.stdlib_dumps, obj, args.repeat, args.number)
+        orjson_time = measure(fast_json.orjson_dumps, obj, args.repeat, args.number)
+        total_stdlib += stdlib_time
+        total_orjson += orjson_time
+        print(f"{name:<22} {len(expected) // 1024:>6}KB {stdlib_time * 1e6:>8.1f}us {orjson_time * 1e6:>8.1f}us "
+              f"{stdlib_time / orjson_time:>7.2f}x")
+    print(f"{'all':<22} {'':>8} {total_stdlib * 1e6:>8.1f}us {total_orjson * 1e6:>8.1f}us "
+          f"{total_stdlib / total_orjson:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Throughput of the compiled normalizers (normalize.py) against the
+hand-written ones they replaced (legacy_normalize.py), over the payloads in
+benchmarks/fixtures/, or over the worker responses recorded in an upstream
+cassette (see cassette.py). Both are checked to produce the same output first.
+
+Run from the repository root:
+    python benchmarks/bench_normalize.py [--repeat 5] [--number 200] [--cassette path]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import normalize  # noqa: E402
+import legacy_normalize  # noqa: E402
+import cassette  # noqa: E402
+import upstream  # noqa: E402
+
+FIXTURES = os.path.join(HERE, "fixtures")
+
+# upstream.endpoint_kind() of the worker routes -> normalizer
+CASSETTE_KINDS = {
+    "/api/albums": "album",
+    "/api/search": "global_search",
+    "/api/artists/{id}": "artist_details",
+    "/api/artists/{id}/songs": "artist_songs",
+    "/api/artists/{id}/albums": "artist_albums",
+    "/api/songs/{id}/suggestions": "song_suggestions",
+    "/api/search/playlists": "search_playlists",
+    "/api/search/albums": "search_albums",
+    "/api/search/artists": "search_artists",
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+        return f.read()
+
+
+def fixture_payloads():
+    for name in normalize.SPECS:
+        yield name, name, load_fixture(name)
+
+
+def cassette_payloads(path):
+    """(label, normalizer, raw) for every recorded worker response."""
+    for url, raw in cassette.Cassette(path).payloads():
+        name = CASSETTE_KINDS.get(upstream.endpoint_kind(url))
+        if name is not None:
+            yield f"{name} {len(raw) // 1024}KB", name, raw
+
+
+def nested(obj, out):
+    """Collect every dict and list inside a payload."""
+    out.append(obj)
+    values = obj.values() if isinstance(obj, dict) else obj
+    for value in values:
+        if isinstance(value, (dict, list)):
+            nested(value, out)
+    return out
+
+
+def measure(fn, raw, repeat, number):
+    """Best time per call. Every call gets a freshly parsed payload, like a
+    real response would. Parsing is not counted, and every object of the
+    payload is kept alive until the timer stops so that freeing the replaced
+    parts is not counted either: only the normalization work is measured."""
+    best = None
+    for _ in range(repeat):
+        payloads = [json.loads(raw) for _ in range(number)]
+        keep = [nested(payload, []) for payload in payloads]
+        gc.disable()
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        elapsed = (time.perf_counter() - start) / number
+        gc.enable()
+        del payloads, keep
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--cassette", help="benchmark the responses recorded in this cassette instead of the fixtures")
+    args = parser.parse_args()
+
+    payloads = cassette_payloads(args.cassette) if args.cassette else fixture_payloads()
+    print(f"{'endpoint':<24} {'legacy':>10} {'compiled':>10} {'speedup':>8}")
+    total_legacy = total_compiled = 0.0
+    for label, name, raw in payloads:
+        legacy = getattr(legacy_normalize, f"_normalize_{name}")
+        compiled = normalize.COMPILED[name]
+        if legacy(json.loads(raw)) != compiled(json.loads(raw)):
+            sys.exit(f"{label}: compiled output differs from the legacy normalizer")
+        legacy_time = measure(legacy, raw, args.repeat, args.number)
+        compiled_time = measure(compiled, raw, args.repeat, args.number)
+        total_legacy += legacy_time
+        total_compiled += compiled_time
+        print(f"{label:<24} {legacy_time * 1e6:>8.1f}us {compiled_time * 1e6:>8.1f}us "
+              f"{legacy_time / compiled_time:>7.2f}x")
+    if not total_compiled:
+        sys.exit("no worker responses to benchmark")
+    print(f"{'all':<24} {total_legacy * 1e6:>8.1f}us {total_compiled * 1e6:>8.1f}us "
+          f"{total_legacy / total_compiled:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,652 @@
+"""The hand-written normalizers that normalize.py replaced, kept verbatim as
+the baseline for bench_normalize.py.
+"""
+
+
+def _normalize_album(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+
+    payload = (data or {}).get('data') or {}
+
+    # Root image collapse
+    root_img = _select_highest_quality_image(payload.get('image'))
+    if root_img:
+        payload['image'] = root_img.get('url') if isinstance(root_img, dict) else root_img
+
+    # Root artists -> primaryartist string
+    try:
+        artists_block = payload.get('artists') or {}
+        primary_list = artists_block.get('primary') or []
+        names = []
+        for a in primary_list:
+            name = (a or {}).get('name')
+            if name:
+                names.append(name)
+        if names:
+            payload['primaryartist'] = ', '.join(names)
+        if 'artists' in payload:
+            del payload['artists']
+    except Exception:
+        try:
+            if 'artists' in payload:
+                del payload['artists']
+        except Exception:
+            pass
+
+    # Rename root keys: name -> album, primaryartist -> primary_artists
+    try:
+        if 'name' in payload and 'album' not in payload:
+            payload['album'] = payload.get('name')
+            del payload['name']
+    except Exception:
+        pass
+    try:
+        if 'primaryartist' in payload and 'primary_artists' not in payload:
+            payload['primary_artists'] = payload.get('primaryartist')
+            del payload['primaryartist']
+    except Exception:
+        pass
+    # Rename root url -> album_url
+    try:
+        if 'url' in payload and 'album_url' not in payload:
+            payload['album_url'] = payload.get('url')
+            del payload['url']
+    except Exception:
+        pass
+
+    # Songs normalization
+    songs = payload.get('songs') or []
+    normalized_songs = []
+    for s in songs:
+        song = dict(s or {})
+        # Image collapse
+        img = _select_highest_quality_image(song.get('image'))
+        if img:
+            song['image'] = img.get('url') if isinstance(img, dict) else img
+        # Download best URL
+        best_dl = _select_highest_quality_download_url(song.get('downloadUrl'))
+        if best_dl:
+            song['media_url'] = best_dl
+        # Remove the original downloadUrl array if present
+        try:
+            if 'downloadUrl' in song:
+                del song['downloadUrl']
+        except Exception:
+            pass
+        # Artists -> primaryartist string
+        try:
+            s_art = song.get('artists') or {}
+            prim = s_art.get('primary') or []
+            s_names = []
+            for a in prim:
+                nm = (a or {}).get('name')
+                if nm:
+                    s_names.append(nm)
+            if s_names:
+                song['primaryartist'] = ', '.join(s_names)
+            if 'artists' in song:
+                del song['artists']
+        except Exception:
+            try:
+                if 'artists' in song:
+                    del song['artists']
+            except Exception:
+                pass
+        # Remove redundant nested album object from song if present
+        try:
+            if 'album' in song:
+                del song['album']
+        except Exception:
+            pass
+        # Rename url -> perma_url
+        try:
+            if 'url' in song and 'perma_url' not in song:
+                song['perma_url'] = song.get('url')
+                del song['url']
+        except Exception:
+            pass
+        # Rename song keys: name -> song, primaryartist -> primary_artists
+        try:
+            if 'name' in song and 'song' not in song:
+                song['song'] = song.get('name')
+                del song['name']
+        except Exception:
+            pass
+        try:
+            if 'primaryartist' in song and 'primary_artists' not in song:
+                song['primary_artists'] = song.get('primaryartist')
+                del song['primaryartist']
+        except Exception:
+            pass
+        normalized_songs.append(song)
+    payload['songs'] = normalized_songs
+
+    return {"success": bool(data.get('success', True)), "data": payload}
+
+
+def _select_highest_quality_image(images):
+    try:
+        if not images or not isinstance(images, list):
+            return None
+        # Try to pick by explicit quality field ordering if present
+        quality_priority = {
+            '500x500': 4,
+            '480x480': 3,
+            '320x320': 2,
+            '150x150': 1
+        }
+        def score(img):
+            q = img.get('quality') or ''
+            return quality_priority.get(q, 0)
+        best = max(images, key=score)
+        # Fallback: if url has size patterns, prefer largest by parsing digits
+        if not best.get('url') and images:
+            best = images[0]
+        return best
+    except Exception:
+        return images[0] if images else None
+
+
+def _normalize_global_search(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+
+    # Expecting { success, data: { sections... } }
+    result = {
+        "success": bool(data.get('success', True)),
+        "data": {}
+    }
+    payload = data.get('data') or {}
+
+    def process_section(section_name):
+        section = payload.get(section_name)
+        if not section:
+            return None
+        results = section.get('results') or []
+        normalized = []
+        for item in results:
+            obj = dict(item) if isinstance(item, dict) else {}
+            # Highest quality image
+            img = _select_highest_quality_image(obj.get('image'))
+            if img:
+                if isinstance(img, dict):
+                    obj['image'] = img.get('url')
+                elif isinstance(img, str):
+                    obj['image'] = img
+            # Albums: rename artist -> primaryArtists
+            if section_name == 'albums':
+                if 'artist' in obj and 'primaryArtists' not in obj:
+                    obj['primaryArtists'] = obj.get('artist')
+                    try:
+                        del obj['artist']
+                    except Exception:
+                        pass
+                # Albums: rename url -> album_url
+                if 'url' in obj and 'album_url' not in obj:
+                    obj['album_url'] = obj.get('url')
+                    try:
+                        del obj['url']
+                    except Exception:
+                        pass
+            # Playlists: rename url -> playlist_url
+            if section_name == 'playlists':
+                if 'url' in obj and 'playlist_url' not in obj:
+                    obj['playlist_url'] = obj.get('url')
+                    try:
+                        del obj['url']
+                    except Exception:
+                        pass
+            normalized.append(obj)
+        return {
+            "results": normalized,
+            "position": section.get('position')
+        }
+
+    for name in [
+        'topQuery', 'songs', 'albums', 'playlists', 'artists'
+    ]:
+        processed = process_section(name)
+        if processed is not None:
+            result['data'][name] = processed
+
+    return result
+
+
+def _select_highest_quality_download_url(downloads):
+    try:
+        if not downloads:
+            return None
+        if isinstance(downloads, list):
+            # Items may be {quality, url}
+            def score(item):
+                q = (item or {}).get('quality') or ''
+                if isinstance(q, str) and q.isdigit():
+                    try:
+                        return int(q)
+                    except Exception:
+                        return 0
+                # fallback by inspecting url
+                u = (item or {}).get('url') or ''
+                if '320' in u: return 320
+                if '160' in u: return 160
+                if '96' in u: return 96
+                return 0
+            best = max(downloads, key=score)
+            return (best or {}).get('url')
+        return None
+    except Exception:
+        return None
+
+
+def _normalize_artist_details(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+    payload = (data or {}).get('data') or {}
+
+    # Remove availableLanguages if present
+    try:
+        if 'availableLanguages' in payload:
+            del payload['availableLanguages']
+    except Exception:
+        pass
+
+    # Root image
+    root_img = _select_highest_quality_image(payload.get('image'))
+    if root_img:
+        payload['image'] = root_img.get('url') if isinstance(root_img, dict) else root_img
+
+    # Helper to normalize artists to primary only and collapse image
+    def keep_primary_artists_only(container):
+        try:
+            if not isinstance(container, dict):
+                return container
+            primary_list = (container.get('primary') or [])
+            normalized_primary = []
+            for a in primary_list:
+                artist_obj = dict(a)
+                aimg = _select_highest_quality_image(artist_obj.get('image'))
+                if aimg:
+                    artist_obj['image'] = aimg.get('url') if isinstance(aimg, dict) else aimg
+                normalized_primary.append(artist_obj)
+            return { 'primary': normalized_primary }
+        except Exception:
+            return { 'primary': container.get('primary', []) } if isinstance(container, dict) else container
+
+    # Top songs
+    songs = payload.get('topSongs') or []
+    normalized_songs = []
+    for s in songs:
+        song = dict(s)
+        img = _select_highest_quality_image(song.get('image'))
+        if img:
+            song['image'] = img.get('url') if isinstance(img, dict) else img
+        best_dl = _select_highest_quality_download_url(song.get('downloadUrl'))
+        if best_dl:
+            song['downloadUrl'] = best_dl
+        # Replace artists object with a single primaryartist string
+        try:
+            artists_block = song.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            primary_names = []
+            for a in primary_list:
+                name = (a or {}).get('name')
+                if name:
+                    primary_names.append(name)
+            if primary_names:
+                song['primaryartist'] = ', '.join(primary_names)
+            if 'artists' in song:
+                del song['artists']
+        except Exception:
+            if 'artists' in song:
+                try:
+                    del song['artists']
+                except Exception:
+                    pass
+        normalized_songs.append(song)
+    payload['topSongs'] = normalized_songs
+
+    # Remove singles entirely as not needed
+    try:
+        if 'singles' in payload:
+            del payload['singles']
+    except Exception:
+        pass
+
+    # Top albums: image only
+    albums = payload.get('topAlbums') or []
+    normalized_albums = []
+    for a in albums:
+        album = dict(a)
+        img = _select_highest_quality_image(album.get('image'))
+        if img:
+            album['image'] = img.get('url') if isinstance(img, dict) else img
+        # Replace artists object with a single primaryartist string
+        try:
+            artists_block = album.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            primary_names = []
+            for aobj in primary_list:
+                name = (aobj or {}).get('name')
+                if name:
+                    primary_names.append(name)
+            if primary_names:
+                album['primaryartist'] = ', '.join(primary_names)
+            if 'artists' in album:
+                del album['artists']
+        except Exception:
+            if 'artists' in album:
+                try:
+                    del album['artists']
+                except Exception:
+                    pass
+        # Rename url -> album_url
+        try:
+            if 'url' in album and 'album_url' not in album:
+                album['album_url'] = album.get('url')
+                del album['url']
+        except Exception:
+            pass
+        normalized_albums.append(album)
+    payload['topAlbums'] = normalized_albums
+
+    # Similar artists: image only
+    sim_artists = payload.get('similarArtists') or []
+    normalized_sim = []
+    for ar in sim_artists:
+        artist = dict(ar)
+        img = _select_highest_quality_image(artist.get('image'))
+        if img:
+            artist['image'] = img.get('url') if isinstance(img, dict) else img
+        normalized_sim.append(artist)
+    payload['similarArtists'] = normalized_sim
+
+    return {"success": bool(data.get('success', True)), "data": payload}
+
+
+def _normalize_song_suggestions(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+    items = (data or {}).get('data') or []
+    normalized = []
+    for itm in items:
+        obj = dict(itm)
+        # Image
+        img = _select_highest_quality_image(obj.get('image'))
+        if img:
+            obj['image'] = img.get('url') if isinstance(img, dict) else img
+        # Primary artists only -> primaryartist string
+        try:
+            artists_block = obj.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            names = []
+            for a in primary_list:
+                name = (a or {}).get('name')
+                if name:
+                    names.append(name)
+            if names:
+                obj['primaryartist'] = ', '.join(names)
+            if 'artists' in obj:
+                del obj['artists']
+        except Exception:
+            if 'artists' in obj:
+                try:
+                    del obj['artists']
+                except Exception:
+                    pass
+        # Download url best
+        best_dl = _select_highest_quality_download_url(obj.get('downloadUrl'))
+        if best_dl:
+            obj['downloadUrl'] = best_dl
+        normalized.append(obj)
+    return {"success": bool(data.get('success', True)), "data": normalized}
+
+
+def _normalize_search_playlists(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+    payload = (data or {}).get('data') or {}
+    results = payload.get('results') or []
+    normalized = []
+    for item in results:
+        obj = dict(item)
+        img = _select_highest_quality_image(obj.get('image'))
+        if img:
+            obj['image'] = img.get('url') if isinstance(img, dict) else img
+        # Rename url -> playlist_url
+        try:
+            if 'url' in obj and 'playlist_url' not in obj:
+                obj['playlist_url'] = obj.get('url')
+                del obj['url']
+        except Exception:
+            pass
+        normalized.append(obj)
+    return {
+        "success": bool(data.get('success', True)),
+        "data": {
+            "total": payload.get('total'),
+            "start": payload.get('start'),
+            "results": normalized
+        }
+    }
+
+
+def _normalize_search_albums(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+    payload = (data or {}).get('data') or {}
+    results = payload.get('results') or []
+    normalized = []
+    for item in results:
+        obj = dict(item)
+        # primaryartist string
+        try:
+            artists_block = obj.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            names = []
+            for a in primary_list:
+                name = (a or {}).get('name')
+                if name:
+                    names.append(name)
+            if names:
+                obj['primaryartist'] = ', '.join(names)
+            if 'artists' in obj:
+                del obj['artists']
+        except Exception:
+            if 'artists' in obj:
+                try:
+                    del obj['artists']
+                except Exception:
+                    pass
+        # image collapse
+        img = _select_highest_quality_image(obj.get('image'))
+        if img:
+            obj['image'] = img.get('url') if isinstance(img, dict) else img
+        # rename url
+        try:
+            if 'url' in obj and 'album_url' not in obj:
+                obj['album_url'] = obj.get('url')
+                del obj['url']
+        except Exception:
+            pass
+        normalized.append(obj)
+    return {
+        "success": bool(data.get('success', True)),
+        "data": {
+            "total": payload.get('total'),
+            "start": payload.get('start'),
+            "results": normalized
+        }
+    }
+
+
+def _normalize_artist_songs(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+
+    payload = (data or {}).get('data') or {}
+    songs = payload.get('songs') or []
+    normalized_songs = []
+    
+    for song in songs:
+        song_obj = dict(song or {})
+        
+        # Image collapse
+        img = _select_highest_quality_image(song_obj.get('image'))
+        if img:
+            song_obj['image'] = img.get('url') if isinstance(img, dict) else img
+        
+        # Download best URL -> media_url
+        best_dl = _select_highest_quality_download_url(song_obj.get('downloadUrl'))
+        if best_dl:
+            song_obj['media_url'] = best_dl
+        
+        # Remove original downloadUrl array
+        try:
+            if 'downloadUrl' in song_obj:
+                del song_obj['downloadUrl']
+        except Exception:
+            pass
+        
+        # Artists -> primaryartist string
+        try:
+            artists_block = song_obj.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            names = []
+            for a in primary_list:
+                name = (a or {}).get('name')
+                if name:
+                    names.append(name)
+            if names:
+                song_obj['primaryartist'] = ', '.join(names)
+            if 'artists' in song_obj:
+                del song_obj['artists']
+        except Exception:
+            try:
+                if 'artists' in song_obj:
+                    del song_obj['artists']
+            except Exception:
+                pass
+        
+        # Remove redundant album object
+        try:
+            if 'album' in song_obj:
+                del song_obj['album']
+        except Exception:
+            pass
+        # Rename url -> perma_url
+        try:
+            if 'url' in song_obj and 'perma_url' not in song_obj:
+                song_obj['perma_url'] = song_obj.get('url')
+                del song_obj['url']
+        except Exception:
+            pass
+        # Rename keys: name -> song, primaryartist -> primary_artists
+        try:
+            if 'name' in song_obj and 'song' not in song_obj:
+                song_obj['song'] = song_obj.get('name')
+                del song_obj['name']
+        except Exception:
+            pass
+        try:
+            if 'primaryartist' in song_obj and 'primary_artists' not in song_obj:
+                song_obj['primary_artists'] = song_obj.get('primaryartist')
+                del song_obj['primaryartist']
+        except Exception:
+            pass
+        
+        normalized_songs.append(song_obj)
+    
+    payload['songs'] = normalized_songs
+    return {"success": bool(data.get('success', True)), "data": payload}
+
+
+def _normalize_artist_albums(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+
+    payload = (data or {}).get('data') or {}
+    albums = payload.get('albums') or payload.get('results') or []
+    normalized = []
+
+    for item in albums:
+        obj = dict(item or {})
+        # Collapse image to best url
+        img = _select_highest_quality_image(obj.get('image'))
+        if img:
+            obj['image'] = img.get('url') if isinstance(img, dict) else img
+
+        # If artists block is present, keep only primary names as string
+        try:
+            artists_block = obj.get('artists') or {}
+            primary_list = artists_block.get('primary') or []
+            names = []
+            for a in primary_list:
+                name = (a or {}).get('name')
+                if name:
+                    names.append(name)
+            if names:
+                obj['primaryartist'] = ', '.join(names)
+            if 'artists' in obj:
+                del obj['artists']
+        except Exception:
+            try:
+                if 'artists' in obj:
+                    del obj['artists']
+            except Exception:
+                pass
+
+        # Rename url -> album_url
+        try:
+            if 'url' in obj and 'album_url' not in obj:
+                obj['album_url'] = obj.get('url')
+                del obj['url']
+        except Exception:
+            pass
+
+        # Rename keys: name -> album, primaryartist -> primary_artists
+        try:
+            if 'name' in obj and 'album' not in obj:
+                obj['album'] = obj.get('name')
+                del obj['name']
+        except Exception:
+            pass
+        try:
+            if 'primaryartist' in obj and 'primary_artists' not in obj:
+                obj['primary_artists'] = obj.get('primaryartist')
+                del obj['primaryartist']
+        except Exception:
+            pass
+
+        normalized.append(obj)
+
+    payload['albums'] = normalized
+    # Remove legacy 'results' if present to avoid confusion
+    try:
+        if 'results' in payload:
+            del payload['results']
+    except Exception:
+        pass
+    return {"success": bool(data.get('success', True)), "data": payload}
+
+
+def _normalize_search_artists(data):
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Invalid response"}
+    payload = (data or {}).get('data') or {}
+    results = payload.get('results') or []
+    normalized = []
+    for item in results:
+        obj = dict(item)
+        img = _select_highest_quality_image(obj.get('image'))
+        if img:
+            obj['image'] = img.get('url') if isinstance(img, dict) else img
+        normalized.append(obj)
+    return {
+        "success": bool(data.get('success', True)),
+        "data": {
+            "total": payload.get('total'),
+            "start": payload.get('start'),
+            "results": normalized
+        }
+    }
@@ -0,0 +1,277 @@
+"""Offline load test of the API against the local stub upstream.
+
+Starts benchmarks/stub_upstream.py in-process and the API (gunicorn, uvicorn
+or the Flask development server) pointed at it, drives the routes listed in
+benchmarks/request_mix.json with a fixed number of concurrent clients, and
+reports throughput and p50/p95/p99 latency per route. The results are written
+as JSON; pass an earlier results file as --baseline to see the differences.
+
+Run from the repository root:
+    python benchmarks/load.py [--server gunicorn] [--workers 4] [--concurrency 16]
+        [--duration 20] [--latency 0.05] [--jitter 0.02] [--output results.json]
+        [--baseline previous.json] [--max-regression 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+WORDS = ("love", "tum", "dil", "night", "rain", "alone", "kesariya", "believer", "shape",
+         "summer", "dance", "heart", "jaan", "mera", "perfect", "yaar", "moon", "sky")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port, workers):
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+                "-b", f"127.0.0.1:{port}", "--access-logfile", "/dev/null", "app:app"]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning"]
+    return [sys.executable, "app.py"]
+
+
+def start_server(args, stub, tmpdir):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "JIOSAAVN_BASE_URL": stub.url,
+        "WORKER_BASE_URL": stub.url,
+        "VERCEL_BASE_URL": stub.url,
+        "SHARED_CACHE_URL": f"sqlite:///{os.path.join(tmpdir, 'cache.sqlite3')}",
+        "CATALOG_PATH": os.path.join(tmpdir, "catalog.sqlite3"),
+        "METRICS_DIR": os.path.join(tmpdir, "metrics"),
+    })
+    process = subprocess.Popen(server_command(args.server, port, args.workers), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"{args.server} exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/keep-alive/", timeout=1).status_code == 200:
+                return process, url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"{args.server} did not start within 30 seconds")
+
+
+class Values:
+    """Placeholder values for the request mix. Each kind has `distinct`
+    values, which controls how often a request can be answered from cache."""
+
+    def __init__(self, stub_url, distinct, rng):
+        self.stub_url = stub_url
+        self.distinct = distinct
+        self.rng = rng
+
+    def pick(self, prefix):
+        return f"{prefix}{self.rng.randrange(self.distinct):05d}"
+
+    def fill(self, template):
+        if isinstance(template, dict):
+            return {key: self.fill(value) for key, value in template.items()}
+        if template == "{song_id_list}":
+            return [self.pick("s") for _ in range(20)]
+        return template.format_map(_Lazy(self))
+
+
+class _Lazy(dict):
+    def __init__(self, values):
+        super().__init__()
+        self.values = values
+
+    def __missing__(self, key):
+        values = self.values
+        if key == "stub":
+            return values.stub_url
+        if key == "query":
+            word = values.rng.choice(WORDS)
+            return f"{word} {values.rng.randrange(values.distinct)}"
+        if key == "song_ids":
+            return ",".join(values.pick("s") for _ in range(10))
+        prefixes = {"song_id": "s", "artist_id": "a", "album_id": "al", "playlist_id": "p"}
+        return values.pick(prefixes[key])
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(len(sorted_values) * percent / 100)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for _, latency in samples)
+    errors = sum(1 for ok, _ in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def client(url, mix, weights, values, deadline, record, stop):
+    session = requests.Session()
+    while not stop.is_set() and time.monotonic() < deadline:
+        entry = values.rng.choices(mix, weights)[0]
+        params = values.fill(entry.get("params", {}))
+        body = values.fill(entry["json"]) if "json" in entry else None
+        start = time.perf_counter()
+        try:
+            response = session.request(entry.get("method", "GET"), url + entry["route"],
+                                       params=params, json=body, timeout=60)
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        record(entry["route"], ok, time.perf_counter() - start)
+
+
+def run_load(url, mix, args, stub_url, duration, seed):
+    weights = [entry.get("weight", 1) for entry in mix]
+    samples = {}
+    lock = threading.Lock()
+
+    def record(route, ok, latency):
+        with lock:
+            samples.setdefault(route, []).append((ok, latency))
+
+    stop = threading.Event()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, daemon=True, args=(
+            url, mix, weights, Values(stub_url, args.distinct, random.Random(seed + i)),
+            deadline, record, stop))
+        for i in range(args.concurrency)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - start
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """Print p95 and throughput changes per route; return the routes whose
+    p95 got worse by more than max_regression percent."""
+    regressions = []
+    print(f"\n{'route':<22} {'p95 before':>11} {'p95 now':>9} {'change':>8} {'rps change':>11}")
+    for route, now in sorted(results["routes"].items()):
+        before = baseline.get("routes", {}).get(route)
+        if not before or not before.get("p95_ms") or not now.get("p95_ms"):
+            continue
+        change = (now["p95_ms"] / before["p95_ms"] - 1) * 100
+        rps_change = (now["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+        print(f"{route:<22} {before['p95_ms']:>9.1f}ms {now['p95_ms']:>7.1f}ms {change:>7.1f}% {rps_change:>10.1f}%")
+        if max_regression is not None and change > max_regression:
+            regressions.append(route)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn", "flask"), default="gunicorn")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--distinct", type=int, default=200,
+                        help="distinct values per placeholder (fewer means more cache hits)")
+    parser.add_argument("--mix", default=os.path.join(HERE, "request_mix.json"))
+    parser.add_argument("--latency", type=float, default=0.05, help="stub upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="stub upstream jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub upstream 503 rate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit with status 1 when a route's p95 is this many percent worse than the baseline")
+    args = parser.parse_args()
+
+    with open(args.mix) as f:
+        mix = json.load(f)
+
+    stub = StubUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        seed=args.seed).start()
+    process = None
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            if args.url:
+                url = args.url.rstrip("/")
+            else:
+                process, url = start_server(args, stub, tmpdir)
+            if args.warmup:
+                run_load(url, mix, args, stub.url, args.warmup, args.seed + 10000)
+            samples, elapsed = run_load(url, mix, args, stub.url, args.duration, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+            stub.close()
+
+    everything = [sample for route_samples in samples.values() for sample in route_samples]
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "upstream_requests": stub.requests,
+        "total": summarize(everything, elapsed),
+        "routes": {route: summarize(route_samples, elapsed) for route, route_samples in sorted(samples.items())},
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'route':<22} {'requests':>9} {'errors':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, row in list(results["routes"].items()) + [("all", results["total"])]:
+        print(f"{route:<22} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms")
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            sys.exit(f"p95 regressed by more than {args.max_regression}% on: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
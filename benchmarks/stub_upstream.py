@@ -0,0 +1,323 @@
+"""Local stand-in for the three upstream backends (jiosaavn.com api.php, the
+Cloudflare Worker and the Vercel deployment), with injectable latency and
+errors. Used to exercise the circuit breaker, hedging and failover in
+upstream.py/jiosaavn.py, and by the offline benchmarks.
+
+Served routes:
+- /api.php: autocomplete.get, song.getDetails, lyrics.getLyrics and
+  playlist.getDetails, with generated songs (encrypted media URLs included)
+- /api/...: the saavn.dev routes, answered from benchmarks/fixtures/
+- /song/, /album/, /featured/ and /playlist/ links: pages carrying the ID
+  (the last path segment) the way jiosaavn.com pages do. Put "saavn" in
+  the slug so the API treats them as links, e.g. <stub>/song/saavn-x/AbCd1234
+
+Run it and point the API at it:
+    python benchmarks/stub_upstream.py --port 8700 --latency 0.05 --error-rate 0.1
+    JIOSAAVN_BASE_URL=http://127.0.0.1:8700 WORKER_BASE_URL=http://127.0.0.1:8700 \\
+    VERCEL_BASE_URL=http://127.0.0.1:8700 python app.py
+
+Or from Python:
+    stub = StubUpstream(latency=0.02).start()
+    ...
+    stub.error_rate = 1.0   # every request now fails with a 503
+    stub.close()
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pyDes import des, ECB, PAD_PKCS5
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+AUTOCOMPLETE_HITS = 5
+# helper.DES_KEY; not imported so that the stub can start before the API
+# modules read their *_BASE_URL settings
+DES_KEY = b"38346591"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+        return f.read()
+
+
+def _song_id(seed):
+    return base64.urlsafe_b64encode(hashlib.sha1(seed.encode()).digest())[:8].decode()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop connections on purpose (cancelled hedged requests)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubUpstream:
+    """Threaded HTTP server answering like the upstream backends.
+    The fault settings (latency, jitter, slow_rate, slow_latency, error_rate)
+    are plain attributes and can be changed while it runs."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 slow_rate=0.0, slow_latency=1.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cipher = des(DES_KEY, ECB, b"\0\0\0\0\0\0\0\0", pad=None, padmode=PAD_PKCS5)
+        self._encrypted = {}
+        self._fixtures = {}
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, keep-alive
+            # clients wait ~40ms for the delayed ACK on every response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub._handle(self)
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        self.address = self._server.server_address
+
+    @property
+    def url(self):
+        return f"http://{self.address[0]}:{self.address[1]}"
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Faults
+
+    def _fault(self):
+        """Sleep for the configured latency; True when this request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                delay = self.slow_latency
+            failed = bool(self.error_rate) and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if delay > 0:
+            time.sleep(delay)
+        return failed
+
+    def _handle(self, request):
+        # get_song_id sends a form body even with GET; read it so the
+        # connection can be reused
+        length = int(request.headers.get("Content-Length") or 0)
+        if length:
+            request.rfile.read(length)
+        if self._fault():
+            self._send(request, 503, b'{"error": "injected failure"}')
+            return
+        parts = urllib.parse.urlsplit(request.path)
+        params = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        content_type = "application/json"
+        try:
+            if parts.path == "/api.php":
+                body = self._api_php(params)
+            elif parts.path.startswith("/api/"):
+                body = self._saavn_dev(parts.path, params)
+            else:
+                body = self._page(parts.path)
+                content_type = "text/html; charset=utf-8"
+        except Exception as e:
+            self._send(request, 500, json.dumps({"error": str(e)}).encode())
+            return
+        if body is None:
+            self._send(request, 404, b'{"success": false, "message": "not found"}')
+        else:
+            self._send(request, 200, body, content_type)
+
+    def _send(self, request, status, body, content_type="application/json"):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    # jiosaavn.com api.php
+
+    def _api_php(self, params):
+        call = params.get("__call")
+        if call == "autocomplete.get":
+            query = params.get("query", "")
+            hits = [{"id": _song_id(f"{query}:{i}"), "title": f"{query} {i}", "type": "song"}
+                    for i in range(AUTOCOMPLETE_HITS)]
+            return json.dumps({"songs": {"data": hits, "position": 1}}).encode()
+        if call == "song.getDetails":
+            ids = [id for id in params.get("pids", "").split(",") if id]
+            return json.dumps({id: self.legacy_song(id) for id in ids}).encode()
+        if call == "lyrics.getLyrics":
+            id = params.get("lyrics_id", "")
+            return json.dumps({"lyrics": f"Lyrics of {id}<br>second line"}).encode()
+        if call == "playlist.getDetails":
+            listid = params.get("listid", "")
+            songs = [self.legacy_song(_song_id(f"{listid}:{i}")) for i in range(20)]
+            return json.dumps({"listid": listid, "listname": f"Playlist {listid}",
+                               "firstname": "Stub", "songs": songs}).encode()
+        return None
+
+    def _encrypted_url(self, id):
+        enc = self._encrypted.get(id)
+        if enc is None:
+            plain = f"https://aac.saavncdn.com/000/{id}_96.mp4".encode()
+            with self._lock:
+                enc = base64.b64encode(self._cipher.encrypt(plain, padmode=PAD_PKCS5)).decode()
+            self._encrypted[id] = enc
+        return enc
+
+    def legacy_song(self, id):
+        """A song.getDetails entry for any ID."""
+        return {
+            "id": id,
+            "type": "",
+            "song": f"Song {id} (From &quot;Stub&quot;)",
+            "album": f"Album of {id}",
+            "year": "2023",
+            "music": "Stub Composer",
+            "music_id": "1",
+            "primary_artists": "Stub Singer &amp; Band",
+            "primary_artists_id": "2",
+            "featured_artists": "",
+            "singers": "Stub Singer",
+            "starring": "",
+            "image": f"https://c.saavncdn.com/000/{id}-150x150.jpg",
+            "label": "Stub Records",
+            "albumid": "3",
+            "language": "hindi",
+            "origin": "none",
+            "play_count": "1000",
+            "copyright_text": "&copy; 2023 Stub Records",
+            "320kbps": "true",
+            "is_dolby_content": False,
+            "explicit_content": "0",
+            "has_lyrics": "true",
+            "lyrics_snippet": "",
+            "encrypted_media_url": self._encrypted_url(id),
+            "encrypted_media_path": "",
+            "media_preview_url": f"https://preview.saavncdn.com/000/{id}_96_p.mp4",
+            "perma_url": f"https://www.jiosaavn.com/song/stub/{id}",
+            "album_url": "https://www.jiosaavn.com/album/stub/3",
+            "duration": "215",
+            "rights": {"code": 0, "reason": ""},
+            "webp": True,
+            "starred": "false",
+            "artistMap": {},
+            "release_date": "2023-01-01",
+            "vcode": "",
+            "vlink": "",
+            "triller_available": False,
+            "label_url": "/label/stub-records",
+        }
+
+    # jiosaavn.com pages
+
+    def _page(self, path):
+        parts = [p for p in path.split("/") if p]
+        if len(parts) < 2:
+            return None
+        kind, id = parts[0], parts[-1]
+        if kind == "song":
+            marker = f'"pid":"{id}","'
+        elif kind == "album":
+            marker = f'"album_id":"{id}"'
+        elif kind in ("featured", "playlist"):
+            marker = f'"type":"playlist","id":"{id}"'
+        else:
+            return None
+        return f"<html><script>window.__INITIAL_DATA__ = {{{marker}}}</script></html>".encode()
+
+    # saavn.dev routes (Worker / Vercel)
+
+    def _fixture(self, name):
+        body = self._fixtures.get(name)
+        if body is None:
+            body = self._fixtures[name] = load_fixture(name)
+        return body
+
+    def _saavn_dev(self, path, params):
+        parts = [p for p in path.split("/") if p]
+        if not parts or parts[0] != "api":
+            return None
+        route = parts[1:]
+        if route == ["search"]:
+            return self._fixture("global_search")
+        if route == ["search", "songs"]:
+            songs = json.loads(self._fixture("artist_songs"))["data"]["songs"]
+            limit = int(params.get("limit") or 10)
+            return json.dumps({"success": True, "data": {
+                "total": len(songs), "start": 0, "results": songs[:limit]}}).encode()
+        if route == ["search", "playlists"]:
+            return self._fixture("search_playlists")
+        if route == ["search", "albums"]:
+            return self._fixture("search_albums")
+        if route == ["search", "artists"]:
+            return self._fixture("search_artists")
+        if route == ["albums"]:
+            return self._fixture("album")
+        if len(route) == 2 and route[0] == "artists":
+            return self._fixture("artist_details")
+        if len(route) == 3 and route[0] == "artists" and route[2] in ("songs", "albums"):
+            return self._fixture(f"artist_{route[2]}")
+        if len(route) == 3 and route[0] == "songs" and route[2] == "suggestions":
+            return self._fixture("song_suggestions")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that are slow")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="latency of the slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.host, args.port, args.latency, args.jitter, args.slow_rate,
+                        args.slow_latency, args.error_rate, args.seed)
+    print(f"Stub upstream listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
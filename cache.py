@@ -0,0 +1,515 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import functools
+import contextvars
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import shared_cache
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() != "false"
+
+# Default TTLs in seconds per data type. Override with CACHE_TTL_<NAME>.
+DEFAULT_TTLS = {
+    "song": 6 * 3600,
+    "lyrics": 7 * 24 * 3600,
+    "album": 6 * 3600,
+    "playlist": 30 * 60,
+    "artist": 3600,
+    "search": 120,
+    "autocomplete": 600,
+}
+
+# Seconds past the TTL during which an entry is still served while it is
+# refreshed in the background (stale-while-revalidate). After that the caller
+# blocks on a new upstream call. Override with CACHE_STALE_TTL_<NAME>.
+DEFAULT_STALE_TTLS = {
+    "search": 3600,
+    "artist": 24 * 3600,
+}
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 2048))
+# Serialized and compressed responses (http_cache.py) are far larger than
+# normalized entries. Override with CACHE_MAX_ENTRIES_<NAME>.
+DEFAULT_TYPE_MAX_ENTRIES = {
+    "response": 256,
+}
+REFRESH_WORKERS = int(os.environ.get("CACHE_REFRESH_WORKERS", 2))
+
+# How the cached lookups of the current request were answered, from cheapest
+# to most expensive. The most expensive one is reported in the X-Cache header.
+STATES = ("fresh", "stale", "revalidated")
+_state = contextvars.ContextVar("cache_state", default=None)
+
+# Shortest TTL and stale TTL of the data types the current request read, for
+# Cache-Control. A dict shared with the tasks the request spawns; "failed" is
+# set when a lookup returned an uncacheable value.
+_freshness = contextvars.ContextVar("cache_freshness", default=None)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_refresh_tasks = set()
+_refresh_executor = None
+_refresh_executor_pid = None
+_refresh_executor_lock = threading.Lock()
+
+
+def ttl_for(name):
+    return int(os.environ.get(f"CACHE_TTL_{name.upper()}", DEFAULT_TTLS.get(name, 300)))
+
+
+def stale_ttl_for(name):
+    return int(os.environ.get(f"CACHE_STALE_TTL_{name.upper()}", DEFAULT_STALE_TTLS.get(name, 0)))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL.
+    With a stale_ttl, entries stay available for that much longer but are
+    reported as no longer fresh."""
+
+    def __init__(self, name, ttl, max_entries, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get(self, key):
+        """Return (found, value)."""
+        found, value, _ = self.get_entry(key)
+        return found, value
+
+    def get_entry(self, key):
+        """Return (found, value, fresh)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None, False
+            expires_at, fresh_until, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None, False
+            self._data.move_to_end(key)
+            self.hits += 1
+            if fresh_until <= now:
+                self.stale_hits += 1
+                return True, value, False
+            return True, value, True
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        fresh_until = time.monotonic() + (self.ttl if ttl is None else ttl)
+        expires_at = fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        with self._lock:
+            self._data[key] = (expires_at, fresh_until, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def record_refresh(self, ok):
+        with self._lock:
+            if ok:
+                self.refreshes += 1
+            else:
+                self.refresh_failures += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stale_hits": self.stale_hits,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name):
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                max_entries = int(os.environ.get(f"CACHE_MAX_ENTRIES_{name.upper()}",
+                                                 DEFAULT_TYPE_MAX_ENTRIES.get(name, DEFAULT_MAX_ENTRIES)))
+                cache = TTLCache(name, ttl_for(name), max_entries, stale_ttl_for(name))
+                _caches[name] = cache
+    return cache
+
+
+def _missing_lyrics(song):
+    # Lyrics were requested (the key is set) but could not be fetched
+    return isinstance(song, dict) and song.get("lyrics", "") is None and song.get("has_lyrics") == "true"
+
+
+def is_cacheable(value):
+    """Failures (None, empty results, success/status False) are never cached,
+    nor are songs and playlists whose requested lyrics failed to load."""
+    if not value:
+        return False
+    if isinstance(value, dict):
+        if value.get("success") is False or value.get("status") is False:
+            return False
+        songs = value.get("songs")
+        if _missing_lyrics(value) or (isinstance(songs, list) and any(map(_missing_lyrics, songs))):
+            return False
+    return True
+
+
+def shared_key(name, cache_key):
+    return f"{name}:{json.dumps(cache_key, separators=(',', ':'))}"
+
+
+def _fill_local(cache, cache_key, value, remaining):
+    """Copy a shared-tier hit into the local tier without outliving it.
+    Returns whether the entry is still fresh."""
+    fresh_for = min(cache.ttl, remaining - cache.stale_ttl)
+    if fresh_for > 0:
+        cache.set(cache_key, value, ttl=fresh_for, stale_ttl=remaining - fresh_for)
+        return True
+    cache.set(cache_key, value, ttl=0, stale_ttl=remaining)
+    return False
+
+
+def _store_both(cache, cache_key, shared, skey, value):
+    if is_cacheable(value):
+        cache.set(cache_key, value)
+        shared.set(skey, value, cache.ttl + cache.stale_ttl)
+        return True
+    return False
+
+
+def lookup(name, cache_key):
+    """Read one entry through both tiers. Returns (found, value)."""
+    if not CACHE_ENABLED:
+        return False, None
+    cache = get_cache(name)
+    found, value = cache.get(cache_key)
+    if found:
+        note_state("fresh")
+        note_type(name, value)
+        return True, value
+    found, value, remaining = shared_cache.get_shared_cache().get(shared_key(name, cache_key))
+    if found:
+        _fill_local(cache, cache_key, value, remaining)
+        note_state("fresh")
+        note_type(name, value)
+    return found, value
+
+
+def store(name, cache_key, value):
+    """Write one entry to both tiers, for callers that fetch in bulk."""
+    note_type(name, value)
+    if not CACHE_ENABLED:
+        return
+    cache = get_cache(name)
+    _store_both(cache, cache_key, shared_cache.get_shared_cache(), shared_key(name, cache_key), value)
+
+
+def note_state(state):
+    """Record how a cached lookup was answered for the current request."""
+    current = _state.get()
+    if current is None or STATES.index(state) > STATES.index(current):
+        _state.set(state)
+
+
+def note_type(name, value):
+    """Record that the current request read `value` of data type `name`."""
+    freshness = _freshness.get()
+    if freshness is None:
+        return
+    if not is_cacheable(value):
+        freshness["failed"] = True
+        return
+    cache = get_cache(name)
+    if "ttl" not in freshness or cache.ttl < freshness["ttl"]:
+        freshness["ttl"] = cache.ttl
+    if "stale_ttl" not in freshness or cache.stale_ttl < freshness["stale_ttl"]:
+        freshness["stale_ttl"] = cache.stale_ttl
+
+
+def note_failure():
+    """Mark the current response as incomplete, so it is not cached downstream."""
+    freshness = _freshness.get()
+    if freshness is not None:
+        freshness["failed"] = True
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call (shared tier, catalog) in the default executor,
+    in a copy of the request's context. The X-Cache state it records is
+    carried back to the request."""
+    context = contextvars.copy_context()
+    result = await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+    state = context.get(_state)
+    if state:
+        note_state(state)
+    return result
+
+
+def reset_state():
+    _state.set(None)
+    _freshness.set({})
+
+
+def response_state():
+    """fresh, stale or revalidated for the lookups made by this request, or
+    None if it made none."""
+    return _state.get()
+
+
+def response_ttls():
+    """(ttl, stale_ttl) of the data read by this request, or None if it read
+    no cached data type or one of its lookups failed."""
+    freshness = _freshness.get()
+    if not freshness or freshness.get("failed") or "ttl" not in freshness:
+        return None
+    return freshness["ttl"], freshness["stale_ttl"]
+
+
+def _get_refresh_executor():
+    global _refresh_executor, _refresh_executor_pid
+    pid = os.getpid()
+    if _refresh_executor is None or _refresh_executor_pid != pid:
+        with _refresh_executor_lock:
+            if _refresh_executor is None or _refresh_executor_pid != pid:
+                _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS,
+                                                       thread_name_prefix="cache-refresh")
+                _refresh_executor_pid = pid
+    return _refresh_executor
+
+
+def _claim_refresh(skey):
+    """Only one background refresh per key and worker at a time."""
+    with _refreshing_lock:
+        if skey in _refreshing:
+            return False
+        _refreshing.add(skey)
+        return True
+
+
+def _finish_refresh(skey):
+    with _refreshing_lock:
+        _refreshing.discard(skey)
+
+
+def _refresh(cache, cache_key, shared, skey, func, args, kwargs):
+    try:
+        found, value, remaining = shared.get(skey)
+        if found and remaining > cache.stale_ttl:
+            # Another worker already refreshed it
+            _fill_local(cache, cache_key, value, remaining)
+            return
+        lock_key = f"refresh:{skey}"
+        token = shared.acquire(lock_key, singleflight.LOCK_TTL)
+        if not token:
+            return
+        try:
+            ok = _store_both(cache, cache_key, shared, skey, func(*args, **kwargs))
+        finally:
+            shared.release(lock_key, token)
+        cache.record_refresh(ok)
+        if not ok:
+            logger.info(f"Refresh of {skey} failed upstream, serving the stale entry")
+    except Exception as e:
+        cache.record_refresh(False)
+        logger.warning(f"Refresh of {skey} failed: {str(e)}")
+    finally:
+        _finish_refresh(skey)
+
+
+async def _refresh_async(cache, cache_key, shared, skey, func, args, kwargs):
+    loop = asyncio.get_running_loop()
+    try:
+        found, value, remaining = await loop.run_in_executor(None, shared.get, skey)
+        if found and remaining > cache.stale_ttl:
+            _fill_local(cache, cache_key, value, remaining)
+            return
+        lock_key = f"refresh:{skey}"
+        token = await loop.run_in_executor(None, shared.acquire, lock_key, singleflight.LOCK_TTL)
+        if not token:
+            return
+        try:
+            value = await func(*args, **kwargs)
+            ok = await loop.run_in_executor(None, _store_both, cache, cache_key, shared, skey, value)
+        finally:
+            await loop.run_in_executor(None, shared.release, lock_key, token)
+        cache.record_refresh(ok)
+        if not ok:
+            logger.info(f"Refresh of {skey} failed upstream, serving the stale entry")
+    except Exception as e:
+        cache.record_refresh(False)
+        logger.warning(f"Refresh of {skey} failed: {str(e)}")
+    finally:
+        _finish_refresh(skey)
+
+
+def cached(name, key=None):
+    """Cache the normalized return value of a lookup function.
+    `key` builds the cache key from the call arguments; by default the
+    positional and keyword arguments are used as-is.
+    Lookups go to the in-process LRU first, then to the shared tier that
+    all workers on the host (or cluster) see. Concurrent misses for the same
+    key are coalesced into a single upstream call.
+    For data types with a stale TTL, entries past their TTL are still returned
+    and refreshed in the background, once per key.
+    Works for both plain functions and coroutine functions.
+    """
+    def decorator(func):
+        def make_key(args, kwargs):
+            return key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not CACHE_ENABLED:
+                    value = await func(*args, **kwargs)
+                    note_type(name, value)
+                    return value
+                cache_key = make_key(args, kwargs)
+                cache = get_cache(name)
+                found, value, fresh = cache.get_entry(cache_key)
+                if fresh:
+                    note_state("fresh")
+                    note_type(name, value)
+                    return value
+                loop = asyncio.get_running_loop()
+                shared = shared_cache.get_shared_cache()
+                skey = shared_key(name, cache_key)
+                if not found:
+                    found, value, remaining = await loop.run_in_executor(None, shared.get, skey)
+                    if found:
+                        fresh = _fill_local(cache, cache_key, value, remaining)
+                if found:
+                    if not fresh and _claim_refresh(skey):
+                        task = loop.create_task(_refresh_async(cache, cache_key, shared, skey, func, args, kwargs))
+                        _refresh_tasks.add(task)
+                        task.add_done_callback(_refresh_tasks.discard)
+                    note_state("fresh" if fresh else "stale")
+                    note_type(name, value)
+                    return value
+
+                async def load():
+                    value = await func(*args, **kwargs)
+                    await loop.run_in_executor(None, _store_both, cache, cache_key, shared, skey, value)
+                    return value
+
+                def peek():
+                    found, value, _ = shared.get(skey)
+                    return found, value
+
+                value = await singleflight.do_async(skey, load, peek=peek, shared=shared)
+                note_state("revalidated")
+                note_type(name, value)
+                return value
+            async_wrapper.uncached = func
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                value = func(*args, **kwargs)
+                note_type(name, value)
+                return value
+            cache_key = make_key(args, kwargs)
+            cache = get_cache(name)
+            found, value, fresh = cache.get_entry(cache_key)
+            if fresh:
+                note_state("fresh")
+                note_type(name, value)
+                return value
+            shared = shared_cache.get_shared_cache()
+            skey = shared_key(name, cache_key)
+            if not found:
+                found, value, remaining = shared.get(skey)
+                if found:
+                    fresh = _fill_local(cache, cache_key, value, remaining)
+            if found:
+                if not fresh and _claim_refresh(skey):
+                    try:
+                        _get_refresh_executor().submit(_refresh, cache, cache_key, shared, skey, func, args, kwargs)
+                    except RuntimeError:
+                        # Interpreter shutting down
+                        _finish_refresh(skey)
+                note_state("fresh" if fresh else "stale")
+                note_type(name, value)
+                return value
+
+            def load():
+                value = func(*args, **kwargs)
+                _store_both(cache, cache_key, shared, skey, value)
+                return value
+
+            def peek():
+                found, value, _ = shared.get(skey)
+                return found, value
+
+            value = singleflight.do(skey, load, peek=peek, shared=shared)
+            note_state("revalidated")
+            note_type(name, value)
+            return value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _metric_samples():
+    samples = []
+    for name, cache in list(_caches.items()):
+        with cache._lock:
+            fresh = cache.hits - cache.stale_hits
+            samples.append((metrics.CACHE_LOOKUPS, (name, "fresh"), fresh))
+            samples.append((metrics.CACHE_LOOKUPS, (name, "stale"), cache.stale_hits))
+            samples.append((metrics.CACHE_LOOKUPS, (name, "miss"), cache.misses))
+            samples.append((metrics.CACHE_EVICTIONS, (name,), cache.evictions))
+            samples.append((metrics.CACHE_ENTRIES, (name,), len(cache._data)))
+    return samples
+
+
+metrics.register_collector(_metric_samples)
+
+
+def stats():
+    result = {name: cache.stats() for name, cache in list(_caches.items())}
+    result["shared"] = shared_cache.get_shared_cache().stats()
+    return result
@@ -0,0 +1,146 @@
+"""Record and replay upstream traffic.
+
+UPSTREAM_CASSETTE_MODE=record stores every upstream response (except 5xx and
+429) in the SQLite file UPSTREAM_CASSETTE, keyed by normalize_url(url).
+Bodies are zlib compressed.
+UPSTREAM_CASSETTE_MODE=replay answers upstream.get/aget from that file
+without touching the network; URLs that were not recorded fail with
+CassetteMiss, a ConnectionError, so callers handle them like an unreachable
+backend.
+
+Recording against live backends captures real payload shapes (300-track
+playlists, large artist pages) for the benchmarks; replaying gives
+deterministic performance and equivalence tests.
+
+    python cassette.py [path]    # list the recorded URLs
+"""
+import os
+import sys
+import time
+import zlib
+import sqlite3
+import logging
+import tempfile
+import threading
+import urllib.parse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+MODE = os.environ.get("UPSTREAM_CASSETTE_MODE", "off").lower()
+PATH = os.environ.get("UPSTREAM_CASSETTE") or os.path.join(tempfile.gettempdir(), "jiosaavn-api-cassette.sqlite3")
+
+if MODE not in ("off", "record", "replay"):
+    logger.warning(f"Unknown UPSTREAM_CASSETTE_MODE {MODE!r}, cassette disabled")
+    MODE = "off"
+
+RECORDING = MODE == "record"
+REPLAYING = MODE == "replay"
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Raised in replay mode for URLs that are not in the cassette."""
+
+
+def normalize_url(url):
+    """Cassette key: path plus the query parameters sorted, without scheme and
+    host, so a cassette recorded against the live backends also replays for
+    mirrors or stub servers configured through the *_BASE_URL settings."""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.path or '/'}?{query}" if query else (parts.path or "/")
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cassette ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, reason TEXT, "
+            "content_type TEXT, encoding TEXT, body BLOB NOT NULL, recorded_at REAL NOT NULL)"
+        )
+
+    @property
+    def conn(self):
+        # sqlite connections must not cross threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, url, response):
+        encoding = response.encoding
+        if encoding is None and hasattr(response, "apparent_encoding"):
+            encoding = response.apparent_encoding
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cassette "
+            "(key, url, status, reason, content_type, encoding, body, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (normalize_url(url), url, response.status_code, response.reason,
+             response.headers.get("Content-Type"), encoding, zlib.compress(response.content), time.time()),
+        )
+
+    def lookup(self, url):
+        """(status, reason, headers, content, encoding) or None."""
+        row = self.conn.execute(
+            "SELECT status, reason, content_type, encoding, body FROM cassette WHERE key = ?",
+            (normalize_url(url),),
+        ).fetchone()
+        if row is None:
+            return None
+        status, reason, content_type, encoding, body = row
+        headers = {"Content-Type": content_type} if content_type else {}
+        return status, reason, headers, zlib.decompress(body), encoding
+
+    def entries(self):
+        """(url, status, compressed size, recorded_at) of every entry."""
+        return self.conn.execute(
+            "SELECT url, status, length(body), recorded_at FROM cassette ORDER BY key"
+        ).fetchall()
+
+    def payloads(self):
+        """(url, content) of every entry."""
+        for url, body in self.conn.execute("SELECT url, body FROM cassette ORDER BY key"):
+            yield url, zlib.decompress(body)
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    global _cassette
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(PATH)
+                logger.info(f"Upstream cassette {MODE}: {PATH}")
+    return _cassette
+
+
+def record(url, response):
+    try:
+        get_cassette().record(url, response)
+    except sqlite3.Error as e:
+        logger.error(f"Could not record {url}: {str(e)}")
+
+
+def lookup(url):
+    entry = get_cassette().lookup(url)
+    if entry is None:
+        raise CassetteMiss(f"{url} is not in the cassette {PATH}")
+    return entry
+
+
+if __name__ == "__main__":
+    cassette = Cassette(sys.argv[1] if len(sys.argv) > 1 else PATH)
+    total = 0
+    for url, status, size, recorded_at in cassette.entries():
+        total += size
+        print(f"{status} {size:>9} {time.strftime('%Y-%m-%d %H:%M', time.localtime(recorded_at))} {url}")
+    print(f"{total} bytes compressed")
@@ -0,0 +1,462 @@
+"""Persistent catalog of every song, album and artist the API has served.
+
+Songs from song.getDetails (get_song, get_multiple_songs), albums from
+get_album_by_link and artist song lists from get_artist_songs are kept in the
+SQLite file CATALOG_PATH, shared by every worker on the host and kept across
+restarts. /song/get/ and /song/get-multiple/ answer known song IDs from it
+when the in-memory and shared caches miss:
+
+- rows younger than CATALOG_REFRESH_AGE are served as they are
+- older rows are still served, and re-fetched in the background, once per ID
+- rows older than CATALOG_MAX_AGE are not served at all
+
+Only song.getDetails songs ("details" rows) are served: songs seen in
+albums, artist lists and song search results have other shapes, so they are
+stored for their titles, albums and artists but never replace a details row.
+The song, album, playlist and artist results of global searches and
+autocompletes are kept as they are in search_items, for the local search
+index (search_index.py).
+
+Writes never add latency to a request: they are queued and a background
+thread per worker upserts them in batches of up to CATALOG_BATCH_SIZE, one
+transaction per batch. When the queue is full, writes are dropped.
+
+    python catalog.py [path]    # row counts and ages
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import tempfile
+import threading
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ENABLED = os.environ.get("CATALOG_ENABLED", "true").lower() != "false"
+CATALOG_PATH = os.environ.get("CATALOG_PATH") or os.path.join(tempfile.gettempdir(), "jiosaavn-api-catalog.sqlite3")
+CATALOG_REFRESH_AGE = int(os.environ.get("CATALOG_REFRESH_AGE", 24 * 3600))
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", 30 * 24 * 3600))
+CATALOG_BATCH_SIZE = int(os.environ.get("CATALOG_BATCH_SIZE", 500))
+CATALOG_QUEUE_SIZE = int(os.environ.get("CATALOG_QUEUE_SIZE", 10000))
+
+# Rows that /song/get/ can serve
+DETAILS = "details"
+
+# Bound parameters per IN (...) query, below SQLite's limit
+READ_CHUNK_SIZE = 500
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS songs ("
+    "id TEXT PRIMARY KEY, title TEXT, album TEXT, album_id TEXT, artists TEXT, language TEXT, year TEXT, "
+    "source TEXT NOT NULL, data BLOB NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS songs_album_id ON songs (album_id)",
+    "CREATE INDEX IF NOT EXISTS songs_updated_at ON songs (updated_at)",
+    "CREATE TABLE IF NOT EXISTS albums ("
+    "id TEXT PRIMARY KEY, title TEXT, artists TEXT, language TEXT, year TEXT, "
+    "data BLOB NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS albums_updated_at ON albums (updated_at)",
+    "CREATE TABLE IF NOT EXISTS artists ("
+    "id TEXT PRIMARY KEY, name TEXT, song_total INTEGER, updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS song_artists ("
+    "artist_id TEXT NOT NULL, song_id TEXT NOT NULL, PRIMARY KEY (artist_id, song_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS song_artists_song_id ON song_artists (song_id)",
+    "CREATE TABLE IF NOT EXISTS search_items ("
+    "kind TEXT NOT NULL, id TEXT NOT NULL, title TEXT, subtitle TEXT, data BLOB NOT NULL, "
+    "hits INTEGER NOT NULL DEFAULT 1, updated_at REAL NOT NULL, PRIMARY KEY (kind, id))",
+)
+
+# Columns added after the first release, created on existing files
+MIGRATIONS = (
+    ("songs", "play_count", "ALTER TABLE songs ADD COLUMN play_count INTEGER"),
+)
+
+# A details row is only replaced by another details row
+UPSERT_SONG = (
+    "INSERT INTO songs (id, title, album, album_id, artists, language, year, source, data, updated_at, play_count) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET title = excluded.title, album = excluded.album, "
+    "album_id = coalesce(excluded.album_id, songs.album_id), artists = excluded.artists, "
+    "language = excluded.language, year = excluded.year, source = excluded.source, "
+    "data = excluded.data, updated_at = excluded.updated_at, play_count = excluded.play_count "
+    f"WHERE excluded.source = '{DETAILS}' OR songs.source != '{DETAILS}'"
+)
+UPSERT_ALBUM = (
+    "INSERT OR REPLACE INTO albums (id, title, artists, language, year, data, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+UPSERT_ARTIST = (
+    "INSERT INTO artists (id, name, song_total, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET name = coalesce(excluded.name, artists.name), "
+    "song_total = coalesce(excluded.song_total, artists.song_total), updated_at = excluded.updated_at"
+)
+LINK_ARTIST = "INSERT OR IGNORE INTO song_artists (artist_id, song_id) VALUES (?, ?)"
+UPSERT_SEARCH_ITEM = (
+    "INSERT INTO search_items (kind, id, title, subtitle, data, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (kind, id) DO UPDATE SET title = excluded.title, subtitle = excluded.subtitle, "
+    "data = excluded.data, hits = search_items.hits + 1, updated_at = excluded.updated_at"
+)
+
+# Global search sections and the item types kept from them
+SEARCH_SECTIONS = ("topQuery", "songs", "albums", "playlists", "artists")
+SEARCH_KINDS = ("song", "album", "playlist", "artist")
+
+# Fields of a song that depend on the request, not on the song
+REQUEST_FIELDS = ("lyrics",)
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _song_row(song, source, album_id, album, now):
+    data = {key: value for key, value in song.items() if key not in REQUEST_FIELDS}
+    return (
+        song["id"], _text(song.get("song")), _text(song.get("album") or album),
+        _text(song.get("albumid") or album_id), _text(song.get("primary_artists")),
+        _text(song.get("language")), _text(song.get("year")), source, fast_json.dumps(data), now,
+        _int(song.get("play_count", song.get("playCount"))),
+    )
+
+
+def _search_item_row(item, now):
+    subtitle = " ".join(str(item[key]) for key in ("album", "primaryArtists", "description") if item.get(key))
+    return (item["type"], item["id"], _text(item.get("title")), subtitle, fast_json.dumps(item), now)
+
+
+def _song_artists(song):
+    """(artist_id, name) of a details song's primary artists. Names are only
+    known when they split into as many parts as there are IDs."""
+    ids = [id.strip() for id in str(song.get("primary_artists_id") or "").split(",") if id.strip()]
+    names = [name.strip() for name in str(song.get("primary_artists") or "").split(",")]
+    if len(names) != len(ids):
+        names = [None] * len(ids)
+    return zip(ids, names)
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        for table, column, statement in MIGRATIONS:
+            if column not in {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}:
+                self.conn.execute(statement)
+
+    @property
+    def conn(self):
+        # sqlite connections must not cross threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def songs(self, song_ids, now=None):
+        """{id: (song, updated_at)} of the details rows younger than
+        CATALOG_MAX_AGE among song_ids."""
+        now = time.time() if now is None else now
+        found = {}
+        for i in range(0, len(song_ids), READ_CHUNK_SIZE):
+            chunk = song_ids[i:i + READ_CHUNK_SIZE]
+            rows = self.conn.execute(
+                f"SELECT id, data, updated_at FROM songs WHERE id IN ({','.join('?' * len(chunk))}) "
+                "AND source = ? AND updated_at > ?",
+                (*chunk, DETAILS, now - CATALOG_MAX_AGE),
+            )
+            for id, data, updated_at in rows:
+                found[id] = (json.loads(data), updated_at)
+        return found
+
+    def search_results(self, song_ids=(), item_keys=(), now=None):
+        """Rows younger than CATALOG_MAX_AGE for the search index:
+        {id: (source, album, song)} of any source and {(kind, id): item}."""
+        since = (time.time() if now is None else now) - CATALOG_MAX_AGE
+        songs = {}
+        items = {}
+        song_ids = list(song_ids)
+        for i in range(0, len(song_ids), READ_CHUNK_SIZE):
+            chunk = song_ids[i:i + READ_CHUNK_SIZE]
+            rows = self.conn.execute(
+                f"SELECT id, source, album, data FROM songs WHERE id IN ({','.join('?' * len(chunk))}) "
+                "AND updated_at > ?",
+                (*chunk, since),
+            )
+            for id, source, album, data in rows:
+                songs[id] = (source, album, json.loads(data))
+        for kind, id in item_keys:
+            row = self.conn.execute(
+                "SELECT data FROM search_items WHERE kind = ? AND id = ? AND updated_at > ?", (kind, id, since),
+            ).fetchone()
+            if row is not None:
+                items[(kind, id)] = json.loads(row[0])
+        return songs, items
+
+    def index_rows(self, songs_after=0, items_after=0):
+        """What the search index covers, in rows added after the given rowids:
+        (songs, items) iterators of (rowid, id, title, album, artists, play_count)
+        and (rowid, kind, id, title, subtitle, hits). Rows are never deleted and
+        writes are serialized, so rowids only grow in commit order."""
+        songs = self.conn.execute(
+            "SELECT rowid, id, title, album, artists, play_count FROM songs WHERE rowid > ? ORDER BY rowid",
+            (songs_after,),
+        )
+        items = self.conn.execute(
+            "SELECT rowid, kind, id, title, subtitle, hits FROM search_items WHERE rowid > ? ORDER BY rowid",
+            (items_after,),
+        )
+        return songs, items
+
+    def write(self, batch):
+        """Apply queued writes in one transaction."""
+        songs = []
+        albums = []
+        artists = []
+        links = []
+        search_items = []
+        for op, args, now in batch:
+            if op == "songs":
+                items, source, album_id, album = args
+                for song in items:
+                    songs.append(_song_row(song, source, album_id, album, now))
+                    if source == DETAILS:
+                        for artist_id, name in _song_artists(song):
+                            artists.append((artist_id, name, None, now))
+                            links.append((artist_id, song["id"]))
+            elif op == "album":
+                album, = args
+                data = {key: value for key, value in album.items() if key != "songs"}
+                data["song_ids"] = [song["id"] for song in album.get("songs") or () if song.get("id")]
+                albums.append((album["id"], _text(album.get("album")), _text(album.get("primary_artists")),
+                               _text(album.get("language")), _text(album.get("year")), fast_json.dumps(data), now))
+            elif op == "artist_songs":
+                artist_id, total, song_ids = args
+                artists.append((artist_id, None, total, now))
+                links.extend((artist_id, song_id) for song_id in song_ids)
+            elif op == "search_items":
+                items, = args
+                search_items.extend(_search_item_row(item, now) for item in items)
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT_SONG, songs)
+            conn.executemany(UPSERT_ALBUM, albums)
+            conn.executemany(UPSERT_ARTIST, artists)
+            conn.executemany(LINK_ARTIST, links)
+            conn.executemany(UPSERT_SEARCH_ITEM, search_items)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        for listener in _listeners:
+            try:
+                listener(songs, search_items)
+            except Exception as e:
+                logger.error(f"Catalog listener failed: {str(e)}")
+        return len(songs)
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        result = {}
+        for table in ("songs", "albums", "artists", "search_items"):
+            count, oldest = self.conn.execute(f"SELECT count(*), min(updated_at) FROM {table}").fetchone()
+            result[table] = {"count": count, "oldest_age": None if oldest is None else int(now - oldest)}
+        result["songs"]["servable"], result["songs"]["due_for_refresh"] = self.conn.execute(
+            "SELECT count(*), coalesce(sum(updated_at < ?), 0) FROM songs WHERE source = ?",
+            (now - CATALOG_REFRESH_AGE, DETAILS),
+        ).fetchone()
+        return result
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+_queue = queue.Queue(maxsize=CATALOG_QUEUE_SIZE)
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_written = 0
+_dropped = 0
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Called by the writer thread with the song and search item rows of every batch
+_listeners = []
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog(CATALOG_PATH)
+                logger.info(f"Song catalog: {CATALOG_PATH}")
+    return _catalog
+
+
+def _write_loop():
+    global _written
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < CATALOG_BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _written += get_catalog().write(batch)
+        except Exception as e:
+            logger.error(f"Could not write {len(batch)} catalog updates: {str(e)}")
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def _ensure_writer():
+    global _queue, _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is None or _writer_pid != pid:
+        with _writer_lock:
+            if _writer is None or _writer_pid != pid:
+                if _writer_pid is not None:
+                    # The parent's writer thread did not survive the fork
+                    _queue = queue.Queue(maxsize=CATALOG_QUEUE_SIZE)
+                _writer = threading.Thread(target=_write_loop, name="catalog-writer", daemon=True)
+                _writer.start()
+                _writer_pid = pid
+
+
+def _enqueue(op, *args):
+    global _dropped
+    if not CATALOG_ENABLED:
+        return
+    _ensure_writer()
+    try:
+        _queue.put_nowait((op, args, time.time()))
+    except queue.Full:
+        _dropped += 1
+        logger.debug(f"Catalog queue full, dropped a {op} update")
+
+
+def subscribe(listener):
+    _listeners.append(listener)
+
+
+def add_songs(songs, source=DETAILS, album_id=None, album=None):
+    """Queue formatted songs for an upsert. Songs must not be modified after."""
+    songs = [song for song in songs if isinstance(song, dict) and song.get("id")]
+    if songs:
+        _enqueue("songs", songs, source, album_id, album)
+
+
+def add_album(album):
+    """Queue a normalized get_album_by_link response."""
+    data = album.get("data") if isinstance(album, dict) and album.get("success") is not False else None
+    if not isinstance(data, dict) or not data.get("id"):
+        return
+    _enqueue("album", data)
+    add_songs(data.get("songs") or (), "album", data["id"], data.get("album"))
+
+
+def add_artist_songs(artist_id, result):
+    """Queue a normalized get_artist_songs response."""
+    data = result.get("data") if isinstance(result, dict) and result.get("success") is not False else None
+    if not isinstance(data, dict):
+        return
+    songs = [song for song in data.get("songs") or () if isinstance(song, dict) and song.get("id")]
+    total = data.get("total") if isinstance(data.get("total"), int) else None
+    _enqueue("artist_songs", artist_id, total, [song["id"] for song in songs])
+    add_songs(songs, "artist")
+
+
+def add_search_results(result):
+    """Queue the items of a normalized global_search response, or of an
+    autocomplete response in that shape."""
+    data = result.get("data") if isinstance(result, dict) and result.get("success") is not False else None
+    if not isinstance(data, dict):
+        return
+    items = []
+    for section in SEARCH_SECTIONS:
+        results = data.get(section, {}).get("results") if isinstance(data.get(section), dict) else None
+        for item in results or ():
+            if isinstance(item, dict) and item.get("id") and item.get("type") in SEARCH_KINDS:
+                items.append(item)
+    if items:
+        _enqueue("search_items", items)
+
+
+def get_songs(song_ids):
+    """({id: song} of the known song_ids, IDs due for a background refresh).
+    Each due ID is only returned to one caller until refreshed() is called."""
+    if not CATALOG_ENABLED or not song_ids:
+        return {}, []
+    now = time.time()
+    try:
+        rows = get_catalog().songs(list(song_ids), now)
+    except sqlite3.Error as e:
+        logger.error(f"Catalog read failed: {str(e)}")
+        return {}, []
+    songs = {}
+    due = []
+    for id, (song, updated_at) in rows.items():
+        songs[id] = song
+        if now - updated_at > CATALOG_REFRESH_AGE:
+            due.append(id)
+    if due:
+        with _refreshing_lock:
+            due = [id for id in due if id not in _refreshing]
+            _refreshing.update(due)
+    return songs, due
+
+
+def refreshed(song_ids):
+    """Release the IDs returned as due by get_songs."""
+    with _refreshing_lock:
+        _refreshing.difference_update(song_ids)
+
+
+def flush(timeout=5.0):
+    """Wait until the queued writes are in the database."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not _queue.unfinished_tasks
+
+
+def stats():
+    if not CATALOG_ENABLED:
+        return {"enabled": False}
+    try:
+        result = get_catalog().stats()
+    except sqlite3.Error as e:
+        return {"enabled": True, "error": str(e)}
+    result.update({"enabled": True, "queued": _queue.qsize(), "written": _written, "dropped": _dropped})
+    return result
+
+
+@atexit.register
+def _flush_on_exit():
+    if _writer is not None and _writer_pid == os.getpid():
+        flush()
+
+
+if __name__ == "__main__":
+    catalog = Catalog(sys.argv[1] if len(sys.argv) > 1 else CATALOG_PATH)
+    print(json.dumps(catalog.stats(), indent=2))
@@ -1,34 +1,42 @@
-search_base_url = "https://www.jiosaavn.com/api.php?__call=autocomplete.get&_format=json&_marker=0&cc=in&includeMetaTags=1&query="
-song_details_base_url = "https://www.jiosaavn.com/api.php?__call=song.getDetails&cc=in&_marker=0%3F_marker%3D0&_format=json&pids="
-album_details_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/albums?link="
+import os
 
-playlist_details_base_url = "https://www.jiosaavn.com/api.php?__call=playlist.getDetails&_format=json&cc=in&_marker=0%3F_marker%3D0&listid="
+# Backend base URLs. Override them to point the API at mirrors or at local
+# stub servers (see benchmarks/stub_upstream.py).
+jiosaavn_base_url = os.environ.get("JIOSAAVN_BASE_URL", "https://www.jiosaavn.com").rstrip("/")
+worker_base_url = os.environ.get("WORKER_BASE_URL", "https://jiosaavn-api.alangeokurian10.workers.dev").rstrip("/")
+vercel_base_url = os.environ.get("VERCEL_BASE_URL", "https://jiosaavn-api-eight-brown.vercel.app").rstrip("/")
 
-lyrics_base_url = "https://www.jiosaavn.com/api.php?__call=lyrics.getLyrics&ctx=web6dot0&api_version=4&_format=json&_marker=0%3F_marker%3D0&lyrics_id="
+search_base_url = f"{jiosaavn_base_url}/api.php?__call=autocomplete.get&_format=json&_marker=0&cc=in&includeMetaTags=1&query="
+song_details_base_url = f"{jiosaavn_base_url}/api.php?__call=song.getDetails&cc=in&_marker=0%3F_marker%3D0&_format=json&pids="
+album_details_base_url = f"{worker_base_url}/api/albums?link="
+
+playlist_details_base_url = f"{jiosaavn_base_url}/api.php?__call=playlist.getDetails&_format=json&cc=in&_marker=0%3F_marker%3D0&listid="
+
+lyrics_base_url = f"{jiosaavn_base_url}/api.php?__call=lyrics.getLyrics&ctx=web6dot0&api_version=4&_format=json&_marker=0%3F_marker%3D0&lyrics_id="
 
 # Global search (vercel) endpoint
-global_search_base_url = "https://jiosaavn-api-eight-brown.vercel.app/api/search?query="
+global_search_base_url = f"{vercel_base_url}/api/search?query="
 
 # Artist details (Cloudflare Worker) endpoint
-artist_details_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/artists/"
+artist_details_base_url = f"{worker_base_url}/api/artists/"
 
 # Song suggestions (Vercel) endpoint
-song_suggestions_base_url = "https://jiosaavn-api-eight-brown.vercel.app/api/songs/"
+song_suggestions_base_url = f"{vercel_base_url}/api/songs/"
 
 # Playlist search (Cloudflare Worker) endpoint
-playlist_search_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/search/playlists?query="
+playlist_search_base_url = f"{worker_base_url}/api/search/playlists?query="
 
 # Album search (Cloudflare Worker) endpoint
-album_search_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/search/albums?query="
+album_search_base_url = f"{worker_base_url}/api/search/albums?query="
 
 # Artist search (Cloudflare Worker) endpoint
-artist_search_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/search/artists?query="
+artist_search_base_url = f"{worker_base_url}/api/search/artists?query="
 
 # Artist songs (Cloudflare Worker) endpoint
-artist_songs_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/artists/"
+artist_songs_base_url = f"{worker_base_url}/api/artists/"
 
 # Artist albums (Cloudflare Worker) endpoint
-artist_albums_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/artists/"
+artist_albums_base_url = f"{worker_base_url}/api/artists/"
 
 # Song search (Cloudflare Worker) endpoint
-song_search_base_url = "https://jiosaavn-api.alangeokurian10.workers.dev/api/search/songs?query="
\ No newline at end of file
+song_search_base_url = f"{worker_base_url}/api/search/songs?query="
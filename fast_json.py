@@ -0,0 +1,52 @@
+"""Response serialization with orjson when it is installed.
+
+Output has the shape of Flask's jsonify with the stdlib encoder (sorted keys,
+compact separators), and both the Flask and the ASGI app use it. orjson
+writes non-ASCII text as UTF-8 instead of \\uXXXX escapes, which parses to
+the same data and is smaller; escaping it again costs more than orjson saves
+on the Hindi lyrics and titles most responses carry, so it is not done. Values
+orjson cannot encode (integers beyond 64 bits, non-string keys, lone
+surrogates) fall back to the stdlib.
+
+JSON_ENCODER=auto (default) uses orjson when available, orjson requires it
+and stdlib always uses the json module, with its ASCII-only output.
+"""
+import os
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "auto").lower()
+
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise ImportError("JSON_ENCODER=orjson but the orjson package is not installed")
+USE_ORJSON = orjson is not None and JSON_ENCODER != "stdlib"
+ENCODER = "orjson" if USE_ORJSON else "stdlib"
+
+if USE_ORJSON:
+    # Dates and dataclasses go through `default`, as with the stdlib
+    OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def stdlib_dumps(obj, default=None):
+    return json.dumps(obj, default=default, ensure_ascii=True, sort_keys=True, separators=(",", ":")).encode()
+
+
+def orjson_dumps(obj, default=None):
+    return orjson.dumps(obj, default=default, option=OPTIONS)
+
+
+def dumps(obj, default=None):
+    """Compact, key-sorted JSON of obj as UTF-8 bytes."""
+    if USE_ORJSON:
+        try:
+            return orjson_dumps(obj, default)
+        except TypeError as e:
+            logger.debug(f"orjson could not encode the response, using json: {str(e)}")
+    return stdlib_dumps(obj, default)
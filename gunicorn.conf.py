@@ -42,4 +42,44 @@ tmp_upload_dir = None
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190 
\ No newline at end of file
+limit_request_field_size = 8190 
+
+
+# Metrics (see metrics.py): every worker writes its snapshot to METRICS_DIR,
+# /metrics merges them. Start each run from an empty directory.
+def on_starting(server):
+    try:
+        import metrics
+        metrics.reset_dir()
+    except Exception:
+        pass
+
+
+# Upstream connection pools (see upstream.py). Each worker keeps its own
+# pooled session; size UPSTREAM_POOL_MAXSIZE together with `workers` above.
+def worker_exit(server, worker):
+    # Log pool reuse so pool sizes can be tuned against the worker count
+    try:
+        import upstream
+        stats = upstream.pool_stats()
+        server.log.info(
+            f"Worker {worker.pid} upstream pool: {stats['requests']} requests, "
+            f"{stats['connections']} connections, hit ratio {stats['hit_ratio']}"
+        )
+    except Exception:
+        pass
+    try:
+        import metrics
+        metrics.flush()
+    except Exception:
+        pass
+
+
+# Fold an exited worker's metrics snapshot into the totals right away, before
+# a new worker can be started with the same pid
+def child_exit(server, worker):
+    try:
+        import metrics
+        metrics.retire(worker.pid)
+    except Exception:
+        pass
@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+import logging
+import urllib.parse
+from collections import deque
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures (timeouts, connection errors, 5xx/429) that open a
+# backend's circuit, and how long it stays open before one probe is let through
+BREAKER_FAILURES = int(os.environ.get("UPSTREAM_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("UPSTREAM_BREAKER_COOLDOWN", 30))
+# Latency samples kept per backend for the hedging delay
+LATENCY_WINDOW = int(os.environ.get("UPSTREAM_LATENCY_WINDOW", 200))
+HEDGE_MIN_SAMPLES = int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", 20))
+HEDGE_PERCENTILE = float(os.environ.get("UPSTREAM_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_DELAY = float(os.environ.get("UPSTREAM_HEDGE_MIN_DELAY", 0.05))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a backend whose circuit is open."""
+
+
+class BackendHealth:
+    """Latency and failure tracking for one upstream host, with a circuit
+    breaker: closed (normal), open (fail fast) and half open (one probe
+    request decides whether to close or re-open)."""
+
+    def __init__(self, host):
+        self.host = host
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._sorted = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def before_request(self):
+        """Raise CircuitOpenError while the circuit is open. After the
+        cooldown a single caller is let through as the probe."""
+        if self.state == CLOSED:
+            return
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            if self.state == CLOSED:
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.host}")
+
+    def record_success(self, latency):
+        with self._lock:
+            self.successes += 1
+            self._latencies.append(latency)
+            self._sorted = None
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info(f"Circuit closed for {self.host}")
+                self.state = CLOSED
+                self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.consecutive_failures >= BREAKER_FAILURES):
+                logger.warning(f"Circuit opened for {self.host} after "
+                               f"{self.consecutive_failures} consecutive failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.opened += 1
+                self._probing = False
+
+    def record_neutral(self):
+        """The request failed for a reason unrelated to the backend (bad URL,
+        cancelled hedge); only give the probe slot back."""
+        with self._lock:
+            self._probing = False
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def percentile(self, percent):
+        with self._lock:
+            if not self._latencies:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._latencies)
+            index = min(len(self._sorted) - 1, int(len(self._sorted) * percent / 100))
+            return self._sorted[index]
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a second copy of a request, or None
+        while there are too few samples or the circuit is not closed."""
+        if self.state != CLOSED or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.percentile(HEDGE_PERCENTILE), HEDGE_MIN_DELAY)
+
+    def stats(self):
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        with self._lock:
+            return {
+                "state": self.state,
+                "successes": self.successes,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def for_url(url):
+    """Health record of the backend (scheme://host[:port]) serving url."""
+    parts = urllib.parse.urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    backend = _backends.get(host)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(host)
+            if backend is None:
+                backend = BackendHealth(host)
+                _backends[host] = backend
+    return backend
+
+
+def is_failure_status(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+def stats():
+    return {host: backend.stats() for host, backend in list(_backends.items())}
@@ -1,36 +1,90 @@
+import os
+import re
 import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict
+import cache
 import jiosaavn
+import timing
 from pyDes import *
 
+try:
+    # pycryptodome's C implementation, if installed
+    from Crypto.Cipher import DES as FastDES
+except ImportError:
+    FastDES = None
 
-def format_song(data, lyrics):
-    try:
-        data['media_url'] = decrypt_url(data['encrypted_media_url'])
-        if data['320kbps'] != "true":
-            data['media_url'] = data['media_url'].replace(
-                "_320.mp4", "_160.mp4")
-        data['media_preview_url'] = data['media_url'].replace(
-            "_320.mp4", "_96_p.mp4").replace("_160.mp4", "_96_p.mp4").replace("//aac.", "//preview.")
-    except KeyError or TypeError:
-        url = data['media_preview_url']
-        url = url.replace("preview", "aac")
-        if data['320kbps'] == "true":
-            url = url.replace("_96_p.mp4", "_320.mp4")
-        else:
-            url = url.replace("_96_p.mp4", "_160.mp4")
-        data['media_url'] = url
-
-    data['song'] = format(data['song'])
-    data['music'] = format(data['music'])
-    data['singers'] = format(data['singers'])
-    data['starring'] = format(data['starring'])
-    data['album'] = format(data['album'])
-    data["primary_artists"] = format(data["primary_artists"])
+logger = logging.getLogger(__name__)
+
+DES_KEY = b"38346591"
+# Decrypted media URLs never change, so they are memoized by encrypted URL
+DECRYPT_CACHE_SIZE = int(os.environ.get("DECRYPT_CACHE_SIZE", 20000))
+
+# HTML entities found in JioSaavn text fields. &quot; has always been
+# rendered as a single quote by this API and stays that way.
+ENTITIES = {
+    'quot': "'",
+    'amp': '&',
+    'apos': "'",
+    'copy': '\u00a9',
+    'reg': '\u00ae',
+    'trade': '\u2122',
+    'lt': '<',
+    'gt': '>',
+    'nbsp': '\u00a0',
+}
+_DECODED = {f'&{name};': value for name, value in ENTITIES.items()}
+# The previous chained replace() decoded a double-encoded apostrophe twice
+_DECODED['&amp;#039;'] = "'"
+_DECODED['&#039;'] = "'"
+_ENTITY_RE = re.compile(r'&(?:amp;#039;|#\d+;|#[xX][0-9a-fA-F]+;|[A-Za-z]+;)')
+
+SONG_TEXT_FIELDS = ('song', 'music', 'singers', 'starring', 'album', 'primary_artists')
+
+_cipher_local = threading.local()
+_decrypted = OrderedDict()
+_decrypted_lock = threading.Lock()
+
+# Concurrent lyrics fetching for albums, playlists and multi-song responses
+LYRICS_CONCURRENCY = int(os.environ.get("LYRICS_CONCURRENCY", 8))
+LYRICS_TIMEOUT = float(os.environ.get("LYRICS_TIMEOUT", 10))
+# All lyrics of one response are bounded by LYRICS_TIMEOUT plus this, however
+# many songs it has, to stay well under the gunicorn worker timeout
+LYRICS_DEADLINE_SLACK = 2
+
+_lyrics_executor = None
+_lyrics_executor_pid = None
+_lyrics_executor_lock = threading.Lock()
+
+
+def format_song(data, lyrics, media=True):
+    """With media=False the media URL is not decrypted and media_url is left out."""
+    if media:
+        try:
+            data['media_url'] = decrypt_url(data['encrypted_media_url'])
+            if data['320kbps'] != "true":
+                data['media_url'] = data['media_url'].replace(
+                    "_320.mp4", "_160.mp4")
+            data['media_preview_url'] = data['media_url'].replace(
+                "_320.mp4", "_96_p.mp4").replace("_160.mp4", "_96_p.mp4").replace("//aac.", "//preview.")
+        except KeyError or TypeError:
+            url = data['media_preview_url']
+            url = url.replace("preview", "aac")
+            if data['320kbps'] == "true":
+                url = url.replace("_96_p.mp4", "_320.mp4")
+            else:
+                url = url.replace("_96_p.mp4", "_160.mp4")
+            data['media_url'] = url
+
+    format_fields(data, SONG_TEXT_FIELDS)
     data['image'] = data['image'].replace("150x150", "500x500")
 
     if lyrics:
         if data['has_lyrics'] == 'true':
-            data['lyrics'] = jiosaavn.get_lyrics(data['id'])
+            with timing.phase('lyrics'):
+                data['lyrics'] = jiosaavn.get_lyrics(data['id'])
         else:
             data['lyrics'] = None
 
@@ -46,27 +100,212 @@ def format_album(data, lyrics):
     data['name'] = format(data['name'])
     data['primary_artists'] = format(data['primary_artists'])
     data['title'] = format(data['title'])
+    prefetch_media_urls(data['songs'])
     for song in data['songs']:
-        song = format_song(song, lyrics)
+        song = format_song(song, False)
+    if lyrics:
+        fetch_lyrics(data['songs'])
     return data
 
 
-def format_playlist(data, lyrics):
+def format_playlist(data, lyrics, media=True):
     data['firstname'] = format(data['firstname'])
     data['listname'] = format(data['listname'])
+    if media:
+        prefetch_media_urls(data['songs'])
     for song in data['songs']:
-        song = format_song(song, lyrics)
+        song = format_song(song, False, media)
+    if lyrics:
+        fetch_lyrics(data['songs'])
     return data
 
 
+def _get_lyrics_executor():
+    # One bounded pool per worker process (rebuilt after a fork)
+    global _lyrics_executor, _lyrics_executor_pid
+    pid = os.getpid()
+    if _lyrics_executor is None or _lyrics_executor_pid != pid:
+        with _lyrics_executor_lock:
+            if _lyrics_executor is None or _lyrics_executor_pid != pid:
+                _lyrics_executor = ThreadPoolExecutor(
+                    max_workers=LYRICS_CONCURRENCY, thread_name_prefix="lyrics")
+                _lyrics_executor_pid = pid
+    return _lyrics_executor
+
+
+def fetch_lyrics(songs):
+    """Fill in 'lyrics' for every song concurrently.
+    Songs without lyrics, and songs whose lyrics fail or are not fetched
+    within LYRICS_TIMEOUT + LYRICS_DEADLINE_SLACK, get None instead of
+    failing the whole response; a failure marks the response as incomplete
+    so it is not cached.
+    """
+    pending = {}
+    for song in songs:
+        song['lyrics'] = None
+        if song.get('has_lyrics') == 'true':
+            pending.setdefault(song['id'], []).append(song)
+    if not pending:
+        return songs
+
+    executor = _get_lyrics_executor()
+    futures = {
+        executor.submit(jiosaavn.get_lyrics, song_id, timeout=LYRICS_TIMEOUT): song_id
+        for song_id in pending
+    }
+    # One deadline for the whole response: songs still queued or in flight
+    # by then get None
+    with timing.phase('lyrics'):
+        done, not_done = wait(futures, timeout=LYRICS_TIMEOUT + LYRICS_DEADLINE_SLACK)
+    for future in not_done:
+        future.cancel()
+        logger.warning(f"Lyrics for {futures[future]} timed out")
+    failed = bool(not_done)
+    for future in done:
+        song_id = futures[future]
+        try:
+            text = future.result()
+        except Exception as e:
+            logger.warning(f"Could not fetch lyrics for {song_id}: {str(e)}")
+            failed = True
+            continue
+        for song in pending[song_id]:
+            song['lyrics'] = text
+    if failed:
+        # Here rather than in the pool threads, which run outside the
+        # request's context
+        cache.note_failure()
+    return songs
+
+
+def _replace_entity(match):
+    text = match.group()
+    decoded = _DECODED.get(text)
+    if decoded is not None:
+        return decoded
+    try:
+        if text[1] != '#':
+            return text
+        if text[2] in 'xX':
+            return chr(int(text[3:-1], 16))
+        return chr(int(text[2:-1]))
+    except (ValueError, OverflowError):
+        return text
+
+
 def format(string):
-    return string.encode().decode().replace("&quot;", "'").replace("&amp;", "&").replace("&#039;", "'")
+    """Decode the HTML entities JioSaavn puts in text fields in a single pass."""
+    if '&' not in string:
+        return string
+    return _ENTITY_RE.sub(_replace_entity, string)
+
+
+def format_fields(data, keys):
+    """format() several text fields of a dict in place, skipping the ones
+    without entities."""
+    sub = _ENTITY_RE.sub
+    for key in keys:
+        value = data[key]
+        if '&' in value:
+            data[key] = sub(_replace_entity, value)
+    return data
+
+
+def _get_cipher():
+    # Cipher objects keep per-call state, so each thread gets its own
+    cipher = getattr(_cipher_local, 'cipher', None)
+    if cipher is None:
+        if FastDES is not None:
+            cipher = FastDES.new(DES_KEY, FastDES.MODE_ECB)
+        else:
+            cipher = des(DES_KEY, ECB, b"\0\0\0\0\0\0\0\0",
+                         pad=None, padmode=PAD_PKCS5)
+        _cipher_local.cipher = cipher
+    return cipher
+
+
+def _unpad(data):
+    return data[:-data[-1]] if data else data
+
+
+def _decrypt_raw(enc_url):
+    cipher = _get_cipher()
+    if FastDES is not None:
+        return _unpad(cipher.decrypt(enc_url))
+    return cipher.decrypt(enc_url, padmode=PAD_PKCS5)
+
+
+def _finish_url(raw):
+    return raw.decode('utf-8').replace("_96.mp4", "_320.mp4")
+
+
+def _remember(url, dec_url):
+    with _decrypted_lock:
+        _decrypted[url] = dec_url
+        if len(_decrypted) > DECRYPT_CACHE_SIZE:
+            _decrypted.popitem(last=False)
 
 
 def decrypt_url(url):
-    des_cipher = des(b"38346591", ECB, b"\0\0\0\0\0\0\0\0",
-                     pad=None, padmode=PAD_PKCS5)
-    enc_url = base64.b64decode(url.strip())
-    dec_url = des_cipher.decrypt(enc_url, padmode=PAD_PKCS5).decode('utf-8')
-    dec_url = dec_url.replace("_96.mp4", "_320.mp4")
+    with _decrypted_lock:
+        dec_url = _decrypted.get(url)
+        if dec_url is not None:
+            _decrypted.move_to_end(url)
+            return dec_url
+    with timing.phase('decrypt'):
+        enc_url = base64.b64decode(url.strip())
+        dec_url = _finish_url(_decrypt_raw(enc_url))
+    _remember(url, dec_url)
     return dec_url
+
+
+def decrypt_urls(urls):
+    """Decrypt a whole track list at once and remember the results, so the
+    decrypt_url calls in format_song are memo hits.
+    With pycryptodome all ciphertexts go through a single ECB call."""
+    results = {}
+    pending = []
+    with _decrypted_lock:
+        for url in urls:
+            if not url or url in results:
+                continue
+            dec_url = _decrypted.get(url)
+            if dec_url is not None:
+                results[url] = dec_url
+            else:
+                pending.append(url)
+    if pending:
+        with timing.phase('decrypt'):
+            blobs = []
+            for url in pending:
+                try:
+                    blobs.append(base64.b64decode(url.strip()))
+                except (ValueError, TypeError):
+                    blobs.append(None)
+            if FastDES is not None:
+                valid = [(url, blob) for url, blob in zip(pending, blobs) if blob and len(blob) % 8 == 0]
+                plain = _get_cipher().decrypt(b"".join(blob for _, blob in valid))
+                offset = 0
+                for url, blob in valid:
+                    chunk = plain[offset:offset + len(blob)]
+                    offset += len(blob)
+                    try:
+                        results[url] = _finish_url(_unpad(chunk))
+                    except UnicodeDecodeError:
+                        continue
+                    _remember(url, results[url])
+            else:
+                for url, blob in zip(pending, blobs):
+                    if blob is None:
+                        continue
+                    try:
+                        results[url] = _finish_url(_decrypt_raw(blob))
+                    except Exception:
+                        continue
+                    _remember(url, results[url])
+    return [results.get(url) for url in urls]
+
+
+def prefetch_media_urls(songs):
+    """Batch-decrypt the encrypted_media_url of every song in a list."""
+    decrypt_urls([song.get('encrypted_media_url') for song in songs if isinstance(song, dict)])
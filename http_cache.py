@@ -0,0 +1,207 @@
+"""ETags, conditional GET, Cache-Control, compression and the response cache.
+
+- The ETag is a hash of the serialized body, so it only changes when the
+  data does; a request whose If-None-Match matches gets a bodiless 304.
+  Compressed representations get the encoding appended to their tag.
+- Cache-Control comes from the cached data types the request read (cache.py):
+  public with the shortest of their TTLs as max-age, plus
+  stale-while-revalidate for types that have a stale TTL. Answers served
+  stale get max-age=0 so shared caches come back for the refreshed data.
+- Responses that read no cached data type, or got a failure from one, are
+  no-cache: clients and CDNs still revalidate them with the ETag.
+- Text and JSON bodies of at least COMPRESS_MIN_SIZE bytes are sent with
+  brotli (when the brotli package is installed) or gzip, whichever the client
+  prefers in Accept-Encoding.
+- Public GET responses are kept serialized in the "response" cache for their
+  max-age, keyed by path and query. Hits skip the route, serialization and
+  hashing, and every compressed variant is only produced once per entry.
+"""
+import os
+import gzip
+import time
+import hashlib
+
+import cache
+import timing
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTTP_CACHE_ENABLED = os.environ.get("HTTP_CACHE_ENABLED", "true").lower() != "false"
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+# Preferred first when the client accepts several with the same q-value
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Responses that must never be stored, like /stats/ and /metrics
+NO_STORE = "no-store"
+
+
+def applies(method, status):
+    return HTTP_CACHE_ENABLED and method in ("GET", "HEAD") and status == 200
+
+
+def etag(body):
+    """Unquoted entity tag of a response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def not_modified(if_none_match, tag):
+    """Whether an If-None-Match header value matches the unquoted tag, using
+    the weak comparison RFC 9110 prescribes for it."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == tag:
+            return True
+    return False
+
+
+def cache_control():
+    ttls = cache.response_ttls()
+    if ttls is None:
+        return "no-cache"
+    ttl, stale_ttl = ttls
+    if cache.response_state() == "stale":
+        ttl = 0
+    value = f"public, max-age={ttl}"
+    if stale_ttl:
+        value += f", stale-while-revalidate={stale_ttl}"
+    return value
+
+
+def choose_encoding(accept_encoding):
+    """The content coding to use for an Accept-Encoding value, or None."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    best = None
+    best_q = 0.0
+    for encoding in ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(content_type):
+    return content_type.startswith(("application/json", "text/"))
+
+
+def compress(body, encoding):
+    with timing.phase('compress'):
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class Entry:
+    """A serialized response body with its ETag and compressed variants,
+    which are filled in the first time a client asks for them."""
+
+    __slots__ = ("body", "content_type", "tag", "encoded", "expires_at", "stale_ttl")
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.tag = None
+        self.encoded = {}
+        self.expires_at = None
+        self.stale_ttl = 0
+
+    def get_tag(self):
+        if self.tag is None:
+            self.tag = etag(self.body)
+        return self.tag
+
+    def encode(self, encoding):
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compress(self.body, encoding)
+        return data
+
+    def cache_control(self):
+        """Cache-Control of a cached entry: what remains of its max-age."""
+        value = f"public, max-age={max(0, int(self.expires_at - time.monotonic()))}"
+        if self.stale_ttl:
+            value += f", stale-while-revalidate={self.stale_ttl}"
+        return value
+
+
+def response_key(path, items):
+    """Response cache key for a path and its (name, value) query parameters."""
+    return (path, tuple(sorted(items)))
+
+
+def lookup_response(key):
+    if not (RESPONSE_CACHE_ENABLED and cache.CACHE_ENABLED):
+        return None
+    found, entry = cache.get_cache("response").get(key)
+    return entry if found else None
+
+
+def _store_response(key, entry):
+    if not (RESPONSE_CACHE_ENABLED and cache.CACHE_ENABLED) or cache.response_state() == "stale":
+        return
+    ttls = cache.response_ttls()
+    if ttls is None:
+        return
+    ttl, entry.stale_ttl = ttls
+    entry.expires_at = time.monotonic() + ttl
+    cache.get_cache("response").set(key, entry, ttl=ttl, stale_ttl=0)
+
+
+def respond(method, status, entry, route_cache_control, accept_encoding, if_none_match, key=None, cached=False):
+    """Final status, body and extra headers (name, value) of a response.
+    `entry` is the Entry of the serialized body, `cached` whether it came
+    from the response cache; uncached public GET responses are stored under
+    `key`. Cache-Control set by the route itself is kept and never stored."""
+    headers = []
+    cacheable = applies(method, status)
+    if cacheable:
+        if route_cache_control:
+            value = route_cache_control
+        elif cached:
+            value = entry.cache_control()
+        else:
+            value = cache_control()
+            if key is not None:
+                _store_response(key, entry)
+        headers.append(("Cache-Control", value))
+
+    body = entry.body
+    tag_suffix = ""
+    if compressible(entry.content_type) and len(body) >= COMPRESS_MIN_SIZE:
+        headers.append(("Vary", "Accept-Encoding"))
+        encoding = choose_encoding(accept_encoding)
+        if encoding is not None:
+            body = entry.encode(encoding)
+            tag_suffix = f"-{encoding}"
+            headers.append(("Content-Encoding", encoding))
+
+    if cacheable:
+        tag = entry.get_tag() + tag_suffix
+        headers.append(("ETag", f'"{tag}"'))
+        if not_modified(if_none_match, tag):
+            return 304, b"", headers
+    return status, body, headers
@@ -1,14 +1,46 @@
+import os
 import requests
 import endpoints
+import upstream
+import cache
+import catalog
 import helper
+import metrics
+import normalize
+import search_index
+import timing
+import typeahead
 import json
 from traceback import print_exc
 import re
 import logging
 import urllib.parse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 logger = logging.getLogger(__name__)
 
+# song.getDetails fan-out for large ID lists
+SONG_DETAILS_CHUNK_SIZE = int(os.environ.get("SONG_DETAILS_CHUNK_SIZE", 50))
+SONG_DETAILS_CONCURRENCY = int(os.environ.get("SONG_DETAILS_CONCURRENCY", 4))
+SONG_DETAILS_BASE_TIMEOUT = 10
+SONG_DETAILS_TIMEOUT_PER_SONG = 0.2
+SONG_DETAILS_MAX_TIMEOUT = float(os.environ.get("SONG_DETAILS_MAX_TIMEOUT", 20))
+# All chunks of one request, however many: well under gunicorn's 120 s worker
+# timeout, with room left for lyrics
+SONG_DETAILS_DEADLINE = float(os.environ.get("SONG_DETAILS_DEADLINE", 60))
+# Background refreshes of stale catalog songs, apart from the request chunks
+CATALOG_REFRESH_CONCURRENCY = 2
+
+FROM_TITLE_PATTERN = re.compile(r'\(From "([^"]+)"\)')
+
+_chunk_executor = None
+_chunk_executor_pid = None
+_chunk_executor_lock = threading.Lock()
+_refresh_executor = None
+_refresh_executor_pid = None
+_refresh_executor_lock = threading.Lock()
+
 
 def search_for_song(query, lyrics, songdata):
     try:
@@ -18,28 +50,35 @@ def search_for_song(query, lyrics, songdata):
 
         search_base_url = endpoints.search_base_url+query
         logger.info(f"Making request to: {search_base_url}")
-        response = requests.get(search_base_url, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        response_text = response.text.encode().decode('unicode-escape')
-        pattern = r'\(From "([^"]+)"\)'
-        response_data = json.loads(re.sub(pattern, r"(From '\1')", response_text))
-        
-        if 'songs' not in response_data or 'data' not in response_data['songs']:
-            logger.error(f"Unexpected response format: {response_data}")
-            return None
-            
-        song_response = response_data['songs']['data']
-        if not songdata:
-            return song_response
-            
-        songs = []
-        for song in song_response:
-            id = song['id']
-            song_data = get_song(id, lyrics)
-            if song_data:
-                songs.append(song_data)
-        return songs
+        try:
+            response = upstream.get(search_base_url, timeout=10)
+            response.raise_for_status()  # Raise an exception for bad status codes
+        except requests.exceptions.RequestException as e:
+            if not songdata:
+                raise
+            # Same hits from the worker song search; details still come from song.getDetails
+            logger.warning(f"Autocomplete failed, falling back to the worker song search: {str(e)}")
+            ids = _worker_song_ids(query)
+            cache.note_type('search', ids)
+        else:
+            response_data = _load_autocomplete_json(response)
+
+            if 'songs' not in response_data or 'data' not in response_data['songs']:
+                logger.error(f"Unexpected response format: {response_data}")
+                return None
+
+            song_response = response_data['songs']['data']
+            # Live search hits: the response is cached for the search TTL,
+            # not for the TTL of the songs it is built from
+            cache.note_type('search', song_response)
+            if not songdata:
+                return song_response
+
+            ids = [song['id'] for song in song_response]
+
+        # Resolve every hit with one batched song.getDetails call
+        found = get_songs_by_ids(ids, lyrics)
+        return [found[id] for id in ids if id in found]
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in search_for_song: {str(e)}")
         return None
@@ -51,6 +90,7 @@ def search_for_song(query, lyrics, songdata):
         return None
 
 
+@cache.cached('search', key=lambda query, limit=10: ('song', query, limit))
 def search_songs_new_api(query, limit=10):
     """
     Search for songs using the new Cloudflare Worker API endpoint.
@@ -60,28 +100,24 @@ def search_songs_new_api(query, limit=10):
         if query.startswith('http') and 'saavn.com' in query:
             id = get_song_id(query)
             return get_song(id, False)
-        
+
+        local = _local_song_search(query, limit)
+        if local is not None:
+            return local
+
         url = f"{endpoints.song_search_base_url}{urllib.parse.quote(query)}&limit={limit}"
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        
-        if not response_data.get('success') or 'data' not in response_data:
-            logger.error(f"Unexpected response format: {response_data}")
-            return []
-        
-        songs_data = response_data['data'].get('results', [])
-        formatted_songs = []
-        
-        for song in songs_data:
-            formatted_song = transform_song_data(song)
-            if formatted_song:
-                formatted_songs.append(formatted_song)
-        
-        return formatted_songs
-        
+        try:
+            response = upstream.get(url, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Worker song search failed, falling back to autocomplete: {str(e)}")
+            return _search_songs_fallback(query, limit)
+
+        songs = _normalize_song_search(response.json())
+        catalog.add_songs(songs, 'search')
+        return songs
+
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in search_songs_new_api: {str(e)}")
         return []
@@ -93,6 +129,132 @@ def search_songs_new_api(query, limit=10):
         return []
 
 
+def _worker_song_ids(query, limit=10):
+    """Song IDs for a query from the worker song search."""
+    url = f"{endpoints.song_search_base_url}{urllib.parse.quote(query)}&limit={limit}"
+    logger.info(f"Making request to: {url}")
+    response = upstream.get(url, timeout=10)
+    response.raise_for_status()
+    return _song_search_ids(response.json())
+
+
+def _song_search_ids(response_data):
+    if not response_data.get('success') or 'data' not in response_data:
+        raise ValueError("Unexpected song search response format")
+    return [song['id'] for song in response_data['data'].get('results', []) if song.get('id')]
+
+
+def _search_songs_fallback(query, limit):
+    """search_songs_new_api results through jiosaavn.com instead of the worker:
+    autocomplete for the hits and song.getDetails for the details."""
+    songs = search_for_song(query, False, True) or []
+    return [_song_from_details(song) for song in songs[:limit]]
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _song_from_saavn_dev(song, album):
+    """An album or artist song (normalized saavn.dev shape) in the shape
+    transform_song_data gives worker search results."""
+    media_url = song.get('media_url', '')
+    return {
+        'id': song.get('id', ''),
+        'song': song.get('song', ''),
+        'album': album or '',
+        'year': song.get('year', ''),
+        'releaseDate': song.get('releaseDate', ''),
+        'duration': song.get('duration', 0),
+        'label': song.get('label', ''),
+        'explicitContent': song.get('explicitContent', False),
+        'playCount': song.get('playCount', 0),
+        'language': song.get('language', ''),
+        'hasLyrics': song.get('hasLyrics', False),
+        'lyricsId': song.get('lyricsId', ''),
+        'url': song.get('perma_url', ''),
+        'copyright': song.get('copyright', ''),
+        'primary_artists': song.get('primary_artists', ''),
+        'image': song.get('image', ''),
+        'media_url': media_url,
+        '320kbps': 'true' if '320kbps' in media_url else 'false'
+    }
+
+
+def _song_search_result(source, album, song):
+    """A catalog song in the shape of search_songs_new_api results."""
+    if source == catalog.DETAILS:
+        return _song_from_details(song)
+    if source == 'search':
+        return song
+    return _song_from_saavn_dev(song, album)
+
+
+def _local_song_search(query, limit):
+    rows = search_index.search_songs(query, limit)
+    if rows is None:
+        return None
+    logger.info(f"Song search for {query!r} answered from the search index")
+    return [_song_search_result(*row) for row in rows]
+
+
+def _local_global_search(query):
+    found = search_index.global_search(query)
+    if found is None:
+        return None
+    logger.info(f"Global search for {query!r} answered from the search index")
+    top, sections = found
+    data = {"topQuery": {"results": [top], "position": 0}}
+    for position, (section, items) in enumerate(sections, 1):
+        data[section] = {"results": items, "position": position}
+    return {"success": True, "data": data}
+
+
+def _song_from_details(song):
+    """A song.getDetails song (after helper.format_song) in the shape
+    transform_song_data gives worker search results."""
+    return {
+        'id': song.get('id', ''),
+        'song': song.get('song', ''),
+        'album': song.get('album', ''),
+        'year': song.get('year', ''),
+        'releaseDate': song.get('release_date', ''),
+        'duration': _to_int(song.get('duration')),
+        'label': song.get('label', ''),
+        'explicitContent': str(song.get('explicit_content', '0')) == '1',
+        'playCount': _to_int(song.get('play_count')),
+        'language': song.get('language', ''),
+        'hasLyrics': song.get('has_lyrics') == 'true',
+        'lyricsId': song.get('lyrics_id') or None,
+        'url': song.get('perma_url', ''),
+        'copyright': song.get('copyright_text', ''),
+        'primary_artists': song.get('primary_artists', ''),
+        'image': song.get('image', ''),
+        'media_url': song.get('media_url', ''),
+        '320kbps': song.get('320kbps', 'false')
+    }
+
+
+@metrics.cpu_timed('song_search')
+def _normalize_song_search(response_data):
+    if not response_data.get('success') or 'data' not in response_data:
+        logger.error(f"Unexpected response format: {response_data}")
+        return []
+
+    songs_data = response_data['data'].get('results', [])
+    formatted_songs = []
+
+    for song in songs_data:
+        formatted_song = transform_song_data(song)
+        if formatted_song:
+            formatted_songs.append(formatted_song)
+
+    return formatted_songs
+
+
 def transform_song_data(song_data):
     """
     Transform song data from the new API format to match the existing format.
@@ -147,21 +309,153 @@ def transform_song_data(song_data):
         return None
 
 
-def get_song(id, lyrics):
+def _unescape(value):
+    """Second round of JSON unescaping for strings escaped twice upstream."""
+    if '\\' not in value:
+        return value
+    try:
+        unescaped, end = json.decoder.scanstring(value + '"', 0)
+    except ValueError:
+        return value
+    return unescaped if end == len(value) + 1 else value
+
+
+def _unescape_from_title(value):
+    if '"' in value:
+        value = FROM_TITLE_PATTERN.sub(r"(From '\1')", value)
+    return _unescape(value)
+
+
+def _repair(obj, fix):
+    if isinstance(obj, str):
+        return fix(obj)
+    if isinstance(obj, list):
+        return [_repair(item, fix) for item in obj]
+    if isinstance(obj, dict):
+        return {fix(key): _repair(value, fix) for key, value in obj.items()}
+    return obj
+
+
+def _parse_payload(response, repair_from_titles=False):
+    """Parse the response bytes directly. Unescaping the whole text first and
+    then parsing gives the same result, except that strings which were escaped
+    twice need a second pass, so only those are repaired afterwards."""
+    content = response.content
+    # Raw UTF-8 was read as latin-1 by the old path, and a backslash before
+    # \/ or an escaped backslash (\u005c) cannot be told apart once parsed:
+    # keep unescaping the whole text for those rare payloads.
+    if not content.isascii() or b'\\u005' in content or b'\\\\\\/' in content:
+        with timing.phase('decode'):
+            response_text = response.text.encode().decode('unicode-escape')
+            if repair_from_titles:
+                response_text = FROM_TITLE_PATTERN.sub(r"(From '\1')", response_text)
+        with timing.phase('parse'):
+            return json.loads(response_text)
+    with timing.phase('parse'):
+        data = json.loads(content)
+    if repair_from_titles and b'(From \\"' in content:
+        with timing.phase('decode'):
+            return _repair(data, _unescape_from_title)
+    if b'\\\\' in content:
+        with timing.phase('decode'):
+            return _repair(data, _unescape)
+    return data
+
+
+def _load_legacy_json(response):
+    """jiosaavn.com api.php responses carry unicode escapes inside their JSON strings."""
+    return _parse_payload(response)
+
+
+def _load_autocomplete_json(response):
+    # Titles like (From "Movie") break the JSON once unescaped
+    return _parse_payload(response, repair_from_titles=True)
+
+
+def _song_cache_key(id, lyrics, media=True):
+    # Songs formatted without their media URL (media=False) are kept apart
+    return (id, bool(lyrics)) if media else (id, bool(lyrics), False)
+
+
+def _playlist_cache_key(listId, lyrics, media=True):
+    return (listId, bool(lyrics)) if media else (listId, bool(lyrics), False)
+
+
+def _without_media(song):
+    song.pop('media_url', None)
+    song.pop('media_preview_url', None)
+    return song
+
+
+def _catalog_songs(song_ids, media=True):
+    """{id: song} of the IDs the catalog knows, without lyrics. Songs due
+    for a refresh are still returned and re-fetched in the background."""
+    songs, due = catalog.get_songs(song_ids)
+    if songs:
+        cache.note_state('fresh')
+    if due:
+        cache.note_state('stale')
+        _refresh_catalog_songs(due)
+    if not media:
+        for song in songs.values():
+            _without_media(song)
+    return songs
+
+
+def _refresh_catalog_song_chunk(song_ids):
+    try:
+        songs = _fetch_song_details(song_ids, _chunk_timeout(song_ids))
+        _store_songs(songs, False)
+        catalog.add_songs(songs.values())
+    except Exception as e:
+        logger.warning(f"Catalog refresh of {len(song_ids)} songs failed: {str(e)}")
+    finally:
+        catalog.refreshed(song_ids)
+
+
+def _get_refresh_executor():
+    # Its own pool, so refreshes never queue user requests' chunks
+    global _refresh_executor, _refresh_executor_pid
+    pid = os.getpid()
+    if _refresh_executor is None or _refresh_executor_pid != pid:
+        with _refresh_executor_lock:
+            if _refresh_executor is None or _refresh_executor_pid != pid:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=CATALOG_REFRESH_CONCURRENCY, thread_name_prefix="catalog-refresh")
+                _refresh_executor_pid = pid
+    return _refresh_executor
+
+
+def _refresh_catalog_songs(song_ids):
+    executor = _get_refresh_executor()
+    for chunk in _chunks(song_ids, SONG_DETAILS_CHUNK_SIZE):
+        executor.submit(_refresh_catalog_song_chunk, chunk)
+
+
+@cache.cached('song', key=_song_cache_key)
+def get_song(id, lyrics, media=True):
+    song_data = _catalog_songs([id], media).get(id)
+    if song_data is not None:
+        if lyrics:
+            helper.fetch_lyrics([song_data])
+        return song_data
     try:
         song_details_base_url = endpoints.song_details_base_url+id
         logger.info(f"Making request to: {song_details_base_url}")
-        response = requests.get(song_details_base_url, timeout=10)
+        response = upstream.get(song_details_base_url, timeout=10)
         response.raise_for_status()
         
-        response_text = response.text.encode().decode('unicode-escape')
-        song_response = json.loads(response_text)
+        song_response = _load_legacy_json(response)
         
         if id not in song_response:
             logger.error(f"Song ID {id} not found in response")
             return None
             
-        song_data = helper.format_song(song_response[id], lyrics)
+        song_data = helper.format_song(song_response[id], False, media)
+        if lyrics:
+            helper.fetch_lyrics([song_data])
+        if media:
+            catalog.add_songs([song_data])
         return song_data
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_song: {str(e)}")
@@ -174,16 +468,139 @@ def get_song(id, lyrics):
         return None
 
 
-def get_multiple_songs(song_ids, lyrics):
+def _fetch_song_details(song_ids, timeout, media=True):
+    """One song.getDetails request for a list of IDs -> {id: formatted song}.
+    IDs that are unknown upstream or fail to format are left out."""
+    url = endpoints.song_details_base_url + ','.join(song_ids)
+    logger.info(f"Making request to: {url}")
+    response = upstream.get(url, timeout=timeout)
+    response.raise_for_status()
+    return _format_song_details(song_ids, _load_legacy_json(response), media)
+
+
+def _format_song_details(song_ids, songs_response, media=True):
+    songs = {}
+    if media:
+        helper.prefetch_media_urls([songs_response[id] for id in song_ids if id in songs_response])
+    for id in song_ids:
+        if id not in songs_response:
+            logger.warning(f"Song ID {id} not found in response")
+            continue
+        try:
+            songs[id] = helper.format_song(songs_response[id], False, media)
+        except Exception as e:
+            logger.error(f"Error formatting song {id}: {str(e)}")
+    return songs
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _chunk_timeout(chunk):
+    return min(SONG_DETAILS_BASE_TIMEOUT + len(chunk) * SONG_DETAILS_TIMEOUT_PER_SONG, SONG_DETAILS_MAX_TIMEOUT)
+
+
+def _get_chunk_executor():
+    global _chunk_executor, _chunk_executor_pid
+    pid = os.getpid()
+    if _chunk_executor is None or _chunk_executor_pid != pid:
+        with _chunk_executor_lock:
+            if _chunk_executor is None or _chunk_executor_pid != pid:
+                _chunk_executor = ThreadPoolExecutor(
+                    max_workers=SONG_DETAILS_CONCURRENCY, thread_name_prefix="song-details")
+                _chunk_executor_pid = pid
+    return _chunk_executor
+
+
+def _cached_songs(song_ids, lyrics, media=True):
+    """({id: song} of the cached song_ids, [the other IDs]), repeated IDs once."""
+    found = {}
+    missing = []
+    for id in dict.fromkeys(song_ids):
+        hit, song = cache.lookup('song', _song_cache_key(id, lyrics, media))
+        if hit:
+            found[id] = song
+        else:
+            missing.append(id)
+    return found, missing
+
+
+def _store_songs(songs, lyrics, media=True):
+    for id, song in songs.items():
+        cache.store('song', _song_cache_key(id, lyrics, media), song)
+
+
+def get_songs_by_ids(song_ids, lyrics, timeout=None, media=True):
+    """Return {id: formatted song} for the given IDs.
+    - repeated IDs are fetched once, and songs in the cache or the catalog
+      are not fetched at all
+    - the rest is split into chunks of SONG_DETAILS_CHUNK_SIZE that are
+      fetched concurrently, each with its own timeout, all within
+      SONG_DETAILS_DEADLINE
+    - a chunk that fails or times out only drops its own IDs from the result;
+      the error is raised only when every chunk failed
+    """
+    found, missing = _cached_songs(song_ids, lyrics, media)
+    if not missing:
+        return found
+
+    known = _catalog_songs(missing, media)
+    missing = [id for id in missing if id not in known]
+    if missing:
+        cache.note_state('revalidated')
+    chunks = _chunks(missing, SONG_DETAILS_CHUNK_SIZE)
+    fetched = {}
+    errors = []
+    if len(chunks) == 1:
+        fetched = _fetch_song_details(chunks[0], timeout or _chunk_timeout(chunks[0]), media)
+    elif chunks:
+        executor = _get_chunk_executor()
+        futures = {
+            executor.submit(_fetch_song_details, chunk, timeout or _chunk_timeout(chunk), media): chunk
+            for chunk in chunks
+        }
+        with timing.phase('upstream'):
+            done, not_done = wait(futures, timeout=SONG_DETAILS_DEADLINE)
+        for future in not_done:
+            future.cancel()
+            logger.warning(f"Song details chunk of {len(futures[future])} IDs timed out")
+        for future in done:
+            try:
+                fetched.update(future.result())
+            except Exception as e:
+                logger.error(f"Song details chunk of {len(futures[future])} IDs failed: {str(e)}")
+                errors.append(e)
+        if errors and len(errors) == len(chunks):
+            raise errors[0]
+        if errors or not_done:
+            cache.note_failure()
+
+    songs = {**known, **fetched}
+    if lyrics:
+        helper.fetch_lyrics(list(songs.values()))
+    found.update(songs)
+    _store_songs(songs, lyrics, media)
+    if media:
+        # Queued once the songs are complete: the writer reads them later
+        catalog.add_songs(fetched.values())
+    return found
+
+
+def get_multiple_songs(song_ids, lyrics, media=True):
     """
-    Fetch multiple songs in a single API request for better performance.
+    Fetch multiple songs with as few API requests as possible.
+
+    Cached songs are served directly, repeated IDs are fetched once and the
+    remaining IDs are fetched in concurrent chunks (see get_songs_by_ids).
     
     Args:
         song_ids (list): List of song IDs to fetch
         lyrics (bool): Whether to include lyrics in the response
+        media (bool): Whether to decrypt the media URLs
     
     Returns:
-        dict: Response with status and songs data
+        dict: Response with status and songs data, in the order requested
     """
     try:
         if not song_ids:
@@ -191,39 +608,16 @@ def get_multiple_songs(song_ids, lyrics):
                 "status": False,
                 "error": "No song IDs provided"
             }
-        
-        # Join song IDs with comma for the API request
-        ids_param = ','.join(song_ids)
-        song_details_base_url = endpoints.song_details_base_url + ids_param
-        
-        # Adjust timeout based on number of songs
-        base_timeout = 15
-        timeout_per_song = 0.5  # Additional seconds per song
-        dynamic_timeout = base_timeout + (len(song_ids) * timeout_per_song)
-        dynamic_timeout = min(dynamic_timeout, 60)  # Cap at 60 seconds
-        
-        logger.info(f"Making request to: {song_details_base_url}")
-        logger.info(f"Requesting {len(song_ids)} songs with {dynamic_timeout}s timeout")
-        response = requests.get(song_details_base_url, timeout=dynamic_timeout)
-        response.raise_for_status()
-        
-        response_text = response.text.encode().decode('unicode-escape')
-        songs_response = json.loads(response_text)
-        
+
+        logger.info(f"Requesting {len(song_ids)} songs")
+        found = get_songs_by_ids(song_ids, lyrics, media=media)
+
         songs_data = []
         failed_ids = []
-        
-        # Process each song ID
         for song_id in song_ids:
-            if song_id in songs_response:
-                try:
-                    song_data = helper.format_song(songs_response[song_id], lyrics)
-                    songs_data.append(song_data)
-                except Exception as e:
-                    logger.error(f"Error formatting song {song_id}: {str(e)}")
-                    failed_ids.append(song_id)
+            if song_id in found:
+                songs_data.append(found[song_id])
             else:
-                logger.warning(f"Song ID {song_id} not found in response")
                 failed_ids.append(song_id)
         
         # Prepare response
@@ -261,13 +655,18 @@ def get_multiple_songs(song_ids, lyrics):
 
 
 def get_song_id(url):
-    res = requests.get(url, data=[('bitrate', '320')])
+    res = upstream.get(url, data=[('bitrate', '320')])
+    return _parse_song_id(res.text)
+
+
+def _parse_song_id(text):
     try:
-        return(res.text.split('"pid":"'))[1].split('","')[0]
+        return(text.split('"pid":"'))[1].split('","')[0]
     except IndexError:
-        return res.text.split('"song":{"type":"')[1].split('","image":')[0].split('"id":"')[-1]
+        return text.split('"song":{"type":"')[1].split('","image":')[0].split('"id":"')[-1]
 
 
+@cache.cached('album', key=lambda album_link, lyrics: album_link)
 def get_album_by_link(album_link, lyrics):
     """Fetch album details from saavn.dev using the album link and normalize.
     - Collapse image arrays to best URL (root and songs)
@@ -281,128 +680,12 @@ def get_album_by_link(album_link, lyrics):
         encoded_link = urllib.parse.quote(album_link, safe='')
         url = f"{endpoints.album_details_base_url}{encoded_link}"
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=20)
+        response = upstream.get(url, timeout=20)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-
-        payload = (data or {}).get('data') or {}
-
-        # Root image collapse
-        root_img = _select_highest_quality_image(payload.get('image'))
-        if root_img:
-            payload['image'] = root_img.get('url') if isinstance(root_img, dict) else root_img
-
-        # Root artists -> primaryartist string
-        try:
-            artists_block = payload.get('artists') or {}
-            primary_list = artists_block.get('primary') or []
-            names = []
-            for a in primary_list:
-                name = (a or {}).get('name')
-                if name:
-                    names.append(name)
-            if names:
-                payload['primaryartist'] = ', '.join(names)
-            if 'artists' in payload:
-                del payload['artists']
-        except Exception:
-            try:
-                if 'artists' in payload:
-                    del payload['artists']
-            except Exception:
-                pass
-
-        # Rename root keys: name -> album, primaryartist -> primary_artists
-        try:
-            if 'name' in payload and 'album' not in payload:
-                payload['album'] = payload.get('name')
-                del payload['name']
-        except Exception:
-            pass
-        try:
-            if 'primaryartist' in payload and 'primary_artists' not in payload:
-                payload['primary_artists'] = payload.get('primaryartist')
-                del payload['primaryartist']
-        except Exception:
-            pass
-        # Rename root url -> album_url
-        try:
-            if 'url' in payload and 'album_url' not in payload:
-                payload['album_url'] = payload.get('url')
-                del payload['url']
-        except Exception:
-            pass
-
-        # Songs normalization
-        songs = payload.get('songs') or []
-        normalized_songs = []
-        for s in songs:
-            song = dict(s or {})
-            # Image collapse
-            img = _select_highest_quality_image(song.get('image'))
-            if img:
-                song['image'] = img.get('url') if isinstance(img, dict) else img
-            # Download best URL
-            best_dl = _select_highest_quality_download_url(song.get('downloadUrl'))
-            if best_dl:
-                song['media_url'] = best_dl
-            # Remove the original downloadUrl array if present
-            try:
-                if 'downloadUrl' in song:
-                    del song['downloadUrl']
-            except Exception:
-                pass
-            # Artists -> primaryartist string
-            try:
-                s_art = song.get('artists') or {}
-                prim = s_art.get('primary') or []
-                s_names = []
-                for a in prim:
-                    nm = (a or {}).get('name')
-                    if nm:
-                        s_names.append(nm)
-                if s_names:
-                    song['primaryartist'] = ', '.join(s_names)
-                if 'artists' in song:
-                    del song['artists']
-            except Exception:
-                try:
-                    if 'artists' in song:
-                        del song['artists']
-                except Exception:
-                    pass
-            # Remove redundant nested album object from song if present
-            try:
-                if 'album' in song:
-                    del song['album']
-            except Exception:
-                pass
-            # Rename url -> perma_url
-            try:
-                if 'url' in song and 'perma_url' not in song:
-                    song['perma_url'] = song.get('url')
-                    del song['url']
-            except Exception:
-                pass
-            # Rename song keys: name -> song, primaryartist -> primary_artists
-            try:
-                if 'name' in song and 'song' not in song:
-                    song['song'] = song.get('name')
-                    del song['name']
-            except Exception:
-                pass
-            try:
-                if 'primaryartist' in song and 'primary_artists' not in song:
-                    song['primary_artists'] = song.get('primaryartist')
-                    del song['primaryartist']
-            except Exception:
-                pass
-            normalized_songs.append(song)
-        payload['songs'] = normalized_songs
-
-        return {"success": bool(data.get('success', True)), "data": payload}
+        album = _normalize_album(data)
+        catalog.add_album(album)
+        return album
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_album_by_link: {str(e)}")
         return {"success": False, "error": f"Request failed: {str(e)}"}
@@ -411,21 +694,28 @@ def get_album_by_link(album_link, lyrics):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_album = normalize.NORMALIZERS['album']
+
+
 def get_album_id(input_url):
-    res = requests.get(input_url)
+    res = upstream.get(input_url)
+    return _parse_album_id(res.text)
+
+
+def _parse_album_id(text):
     try:
-        return res.text.split('"album_id":"')[1].split('"')[0]
+        return text.split('"album_id":"')[1].split('"')[0]
     except IndexError:
-        return res.text.split('"page_id","')[1].split('","')[0]
+        return text.split('"page_id","')[1].split('","')[0]
 
 
-def get_playlist(listId, lyrics):
+@cache.cached('playlist', key=_playlist_cache_key)
+def get_playlist(listId, lyrics, media=True):
     try:
-        response = requests.get(endpoints.playlist_details_base_url+listId)
+        response = upstream.get(endpoints.playlist_details_base_url+listId)
         if response.status_code == 200:
-            songs_json = response.text.encode().decode('unicode-escape')
-            songs_json = json.loads(songs_json)
-            return helper.format_playlist(songs_json, lyrics)
+            songs_json = _load_legacy_json(response)
+            return helper.format_playlist(songs_json, lyrics, media)
         return None
     except Exception:
         print_exc()
@@ -433,116 +723,43 @@ def get_playlist(listId, lyrics):
 
 
 def get_playlist_id(input_url):
-    res = requests.get(input_url).text
+    res = upstream.get(input_url).text
+    return _parse_playlist_id(res)
+
+
+def _parse_playlist_id(res):
     try:
         return res.split('"type":"playlist","id":"')[1].split('"')[0]
     except IndexError:
         return res.split('"page_id","')[1].split('","')[0]
 
 
-def get_lyrics(id):
+@cache.cached('lyrics', key=lambda id, timeout=None: id)
+def get_lyrics(id, timeout=None):
     url = endpoints.lyrics_base_url+id
-    lyrics_json = requests.get(url).text
+    lyrics_json = upstream.get(url, timeout=timeout).text
     lyrics_text = json.loads(lyrics_json)
     return lyrics_text['lyrics']
 
 
-def _select_highest_quality_image(images):
-    try:
-        if not images or not isinstance(images, list):
-            return None
-        # Try to pick by explicit quality field ordering if present
-        quality_priority = {
-            '500x500': 4,
-            '480x480': 3,
-            '320x320': 2,
-            '150x150': 1
-        }
-        def score(img):
-            q = img.get('quality') or ''
-            return quality_priority.get(q, 0)
-        best = max(images, key=score)
-        # Fallback: if url has size patterns, prefer largest by parsing digits
-        if not best.get('url') and images:
-            best = images[0]
-        return best
-    except Exception:
-        return images[0] if images else None
-
-
+@cache.cached('search', key=lambda query: ('global', query))
 def global_search(query):
     """Call the Cloudflare Worker global search and normalize response.
     Keeps positions and topQuery, chooses highest-quality image and download url.
     """
     if not query:
         return {"success": False, "error": "Query is required"}
+    local = _local_global_search(query)
+    if local is not None:
+        return local
     try:
         url = endpoints.global_search_base_url + query
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=15)
+        response = upstream.get(url, timeout=15)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-
-        # Expecting { success, data: { sections... } }
-        result = {
-            "success": bool(data.get('success', True)),
-            "data": {}
-        }
-        payload = data.get('data') or {}
-
-        def process_section(section_name):
-            section = payload.get(section_name)
-            if not section:
-                return None
-            results = section.get('results') or []
-            normalized = []
-            for item in results:
-                obj = dict(item) if isinstance(item, dict) else {}
-                # Highest quality image
-                img = _select_highest_quality_image(obj.get('image'))
-                if img:
-                    if isinstance(img, dict):
-                        obj['image'] = img.get('url')
-                    elif isinstance(img, str):
-                        obj['image'] = img
-                # Albums: rename artist -> primaryArtists
-                if section_name == 'albums':
-                    if 'artist' in obj and 'primaryArtists' not in obj:
-                        obj['primaryArtists'] = obj.get('artist')
-                        try:
-                            del obj['artist']
-                        except Exception:
-                            pass
-                    # Albums: rename url -> album_url
-                    if 'url' in obj and 'album_url' not in obj:
-                        obj['album_url'] = obj.get('url')
-                        try:
-                            del obj['url']
-                        except Exception:
-                            pass
-                # Playlists: rename url -> playlist_url
-                if section_name == 'playlists':
-                    if 'url' in obj and 'playlist_url' not in obj:
-                        obj['playlist_url'] = obj.get('url')
-                        try:
-                            del obj['url']
-                        except Exception:
-                            pass
-                normalized.append(obj)
-            return {
-                "results": normalized,
-                "position": section.get('position')
-            }
-
-        for name in [
-            'topQuery', 'songs', 'albums', 'playlists', 'artists'
-        ]:
-            processed = process_section(name)
-            if processed is not None:
-                result['data'][name] = processed
-
+        result = _normalize_global_search(data)
+        catalog.add_search_results(result)
         return result
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in global_search: {str(e)}")
@@ -552,32 +769,120 @@ def global_search(query):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
-def _select_highest_quality_download_url(downloads):
+_normalize_global_search = normalize.NORMALIZERS['global_search']
+
+# autocomplete.get sections, named as in global_search responses
+AUTOCOMPLETE_SECTIONS = (('topquery', 'topQuery'), ('songs', 'songs'), ('albums', 'albums'),
+                         ('playlists', 'playlists'), ('artists', 'artists'))
+
+
+def _autocomplete_item(item):
+    """An autocomplete.get item in the shape global_search gives it."""
+    more_info = item.get('more_info') or {}
+    kind = item.get('type', '')
+    result = {
+        'id': item.get('id', ''),
+        'title': helper.format(item.get('title', '')),
+        'image': item.get('image', '').replace('50x50', '500x500').replace('150x150', '500x500'),
+        'type': kind,
+        'description': helper.format(item.get('description', '')),
+    }
+    if kind == 'song':
+        result.update({
+            'album': helper.format(item.get('album', '')),
+            'url': item.get('url', ''),
+            'primaryArtists': helper.format(more_info.get('primary_artists', '')),
+            'singers': helper.format(more_info.get('singers', '')),
+            'language': more_info.get('language', ''),
+        })
+    elif kind == 'album':
+        result.update({
+            'year': more_info.get('year', ''),
+            'songIds': more_info.get('song_pids', ''),
+            'language': more_info.get('language', ''),
+            'primaryArtists': helper.format(item.get('music', '')),
+            'album_url': item.get('url', ''),
+        })
+    elif kind == 'playlist':
+        result.update({
+            'language': more_info.get('language', ''),
+            'playlist_url': item.get('url', ''),
+        })
+    return result
+
+
+@metrics.cpu_timed('autocomplete')
+def _normalize_autocomplete(response_data):
+    """autocomplete.get response -> global_search response."""
+    data = {}
+    for name, section in AUTOCOMPLETE_SECTIONS:
+        part = response_data.get(name)
+        if isinstance(part, dict):
+            data[section] = {
+                'results': [_autocomplete_item(item) for item in part.get('data') or () if isinstance(item, dict)],
+                'position': part.get('position'),
+            }
+    return {'success': True, 'data': data}
+
+
+def _suggestions(upstream_result, local, limit):
+    """Songs, albums and artists of an autocomplete response in upstream
+    order, then the local suggestions it lacks."""
+    items = []
+    seen = set()
+    sections = upstream_result['data'] if upstream_result else {}
+    for name in ('topQuery', 'songs', 'albums', 'artists'):
+        items.extend(sections.get(name, {}).get('results', ()))
+    items.extend(local)
+    results = []
+    for item in items:
+        key = (item.get('type'), item.get('id'))
+        if key[0] in ('song', 'album', 'artist') and key not in seen:
+            seen.add(key)
+            results.append(item)
+    return {'success': True, 'data': {'results': results[:limit]}}
+
+
+def _autocomplete_key(query, limit=typeahead.AUTOCOMPLETE_LIMIT):
+    return (query.casefold(), limit)
+
+
+def autocomplete_needs_upstream(query, limit=typeahead.AUTOCOMPLETE_LIMIT):
+    """Whether autocomplete() would call upstream for this prefix."""
+    hit, _ = cache.lookup('autocomplete', _autocomplete_key(query, limit))
+    return not hit and len(search_index.suggest(query, limit)) < limit
+
+
+def local_autocomplete(query, limit=typeahead.AUTOCOMPLETE_LIMIT):
+    """autocomplete() from the search index only."""
+    return _suggestions(None, search_index.suggest(query, limit), limit)
+
+
+@cache.cached('autocomplete', key=_autocomplete_key)
+def autocomplete(query, limit=typeahead.AUTOCOMPLETE_LIMIT):
+    """Typeahead suggestions (songs, albums, artists) for a partial query.
+    Answered from the search index when it has `limit` of them, otherwise by
+    the jiosaavn.com autocomplete, whose items are added to the catalog."""
+    local = search_index.suggest(query, limit)
+    if len(local) >= limit:
+        return _suggestions(None, local, limit)
     try:
-        if not downloads:
-            return None
-        if isinstance(downloads, list):
-            # Items may be {quality, url}
-            def score(item):
-                q = (item or {}).get('quality') or ''
-                if isinstance(q, str) and q.isdigit():
-                    try:
-                        return int(q)
-                    except Exception:
-                        return 0
-                # fallback by inspecting url
-                u = (item or {}).get('url') or ''
-                if '320' in u: return 320
-                if '160' in u: return 160
-                if '96' in u: return 96
-                return 0
-            best = max(downloads, key=score)
-            return (best or {}).get('url')
-        return None
-    except Exception:
-        return None
+        url = endpoints.search_base_url + query
+        logger.info(f"Making request to: {url}")
+        response = upstream.get(url, timeout=10)
+        response.raise_for_status()
+        result = _normalize_autocomplete(_load_autocomplete_json(response))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in autocomplete: {str(e)}")
+        return {"success": False, "error": f"Request failed: {str(e)}"}
+    except Exception as e:
+        logger.error(f"Unexpected error in autocomplete: {str(e)}")
+        return {"success": False, "error": "An unexpected error occurred"}
+    catalog.add_search_results(result)
+    return _suggestions(result, local, limit)
 
 
+@cache.cached('artist', key=lambda artist_id: artist_id)
 def get_artist_details(artist_id):
     """Fetch and normalize artist details from worker endpoint.
     - image collapsed to best url string
@@ -590,131 +895,10 @@ def get_artist_details(artist_id):
     try:
         url = endpoints.artist_details_base_url + artist_id
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=20)
+        response = upstream.get(url, timeout=20)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-        payload = (data or {}).get('data') or {}
-
-        # Remove availableLanguages if present
-        try:
-            if 'availableLanguages' in payload:
-                del payload['availableLanguages']
-        except Exception:
-            pass
-
-        # Root image
-        root_img = _select_highest_quality_image(payload.get('image'))
-        if root_img:
-            payload['image'] = root_img.get('url') if isinstance(root_img, dict) else root_img
-
-        # Helper to normalize artists to primary only and collapse image
-        def keep_primary_artists_only(container):
-            try:
-                if not isinstance(container, dict):
-                    return container
-                primary_list = (container.get('primary') or [])
-                normalized_primary = []
-                for a in primary_list:
-                    artist_obj = dict(a)
-                    aimg = _select_highest_quality_image(artist_obj.get('image'))
-                    if aimg:
-                        artist_obj['image'] = aimg.get('url') if isinstance(aimg, dict) else aimg
-                    normalized_primary.append(artist_obj)
-                return { 'primary': normalized_primary }
-            except Exception:
-                return { 'primary': container.get('primary', []) } if isinstance(container, dict) else container
-
-        # Top songs
-        songs = payload.get('topSongs') or []
-        normalized_songs = []
-        for s in songs:
-            song = dict(s)
-            img = _select_highest_quality_image(song.get('image'))
-            if img:
-                song['image'] = img.get('url') if isinstance(img, dict) else img
-            best_dl = _select_highest_quality_download_url(song.get('downloadUrl'))
-            if best_dl:
-                song['downloadUrl'] = best_dl
-            # Replace artists object with a single primaryartist string
-            try:
-                artists_block = song.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                primary_names = []
-                for a in primary_list:
-                    name = (a or {}).get('name')
-                    if name:
-                        primary_names.append(name)
-                if primary_names:
-                    song['primaryartist'] = ', '.join(primary_names)
-                if 'artists' in song:
-                    del song['artists']
-            except Exception:
-                if 'artists' in song:
-                    try:
-                        del song['artists']
-                    except Exception:
-                        pass
-            normalized_songs.append(song)
-        payload['topSongs'] = normalized_songs
-
-        # Remove singles entirely as not needed
-        try:
-            if 'singles' in payload:
-                del payload['singles']
-        except Exception:
-            pass
-
-        # Top albums: image only
-        albums = payload.get('topAlbums') or []
-        normalized_albums = []
-        for a in albums:
-            album = dict(a)
-            img = _select_highest_quality_image(album.get('image'))
-            if img:
-                album['image'] = img.get('url') if isinstance(img, dict) else img
-            # Replace artists object with a single primaryartist string
-            try:
-                artists_block = album.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                primary_names = []
-                for aobj in primary_list:
-                    name = (aobj or {}).get('name')
-                    if name:
-                        primary_names.append(name)
-                if primary_names:
-                    album['primaryartist'] = ', '.join(primary_names)
-                if 'artists' in album:
-                    del album['artists']
-            except Exception:
-                if 'artists' in album:
-                    try:
-                        del album['artists']
-                    except Exception:
-                        pass
-            # Rename url -> album_url
-            try:
-                if 'url' in album and 'album_url' not in album:
-                    album['album_url'] = album.get('url')
-                    del album['url']
-            except Exception:
-                pass
-            normalized_albums.append(album)
-        payload['topAlbums'] = normalized_albums
-
-        # Similar artists: image only
-        sim_artists = payload.get('similarArtists') or []
-        normalized_sim = []
-        for ar in sim_artists:
-            artist = dict(ar)
-            img = _select_highest_quality_image(artist.get('image'))
-            if img:
-                artist['image'] = img.get('url') if isinstance(img, dict) else img
-            normalized_sim.append(artist)
-        payload['similarArtists'] = normalized_sim
-
-        return {"success": bool(data.get('success', True)), "data": payload}
+        return _normalize_artist_details(data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_artist_details: {str(e)}")
         return {"success": False, "error": f"Request failed: {str(e)}"}
@@ -723,6 +907,9 @@ def get_artist_details(artist_id):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_artist_details = normalize.NORMALIZERS['artist_details']
+
+
 def get_song_suggestions(song_id):
     """Fetch and normalize song recommendations for a given song id.
     - Collapse image to best URL string
@@ -734,44 +921,10 @@ def get_song_suggestions(song_id):
     try:
         url = f"{endpoints.song_suggestions_base_url}{song_id}/suggestions"
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=20)
+        response = upstream.get(url, timeout=20)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-        items = (data or {}).get('data') or []
-        normalized = []
-        for itm in items:
-            obj = dict(itm)
-            # Image
-            img = _select_highest_quality_image(obj.get('image'))
-            if img:
-                obj['image'] = img.get('url') if isinstance(img, dict) else img
-            # Primary artists only -> primaryartist string
-            try:
-                artists_block = obj.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                names = []
-                for a in primary_list:
-                    name = (a or {}).get('name')
-                    if name:
-                        names.append(name)
-                if names:
-                    obj['primaryartist'] = ', '.join(names)
-                if 'artists' in obj:
-                    del obj['artists']
-            except Exception:
-                if 'artists' in obj:
-                    try:
-                        del obj['artists']
-                    except Exception:
-                        pass
-            # Download url best
-            best_dl = _select_highest_quality_download_url(obj.get('downloadUrl'))
-            if best_dl:
-                obj['downloadUrl'] = best_dl
-            normalized.append(obj)
-        return {"success": bool(data.get('success', True)), "data": normalized}
+        return _normalize_song_suggestions(data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_song_suggestions: {str(e)}")
         return {"success": False, "error": f"Request failed: {str(e)}"}
@@ -780,6 +933,9 @@ def get_song_suggestions(song_id):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_song_suggestions = normalize.NORMALIZERS['song_suggestions']
+
+
 def search_playlists(query):
     """Search playlists by query and collapse images to best URL string."""
     if not query:
@@ -787,35 +943,10 @@ def search_playlists(query):
     try:
         url = endpoints.playlist_search_base_url + query
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=15)
+        response = upstream.get(url, timeout=15)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-        payload = (data or {}).get('data') or {}
-        results = payload.get('results') or []
-        normalized = []
-        for item in results:
-            obj = dict(item)
-            img = _select_highest_quality_image(obj.get('image'))
-            if img:
-                obj['image'] = img.get('url') if isinstance(img, dict) else img
-            # Rename url -> playlist_url
-            try:
-                if 'url' in obj and 'playlist_url' not in obj:
-                    obj['playlist_url'] = obj.get('url')
-                    del obj['url']
-            except Exception:
-                pass
-            normalized.append(obj)
-        return {
-            "success": bool(data.get('success', True)),
-            "data": {
-                "total": payload.get('total'),
-                "start": payload.get('start'),
-                "results": normalized
-            }
-        }
+        return _normalize_search_playlists(data)
     except requests.exceptions.HTTPError as e:
         status = getattr(e.response, 'status_code', None)
         logger.error(f"Request error in search_playlists: {str(e)}")
@@ -828,6 +959,9 @@ def search_playlists(query):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_search_playlists = normalize.NORMALIZERS['search_playlists']
+
+
 def search_albums(query):
     """Search albums by query, collapse image to best URL, reduce artists to primary names string, rename url to album_url."""
     if not query:
@@ -835,55 +969,10 @@ def search_albums(query):
     try:
         url = endpoints.album_search_base_url + query
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=15)
+        response = upstream.get(url, timeout=15)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-        payload = (data or {}).get('data') or {}
-        results = payload.get('results') or []
-        normalized = []
-        for item in results:
-            obj = dict(item)
-            # primaryartist string
-            try:
-                artists_block = obj.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                names = []
-                for a in primary_list:
-                    name = (a or {}).get('name')
-                    if name:
-                        names.append(name)
-                if names:
-                    obj['primaryartist'] = ', '.join(names)
-                if 'artists' in obj:
-                    del obj['artists']
-            except Exception:
-                if 'artists' in obj:
-                    try:
-                        del obj['artists']
-                    except Exception:
-                        pass
-            # image collapse
-            img = _select_highest_quality_image(obj.get('image'))
-            if img:
-                obj['image'] = img.get('url') if isinstance(img, dict) else img
-            # rename url
-            try:
-                if 'url' in obj and 'album_url' not in obj:
-                    obj['album_url'] = obj.get('url')
-                    del obj['url']
-            except Exception:
-                pass
-            normalized.append(obj)
-        return {
-            "success": bool(data.get('success', True)),
-            "data": {
-                "total": payload.get('total'),
-                "start": payload.get('start'),
-                "results": normalized
-            }
-        }
+        return _normalize_search_albums(data)
     except requests.exceptions.HTTPError as e:
         status = getattr(e.response, 'status_code', None)
         logger.error(f"Request error in search_albums: {str(e)}")
@@ -896,6 +985,16 @@ def search_albums(query):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_search_albums = normalize.NORMALIZERS['search_albums']
+
+
+def _artist_list_key(kind):
+    def make_key(artist_id, sort_by="latest", sort_order="desc"):
+        return (kind, artist_id, sort_by, sort_order)
+    return make_key
+
+
+@cache.cached('artist', key=_artist_list_key('songs'))
 def get_artist_songs(artist_id, sort_by="latest", sort_order="desc"):
     """Fetch and normalize artist songs with sorting options.
     - Collapse image arrays to best URL
@@ -918,88 +1017,12 @@ def get_artist_songs(artist_id, sort_by="latest", sort_order="desc"):
     try:
         url = f"{endpoints.artist_songs_base_url}{artist_id}/songs?sortBy={sort_by}&sortOrder={sort_order}"
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=20)
+        response = upstream.get(url, timeout=20)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-
-        payload = (data or {}).get('data') or {}
-        songs = payload.get('songs') or []
-        normalized_songs = []
-        
-        for song in songs:
-            song_obj = dict(song or {})
-            
-            # Image collapse
-            img = _select_highest_quality_image(song_obj.get('image'))
-            if img:
-                song_obj['image'] = img.get('url') if isinstance(img, dict) else img
-            
-            # Download best URL -> media_url
-            best_dl = _select_highest_quality_download_url(song_obj.get('downloadUrl'))
-            if best_dl:
-                song_obj['media_url'] = best_dl
-            
-            # Remove original downloadUrl array
-            try:
-                if 'downloadUrl' in song_obj:
-                    del song_obj['downloadUrl']
-            except Exception:
-                pass
-            
-            # Artists -> primaryartist string
-            try:
-                artists_block = song_obj.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                names = []
-                for a in primary_list:
-                    name = (a or {}).get('name')
-                    if name:
-                        names.append(name)
-                if names:
-                    song_obj['primaryartist'] = ', '.join(names)
-                if 'artists' in song_obj:
-                    del song_obj['artists']
-            except Exception:
-                try:
-                    if 'artists' in song_obj:
-                        del song_obj['artists']
-                except Exception:
-                    pass
-            
-            # Remove redundant album object
-            try:
-                if 'album' in song_obj:
-                    del song_obj['album']
-            except Exception:
-                pass
-            # Rename url -> perma_url
-            try:
-                if 'url' in song_obj and 'perma_url' not in song_obj:
-                    song_obj['perma_url'] = song_obj.get('url')
-                    del song_obj['url']
-            except Exception:
-                pass
-            # Rename keys: name -> song, primaryartist -> primary_artists
-            try:
-                if 'name' in song_obj and 'song' not in song_obj:
-                    song_obj['song'] = song_obj.get('name')
-                    del song_obj['name']
-            except Exception:
-                pass
-            try:
-                if 'primaryartist' in song_obj and 'primary_artists' not in song_obj:
-                    song_obj['primary_artists'] = song_obj.get('primaryartist')
-                    del song_obj['primaryartist']
-            except Exception:
-                pass
-            
-            normalized_songs.append(song_obj)
-        
-        payload['songs'] = normalized_songs
-        return {"success": bool(data.get('success', True)), "data": payload}
-        
+        result = _normalize_artist_songs(data)
+        catalog.add_artist_songs(artist_id, result)
+        return result
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_artist_songs: {str(e)}")
         return {"success": False, "error": f"Request failed: {str(e)}"}
@@ -1008,6 +1031,10 @@ def get_artist_songs(artist_id, sort_by="latest", sort_order="desc"):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_artist_songs = normalize.NORMALIZERS['artist_songs']
+
+
+@cache.cached('artist', key=_artist_list_key('albums'))
 def get_artist_albums(artist_id, sort_by="latest", sort_order="desc"):
     """Fetch and normalize artist albums with sorting options.
     - Collapse image arrays to best URL
@@ -1028,76 +1055,10 @@ def get_artist_albums(artist_id, sort_by="latest", sort_order="desc"):
     try:
         url = f"{endpoints.artist_albums_base_url}{artist_id}/albums?sortBy={sort_by}&sortOrder={sort_order}"
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=20)
+        response = upstream.get(url, timeout=20)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-
-        payload = (data or {}).get('data') or {}
-        albums = payload.get('albums') or payload.get('results') or []
-        normalized = []
-
-        for item in albums:
-            obj = dict(item or {})
-            # Collapse image to best url
-            img = _select_highest_quality_image(obj.get('image'))
-            if img:
-                obj['image'] = img.get('url') if isinstance(img, dict) else img
-
-            # If artists block is present, keep only primary names as string
-            try:
-                artists_block = obj.get('artists') or {}
-                primary_list = artists_block.get('primary') or []
-                names = []
-                for a in primary_list:
-                    name = (a or {}).get('name')
-                    if name:
-                        names.append(name)
-                if names:
-                    obj['primaryartist'] = ', '.join(names)
-                if 'artists' in obj:
-                    del obj['artists']
-            except Exception:
-                try:
-                    if 'artists' in obj:
-                        del obj['artists']
-                except Exception:
-                    pass
-
-            # Rename url -> album_url
-            try:
-                if 'url' in obj and 'album_url' not in obj:
-                    obj['album_url'] = obj.get('url')
-                    del obj['url']
-            except Exception:
-                pass
-
-            # Rename keys: name -> album, primaryartist -> primary_artists
-            try:
-                if 'name' in obj and 'album' not in obj:
-                    obj['album'] = obj.get('name')
-                    del obj['name']
-            except Exception:
-                pass
-            try:
-                if 'primaryartist' in obj and 'primary_artists' not in obj:
-                    obj['primary_artists'] = obj.get('primaryartist')
-                    del obj['primaryartist']
-            except Exception:
-                pass
-
-            normalized.append(obj)
-
-        payload['albums'] = normalized
-        # Remove legacy 'results' if present to avoid confusion
-        try:
-            if 'results' in payload:
-                del payload['results']
-        except Exception:
-            pass
-        return {"success": bool(data.get('success', True)), "data": payload}
-
+        return _normalize_artist_albums(data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error in get_artist_albums: {str(e)}")
         return {"success": False, "error": f"Request failed: {str(e)}"}
@@ -1106,6 +1067,9 @@ def get_artist_albums(artist_id, sort_by="latest", sort_order="desc"):
         return {"success": False, "error": "An unexpected error occurred"}
 
 
+_normalize_artist_albums = normalize.NORMALIZERS['artist_albums']
+
+
 def search_artists(query):
     """Search artists by query, collapse image to best URL string."""
     if not query:
@@ -1113,28 +1077,10 @@ def search_artists(query):
     try:
         url = endpoints.artist_search_base_url + query
         logger.info(f"Making request to: {url}")
-        response = requests.get(url, timeout=15)
+        response = upstream.get(url, timeout=15)
         response.raise_for_status()
         data = response.json()
-        if not isinstance(data, dict):
-            return {"success": False, "error": "Invalid response"}
-        payload = (data or {}).get('data') or {}
-        results = payload.get('results') or []
-        normalized = []
-        for item in results:
-            obj = dict(item)
-            img = _select_highest_quality_image(obj.get('image'))
-            if img:
-                obj['image'] = img.get('url') if isinstance(img, dict) else img
-            normalized.append(obj)
-        return {
-            "success": bool(data.get('success', True)),
-            "data": {
-                "total": payload.get('total'),
-                "start": payload.get('start'),
-                "results": normalized
-            }
-        }
+        return _normalize_search_artists(data)
     except requests.exceptions.HTTPError as e:
         status = getattr(e.response, 'status_code', None)
         logger.error(f"Request error in search_artists: {str(e)}")
@@ -1144,4 +1090,8 @@ def search_artists(query):
         return {"success": False, "error": f"Request failed: {str(e)}"}
     except Exception as e:
         logger.error(f"Unexpected error in search_artists: {str(e)}")
-        return {"success": False, "error": "An unexpected error occurred"}
\ No newline at end of file
+        return {"success": False, "error": "An unexpected error occurred"}
+
+
+_normalize_search_artists = normalize.NORMALIZERS['search_artists']
+
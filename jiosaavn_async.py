@@ -0,0 +1,535 @@
+"""Asyncio versions of the jiosaavn client functions.
+
+Every function here has the same signature and returns the same data as its
+counterpart in jiosaavn.py. Only the I/O differs: requests go through
+upstream.aget on a shared aiohttp session, so one worker can keep thousands
+of upstream calls in flight. Parsing and normalization are shared with the
+sync engine, and both engines read and fill the same caches.
+"""
+import asyncio
+import json
+import logging
+import urllib.parse
+
+import requests
+
+import cache
+import catalog
+import endpoints
+import helper
+import jiosaavn
+import search_index
+import timing
+import typeahead
+import upstream
+
+logger = logging.getLogger(__name__)
+
+_lyrics_semaphores = {}
+_catalog_refreshes = set()
+
+
+async def search_for_song(query, lyrics, songdata):
+    try:
+        if query.startswith('http') and 'saavn.com' in query:
+            id = await get_song_id(query)
+            return await get_song(id, lyrics)
+
+        search_base_url = endpoints.search_base_url+query
+        logger.info(f"Making request to: {search_base_url}")
+        try:
+            response = await upstream.aget(search_base_url, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if not songdata:
+                raise
+            logger.warning(f"Autocomplete failed, falling back to the worker song search: {str(e)}")
+            ids = await _worker_song_ids(query)
+            cache.note_type('search', ids)
+        else:
+            response_data = jiosaavn._load_autocomplete_json(response)
+
+            if 'songs' not in response_data or 'data' not in response_data['songs']:
+                logger.error(f"Unexpected response format: {response_data}")
+                return None
+
+            song_response = response_data['songs']['data']
+            # Live search hits: the response is cached for the search TTL,
+            # not for the TTL of the songs it is built from
+            cache.note_type('search', song_response)
+            if not songdata:
+                return song_response
+
+            ids = [song['id'] for song in song_response]
+
+        found = await get_songs_by_ids(ids, lyrics)
+        return [found[id] for id in ids if id in found]
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in search_for_song: {str(e)}")
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in search_for_song: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error in search_for_song: {str(e)}")
+        return None
+
+
+@cache.cached('search', key=lambda query, limit=10: ('song', query, limit))
+async def search_songs_new_api(query, limit=10):
+    try:
+        if query.startswith('http') and 'saavn.com' in query:
+            id = await get_song_id(query)
+            return await get_song(id, False)
+
+        local = await cache.run_blocking(jiosaavn._local_song_search, query, limit)
+        if local is not None:
+            return local
+
+        url = f"{endpoints.song_search_base_url}{urllib.parse.quote(query)}&limit={limit}"
+        logger.info(f"Making request to: {url}")
+        try:
+            response = await upstream.aget(url, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Worker song search failed, falling back to autocomplete: {str(e)}")
+            songs = await search_for_song(query, False, True) or []
+            return [jiosaavn._song_from_details(song) for song in songs[:limit]]
+
+        songs = jiosaavn._normalize_song_search(response.json())
+        catalog.add_songs(songs, 'search')
+        return songs
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in search_songs_new_api: {str(e)}")
+        return []
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in search_songs_new_api: {str(e)}")
+        return []
+    except Exception as e:
+        logger.error(f"Unexpected error in search_songs_new_api: {str(e)}")
+        return []
+
+
+async def _worker_song_ids(query, limit=10):
+    url = f"{endpoints.song_search_base_url}{urllib.parse.quote(query)}&limit={limit}"
+    logger.info(f"Making request to: {url}")
+    response = await upstream.aget(url, timeout=10)
+    response.raise_for_status()
+    return jiosaavn._song_search_ids(response.json())
+
+
+async def _catalog_songs(song_ids, media=True):
+    songs, due = await cache.run_blocking(catalog.get_songs, song_ids)
+    if songs:
+        cache.note_state('fresh')
+    if due:
+        cache.note_state('stale')
+        for chunk in jiosaavn._chunks(due, jiosaavn.SONG_DETAILS_CHUNK_SIZE):
+            task = asyncio.ensure_future(_refresh_catalog_song_chunk(chunk))
+            _catalog_refreshes.add(task)
+            task.add_done_callback(_catalog_refreshes.discard)
+    if not media:
+        for song in songs.values():
+            jiosaavn._without_media(song)
+    return songs
+
+
+async def _refresh_catalog_song_chunk(song_ids):
+    try:
+        songs = await _fetch_song_details(song_ids, jiosaavn._chunk_timeout(song_ids))
+        await cache.run_blocking(jiosaavn._store_songs, songs, False)
+        catalog.add_songs(songs.values())
+    except Exception as e:
+        logger.warning(f"Catalog refresh of {len(song_ids)} songs failed: {str(e)}")
+    finally:
+        catalog.refreshed(song_ids)
+
+
+@cache.cached('song', key=jiosaavn._song_cache_key)
+async def get_song(id, lyrics, media=True):
+    song_data = (await _catalog_songs([id], media)).get(id)
+    if song_data is not None:
+        if lyrics:
+            await fetch_lyrics([song_data])
+        return song_data
+    try:
+        song_details_base_url = endpoints.song_details_base_url+id
+        logger.info(f"Making request to: {song_details_base_url}")
+        response = await upstream.aget(song_details_base_url, timeout=10)
+        response.raise_for_status()
+
+        song_response = jiosaavn._load_legacy_json(response)
+
+        if id not in song_response:
+            logger.error(f"Song ID {id} not found in response")
+            return None
+
+        song_data = helper.format_song(song_response[id], False, media)
+        if lyrics:
+            await fetch_lyrics([song_data])
+        if media:
+            catalog.add_songs([song_data])
+        return song_data
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in get_song: {str(e)}")
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in get_song: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error in get_song: {str(e)}")
+        return None
+
+
+async def _fetch_song_details(song_ids, timeout, media=True):
+    url = endpoints.song_details_base_url + ','.join(song_ids)
+    logger.info(f"Making request to: {url}")
+    response = await upstream.aget(url, timeout=timeout)
+    response.raise_for_status()
+    return jiosaavn._format_song_details(song_ids, jiosaavn._load_legacy_json(response), media)
+
+
+async def get_songs_by_ids(song_ids, lyrics, timeout=None, media=True):
+    # The cache and catalog lookups are SQLite or Redis round-trips: one
+    # executor call each keeps them off the event loop
+    found, missing = await cache.run_blocking(jiosaavn._cached_songs, song_ids, lyrics, media)
+    if not missing:
+        return found
+
+    known = await _catalog_songs(missing, media)
+    missing = [id for id in missing if id not in known]
+    if missing:
+        cache.note_state('revalidated')
+    chunks = jiosaavn._chunks(missing, jiosaavn.SONG_DETAILS_CHUNK_SIZE)
+    semaphore = asyncio.Semaphore(jiosaavn.SONG_DETAILS_CONCURRENCY)
+
+    async def fetch(chunk):
+        async with semaphore:
+            return await _fetch_song_details(chunk, timeout or jiosaavn._chunk_timeout(chunk), media)
+
+    fetched = {}
+    errors = []
+    not_done = ()
+    if chunks:
+        tasks = {asyncio.ensure_future(fetch(chunk)): chunk for chunk in chunks}
+        done, not_done = await asyncio.wait(tasks, timeout=jiosaavn.SONG_DETAILS_DEADLINE)
+        for task in not_done:
+            task.cancel()
+            logger.warning(f"Song details chunk of {len(tasks[task])} IDs timed out")
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"Song details chunk of {len(tasks[task])} IDs failed: {str(task.exception())}")
+                errors.append(task.exception())
+            else:
+                fetched.update(task.result())
+    if errors and len(errors) == len(chunks):
+        raise errors[0]
+    if errors or not_done:
+        cache.note_failure()
+
+    songs = {**known, **fetched}
+    if lyrics:
+        await fetch_lyrics(list(songs.values()))
+    found.update(songs)
+    await cache.run_blocking(jiosaavn._store_songs, songs, lyrics, media)
+    if media:
+        catalog.add_songs(fetched.values())
+    return found
+
+
+async def get_multiple_songs(song_ids, lyrics, media=True):
+    try:
+        if not song_ids:
+            return {
+                "status": False,
+                "error": "No song IDs provided"
+            }
+
+        logger.info(f"Requesting {len(song_ids)} songs")
+        found = await get_songs_by_ids(song_ids, lyrics, media=media)
+
+        songs_data = []
+        failed_ids = []
+        for song_id in song_ids:
+            if song_id in found:
+                songs_data.append(found[song_id])
+            else:
+                failed_ids.append(song_id)
+
+        result = {
+            "status": True,
+            "songs": songs_data,
+            "total_requested": len(song_ids),
+            "total_found": len(songs_data),
+            "failed_ids": failed_ids
+        }
+
+        if failed_ids:
+            result["message"] = f"Some songs could not be fetched: {failed_ids}"
+
+        return result
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in get_multiple_songs: {str(e)}")
+        return {
+            "status": False,
+            "error": f"Request failed: {str(e)}"
+        }
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in get_multiple_songs: {str(e)}")
+        return {
+            "status": False,
+            "error": f"Invalid response format: {str(e)}"
+        }
+    except Exception as e:
+        logger.error(f"Unexpected error in get_multiple_songs: {str(e)}")
+        return {
+            "status": False,
+            "error": f"An unexpected error occurred: {str(e)}"
+        }
+
+
+async def get_song_id(url):
+    res = await upstream.aget(url, data=[('bitrate', '320')])
+    return jiosaavn._parse_song_id(res.text)
+
+
+@cache.cached('album', key=lambda album_link, lyrics: album_link)
+async def get_album_by_link(album_link, lyrics):
+    try:
+        if not album_link:
+            return {"success": False, "error": "Album link is required"}
+        encoded_link = urllib.parse.quote(album_link, safe='')
+        url = f"{endpoints.album_details_base_url}{encoded_link}"
+        logger.info(f"Making request to: {url}")
+        response = await upstream.aget(url, timeout=20)
+        response.raise_for_status()
+        album = jiosaavn._normalize_album(response.json())
+        catalog.add_album(album)
+        return album
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in get_album_by_link: {str(e)}")
+        return {"success": False, "error": f"Request failed: {str(e)}"}
+    except Exception as e:
+        logger.error(f"Unexpected error in get_album_by_link: {str(e)}")
+        return {"success": False, "error": "An unexpected error occurred"}
+
+
+async def get_album_id(input_url):
+    res = await upstream.aget(input_url)
+    return jiosaavn._parse_album_id(res.text)
+
+
+@cache.cached('playlist', key=jiosaavn._playlist_cache_key)
+async def get_playlist(listId, lyrics, media=True):
+    try:
+        response = await upstream.aget(endpoints.playlist_details_base_url+listId)
+        if response.status_code == 200:
+            songs_json = jiosaavn._load_legacy_json(response)
+            playlist = helper.format_playlist(songs_json, False, media)
+            if lyrics:
+                await fetch_lyrics(playlist['songs'])
+            return playlist
+        return None
+    except Exception:
+        logger.exception("Unexpected error in get_playlist")
+        return None
+
+
+async def get_playlist_id(input_url):
+    res = await upstream.aget(input_url)
+    return jiosaavn._parse_playlist_id(res.text)
+
+
+@cache.cached('lyrics', key=lambda id, timeout=None: id)
+async def get_lyrics(id, timeout=None):
+    url = endpoints.lyrics_base_url+id
+    response = await upstream.aget(url, timeout=timeout)
+    lyrics_text = json.loads(response.text)
+    return lyrics_text['lyrics']
+
+
+async def fetch_lyrics(songs):
+    """Async counterpart of helper.fetch_lyrics with the same limits."""
+    pending = {}
+    for song in songs:
+        song['lyrics'] = None
+        if song.get('has_lyrics') == 'true':
+            pending.setdefault(song['id'], []).append(song)
+    if not pending:
+        return songs
+
+    loop = asyncio.get_running_loop()
+    semaphore = _lyrics_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _lyrics_semaphores[loop] = asyncio.Semaphore(helper.LYRICS_CONCURRENCY)
+
+    failed = []
+
+    async def fetch(song_id):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    get_lyrics(song_id, timeout=helper.LYRICS_TIMEOUT), helper.LYRICS_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Lyrics for {song_id} timed out")
+            except Exception as e:
+                logger.warning(f"Could not fetch lyrics for {song_id}: {str(e)}")
+            failed.append(song_id)
+            return None
+
+    tasks = {asyncio.ensure_future(fetch(song_id)): song_id for song_id in pending}
+    with timing.phase('lyrics'):
+        done, not_done = await asyncio.wait(tasks, timeout=helper.LYRICS_TIMEOUT + helper.LYRICS_DEADLINE_SLACK)
+    for task in not_done:
+        task.cancel()
+        logger.warning(f"Lyrics for {tasks[task]} timed out")
+        failed.append(tasks[task])
+    for task in done:
+        for song in pending[tasks[task]]:
+            song['lyrics'] = task.result()
+    if failed:
+        cache.note_failure()
+    return songs
+
+
+async def _get_normalized(name, url, timeout, normalize, http_status=False):
+    """Fetch a worker/Vercel endpoint and normalize it, with the error
+    handling shared by all of those functions in jiosaavn.py."""
+    try:
+        logger.info(f"Making request to: {url}")
+        response = await upstream.aget(url, timeout=timeout)
+        response.raise_for_status()
+        return normalize(response.json())
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"Request error in {name}: {str(e)}")
+        result = {"success": False, "error": f"Request failed: {str(e)}"}
+        if http_status:
+            result["status"] = getattr(e.response, 'status_code', None)
+        return result
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in {name}: {str(e)}")
+        return {"success": False, "error": f"Request failed: {str(e)}"}
+    except Exception as e:
+        logger.error(f"Unexpected error in {name}: {str(e)}")
+        return {"success": False, "error": "An unexpected error occurred"}
+
+
+@cache.cached('search', key=lambda query: ('global', query))
+async def global_search(query):
+    if not query:
+        return {"success": False, "error": "Query is required"}
+    local = await cache.run_blocking(jiosaavn._local_global_search, query)
+    if local is not None:
+        return local
+    result = await _get_normalized(
+        'global_search', endpoints.global_search_base_url + query, 15,
+        jiosaavn._normalize_global_search)
+    catalog.add_search_results(result)
+    return result
+
+
+# Local lookups only, shared with the sync engine
+autocomplete_needs_upstream = jiosaavn.autocomplete_needs_upstream
+local_autocomplete = jiosaavn.local_autocomplete
+
+
+@cache.cached('autocomplete', key=jiosaavn._autocomplete_key)
+async def autocomplete(query, limit=typeahead.AUTOCOMPLETE_LIMIT):
+    local = await cache.run_blocking(search_index.suggest, query, limit)
+    if len(local) >= limit:
+        return jiosaavn._suggestions(None, local, limit)
+    try:
+        url = endpoints.search_base_url + query
+        logger.info(f"Making request to: {url}")
+        response = await upstream.aget(url, timeout=10)
+        response.raise_for_status()
+        result = jiosaavn._normalize_autocomplete(jiosaavn._load_autocomplete_json(response))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error in autocomplete: {str(e)}")
+        return {"success": False, "error": f"Request failed: {str(e)}"}
+    except Exception as e:
+        logger.error(f"Unexpected error in autocomplete: {str(e)}")
+        return {"success": False, "error": "An unexpected error occurred"}
+    catalog.add_search_results(result)
+    return jiosaavn._suggestions(result, local, limit)
+
+
+@cache.cached('artist', key=lambda artist_id: artist_id)
+async def get_artist_details(artist_id):
+    if not artist_id:
+        return {"success": False, "error": "Artist id is required"}
+    return await _get_normalized(
+        'get_artist_details', endpoints.artist_details_base_url + artist_id, 20,
+        jiosaavn._normalize_artist_details)
+
+
+async def get_song_suggestions(song_id):
+    if not song_id:
+        return {"success": False, "error": "Song id is required"}
+    return await _get_normalized(
+        'get_song_suggestions', f"{endpoints.song_suggestions_base_url}{song_id}/suggestions", 20,
+        jiosaavn._normalize_song_suggestions)
+
+
+async def search_playlists(query):
+    if not query:
+        return {"success": False, "error": "Query is required"}
+    return await _get_normalized(
+        'search_playlists', endpoints.playlist_search_base_url + query, 15,
+        jiosaavn._normalize_search_playlists, http_status=True)
+
+
+async def search_albums(query):
+    if not query:
+        return {"success": False, "error": "Query is required"}
+    return await _get_normalized(
+        'search_albums', endpoints.album_search_base_url + query, 15,
+        jiosaavn._normalize_search_albums, http_status=True)
+
+
+async def search_artists(query):
+    if not query:
+        return {"success": False, "error": "Query is required"}
+    return await _get_normalized(
+        'search_artists', endpoints.artist_search_base_url + query, 15,
+        jiosaavn._normalize_search_artists, http_status=True)
+
+
+def _validate_sort(sort_by, sort_order):
+    valid_sort_by = ["latest", "popularity"]
+    valid_sort_order = ["asc", "desc"]
+    if sort_by not in valid_sort_by:
+        return {"success": False, "error": f"Invalid sortBy. Must be one of: {valid_sort_by}"}
+    if sort_order not in valid_sort_order:
+        return {"success": False, "error": f"Invalid sortOrder. Must be one of: {valid_sort_order}"}
+    return None
+
+
+@cache.cached('artist', key=jiosaavn._artist_list_key('songs'))
+async def get_artist_songs(artist_id, sort_by="latest", sort_order="desc"):
+    if not artist_id:
+        return {"success": False, "error": "Artist ID is required"}
+    error = _validate_sort(sort_by, sort_order)
+    if error:
+        return error
+    result = await _get_normalized(
+        'get_artist_songs',
+        f"{endpoints.artist_songs_base_url}{artist_id}/songs?sortBy={sort_by}&sortOrder={sort_order}", 20,
+        jiosaavn._normalize_artist_songs)
+    catalog.add_artist_songs(artist_id, result)
+    return result
+
+
+@cache.cached('artist', key=jiosaavn._artist_list_key('albums'))
+async def get_artist_albums(artist_id, sort_by="latest", sort_order="desc"):
+    if not artist_id:
+        return {"success": False, "error": "Artist ID is required"}
+    error = _validate_sort(sort_by, sort_order)
+    if error:
+        return error
+    return await _get_normalized(
+        'get_artist_albums',
+        f"{endpoints.artist_albums_base_url}{artist_id}/albums?sortBy={sort_by}&sortOrder={sort_order}", 20,
+        jiosaavn._normalize_artist_albums)
@@ -0,0 +1,421 @@
+"""Prometheus metrics aggregated across worker processes.
+
+Every worker keeps its counters, gauges and histograms in memory and writes a
+snapshot of them to METRICS_DIR/<pid>-<start time>.json every
+METRICS_FLUSH_INTERVAL seconds and on exit. /metrics merges the snapshots of
+all workers:
+- counters and histograms are summed, including those of workers that have
+  exited, so totals never go backwards when gunicorn recycles a worker
+- gauges are summed over the workers that are still running
+Snapshots of exited workers are folded into a single dead.json file so the
+directory does not grow with every recycled worker: by gunicorn's child_exit
+hook (retire()), and otherwise on the next scrape. The start time keeps a
+worker that reuses the pid of an exited one from overwriting its snapshot.
+"""
+import os
+import json
+import time
+import bisect
+import atexit
+import logging
+import tempfile
+import contextlib
+import threading
+import functools
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, nothing is compacted
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() != "false"
+METRICS_DIR = os.environ.get("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "jiosaavn-api-metrics")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CPU_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+HTTP_REQUESTS = "jiosaavn_http_requests_total"
+HTTP_DURATION = "jiosaavn_http_request_duration_seconds"
+HTTP_IN_FLIGHT = "jiosaavn_http_requests_in_flight"
+UPSTREAM_DURATION = "jiosaavn_upstream_request_duration_seconds"
+UPSTREAM_RESPONSES = "jiosaavn_upstream_responses_total"
+UPSTREAM_ERRORS = "jiosaavn_upstream_errors_total"
+UPSTREAM_IN_FLIGHT = "jiosaavn_upstream_requests_in_flight"
+NORMALIZE_CPU = "jiosaavn_normalize_cpu_seconds"
+CACHE_LOOKUPS = "jiosaavn_cache_lookups_total"
+CACHE_EVICTIONS = "jiosaavn_cache_evictions_total"
+CACHE_ENTRIES = "jiosaavn_cache_entries"
+CACHE_HIT_RATIO = "jiosaavn_cache_hit_ratio"
+SINGLEFLIGHT_CALLS = "jiosaavn_singleflight_calls_total"
+
+# name: (type, help, label names, histogram buckets)
+METRICS = {
+    HTTP_REQUESTS: ("counter", "HTTP requests by route, method and status.", ("route", "method", "status"), None),
+    HTTP_DURATION: ("histogram", "HTTP request latency by route.", ("route",), LATENCY_BUCKETS),
+    HTTP_IN_FLIGHT: ("gauge", "HTTP requests being served.", ("route",), None),
+    UPSTREAM_DURATION: ("histogram", "Upstream request latency by host and endpoint.",
+                        ("host", "endpoint"), LATENCY_BUCKETS),
+    UPSTREAM_RESPONSES: ("counter", "Upstream responses by host, endpoint and status code.",
+                         ("host", "endpoint", "status"), None),
+    UPSTREAM_ERRORS: ("counter", "Upstream requests that got no response (timeout, connection, circuit_open).",
+                      ("host", "endpoint", "error"), None),
+    UPSTREAM_IN_FLIGHT: ("gauge", "Upstream requests waiting for a response.", ("host",), None),
+    NORMALIZE_CPU: ("histogram", "CPU time spent normalizing one upstream response.", ("endpoint",), CPU_BUCKETS),
+    CACHE_LOOKUPS: ("counter", "Local cache lookups by result (fresh, stale, miss).", ("cache", "result"), None),
+    CACHE_EVICTIONS: ("counter", "Local cache LRU evictions.", ("cache",), None),
+    CACHE_ENTRIES: ("gauge", "Entries held in the local caches.", ("cache",), None),
+    CACHE_HIT_RATIO: ("gauge", "Share of local cache lookups answered from cache, over all workers.", ("cache",), None),
+    SINGLEFLIGHT_CALLS: ("counter", "Cached lookups that reached singleflight, by outcome (executed, coalesced).",
+                         ("result",), None),
+}
+
+_lock = threading.Lock()
+_values = {}
+_histograms = {}
+_collectors = []
+_pid = None
+_started = None
+_flusher_lock = threading.Lock()
+
+
+def _ensure_worker():
+    """Start from empty metrics and a new flusher thread in every process."""
+    global _pid, _started
+    pid = os.getpid()
+    if _pid == pid:
+        return
+    with _flusher_lock:
+        if _pid == pid:
+            return
+        with _lock:
+            _values.clear()
+            _histograms.clear()
+        _started = time.time_ns()
+        _pid = pid
+        thread = threading.Thread(target=_flush_loop, args=(pid,), name="metrics-flush", daemon=True)
+        thread.start()
+
+
+def inc(name, labels, value=1):
+    """Add to a counter, or to a gauge with a negative value to decrease it."""
+    if not METRICS_ENABLED:
+        return
+    _ensure_worker()
+    key = (name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    if not METRICS_ENABLED:
+        return
+    _ensure_worker()
+    key = (name, labels)
+    index = bisect.bisect_left(METRICS[name][3], value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # one count per bucket plus +Inf, then sum and count
+            histogram = _histograms[key] = [0] * (len(METRICS[name][3]) + 3)
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def cpu_timed(endpoint):
+    """Decorator recording the CPU time of each call in NORMALIZE_CPU.
+    Returns the function unchanged when metrics are disabled."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(NORMALIZE_CPU, (endpoint,), time.thread_time() - start)
+        return wrapper
+    return decorator
+
+
+def request_started(route):
+    """Count an HTTP request as in flight; returns the start time for
+    request_finished."""
+    inc(HTTP_IN_FLIGHT, (route,))
+    return time.perf_counter()
+
+
+def request_finished(route, method, status, start):
+    if not METRICS_ENABLED:
+        return
+    inc(HTTP_IN_FLIGHT, (route,), -1)
+    inc(HTTP_REQUESTS, (route, method, str(status)))
+    observe(HTTP_DURATION, (route,), time.perf_counter() - start)
+
+
+def register_collector(collector):
+    """collector() returns (name, labels, value) samples taken from existing
+    counters (cache and singleflight stats) when a snapshot is made."""
+    _collectors.append(collector)
+
+
+# Snapshots
+
+def snapshot():
+    with _lock:
+        values = dict(_values)
+        histograms = {key: list(counts) for key, counts in _histograms.items()}
+    for collector in _collectors:
+        try:
+            for name, labels, value in collector():
+                values[(name, labels)] = value
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {str(e)}")
+    return {
+        "values": [[name, list(labels), value] for (name, labels), value in values.items()],
+        "histograms": [[name, list(labels), counts] for (name, labels), counts in histograms.items()],
+    }
+
+
+def _write(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _snapshot_name():
+    return f"{_pid}-{_started}.json"
+
+
+def _snapshots():
+    """{pid: [(start time, file name), ...]} of the worker snapshots, oldest
+    first."""
+    found = {}
+    for entry in os.listdir(METRICS_DIR):
+        pid, _, started = entry[:-5].partition("-")
+        if not entry.endswith(".json") or not pid.isdigit() or not started.isdigit():
+            continue
+        found.setdefault(int(pid), []).append((int(started), entry))
+    for entries in found.values():
+        entries.sort()
+    return found
+
+
+def flush():
+    """Write this worker's snapshot to METRICS_DIR."""
+    if not METRICS_ENABLED or _pid != os.getpid():
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write(os.path.join(METRICS_DIR, _snapshot_name()), snapshot())
+    except OSError as e:
+        logger.error(f"Could not write metrics snapshot: {str(e)}")
+
+
+def _flush_loop(pid):
+    while _pid == pid:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+atexit.register(flush)
+
+
+def reset_dir():
+    """Remove the snapshots of a previous run; call once before the workers
+    start (gunicorn's on_starting hook)."""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for entry in os.listdir(METRICS_DIR):
+        if entry.endswith(".json") or entry.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(METRICS_DIR, entry))
+            except OSError:
+                pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _merge(total, data, with_gauges):
+    for name, labels, value in data.get("values", ()):
+        if name not in METRICS or (METRICS[name][0] == "gauge" and not with_gauges):
+            continue
+        key = (name, tuple(labels))
+        total["values"][key] = total["values"].get(key, 0) + value
+    for name, labels, counts in data.get("histograms", ()):
+        if name not in METRICS:
+            continue
+        key = (name, tuple(labels))
+        current = total["histograms"].get(key)
+        if current is None or len(current) != len(counts):
+            total["histograms"][key] = list(counts)
+        else:
+            total["histograms"][key] = [a + b for a, b in zip(current, counts)]
+
+
+def _empty():
+    return {"values": {}, "histograms": {}}
+
+
+def _dump(total):
+    return {
+        "values": [[name, list(labels), value] for (name, labels), value in total["values"].items()],
+        "histograms": [[name, list(labels), counts] for (name, labels), counts in total["histograms"].items()],
+    }
+
+
+def _compact(is_dead):
+    """Fold the snapshots for which is_dead(pid, is newest of the pid) holds
+    into dead.json. Returns (merged dead.json, {file name: snapshot} of the
+    others). Must hold the directory lock."""
+    dead_path = os.path.join(METRICS_DIR, "dead.json")
+    dead = _empty()
+    _merge(dead, _read(dead_path) or {}, False)
+    live = {}
+    compacted = []
+    for pid, entries in _snapshots().items():
+        for started, entry in entries:
+            data = _read(os.path.join(METRICS_DIR, entry))
+            if data is None:
+                continue
+            if is_dead(pid, started == entries[-1][0]):
+                _merge(dead, data, False)
+                compacted.append(entry)
+            else:
+                live[entry] = data
+    if compacted:
+        _write(dead_path, _dump(dead))
+        for entry in compacted:
+            os.remove(os.path.join(METRICS_DIR, entry))
+    return dead, live
+
+
+@contextlib.contextmanager
+def _dir_lock():
+    lock_file = open(os.path.join(METRICS_DIR, "lock"), "a") if fcntl else None
+    try:
+        if lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+    finally:
+        if lock_file:
+            lock_file.close()
+
+
+def retire(pid):
+    """Fold the snapshots of an exited worker into dead.json; called from
+    gunicorn's child_exit hook, once the worker's last snapshot is written."""
+    if not METRICS_ENABLED or not fcntl or not os.path.isdir(METRICS_DIR):
+        return
+    with _dir_lock():
+        _compact(lambda other, newest: other == pid)
+
+
+def collect():
+    """Merged metrics of every worker, this one included."""
+    total = _empty()
+    own = None
+    if METRICS_ENABLED:
+        _ensure_worker()
+        own = snapshot()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    if own is not None:
+        _write(os.path.join(METRICS_DIR, _snapshot_name()), own)
+
+    def is_dead(pid, newest):
+        # Only the newest snapshot of a pid can belong to a running worker.
+        # Without locking nothing is compacted.
+        return fcntl is not None and (not newest or not _alive(pid))
+
+    with _dir_lock():
+        dead, live = _compact(is_dead)
+    for entry, data in live.items():
+        if own is None or entry != _snapshot_name():
+            _merge(total, data, True)
+    _merge(total, _dump(dead), False)
+    if own is not None:
+        _merge(total, own, True)
+    _add_hit_ratios(total)
+    return total
+
+
+def _add_hit_ratios(total):
+    lookups = {}
+    for (name, labels), value in total["values"].items():
+        if name == CACHE_LOOKUPS:
+            counts = lookups.setdefault(labels[0], [0, 0])
+            counts[1] += value
+            if labels[1] != "miss":
+                counts[0] += value
+    for cache_name, (hits, count) in lookups.items():
+        total["values"][(CACHE_HIT_RATIO, (cache_name,))] = round(hits / count, 4) if count else 0.0
+
+
+# Text exposition format
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    total = collect()
+    by_name = {}
+    for (name, labels), value in total["values"].items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), counts in total["histograms"].items():
+        by_name.setdefault(name, []).append((labels, counts))
+
+    lines = []
+    for name, (kind, help, label_names, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name.get(name, ())):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (None,), value):
+                cumulative += count
+                le = 'le="+Inf"' if bound is None else f'le="{bound!r}"'
+                lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(label_names, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
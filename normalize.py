@@ -0,0 +1,279 @@
+"""Declarative normalization of the saavn.dev style responses (Cloudflare
+Worker / Vercel endpoints).
+
+Every endpoint is described by a spec: where its item lists sit in the
+payload and which steps run on each item. compile_spec() turns a spec into
+the source of one plain function and compiles it, so a response is
+normalized in a single pass without copies or a try/except per key.
+
+Steps:
+- ('image',): collapse the image array to the best URL
+- ('search_image',): same, but only URL strings are kept (global search)
+- ('download', key): best downloadUrl entry into `key`
+- ('primary_artist',): artists.primary names into a 'primaryartist' string
+- ('drop', key): remove a key
+- ('rename', src, dst): move src to dst unless dst is already set
+"""
+import metrics
+
+
+IMAGE_QUALITY = {
+    '500x500': 4,
+    '480x480': 3,
+    '320x320': 2,
+    '150x150': 1
+}
+
+
+def best_image(images):
+    """Highest quality entry of a non-empty image list, or the first entry
+    when the list is malformed or the best one has no URL."""
+    try:
+        entries = iter(images)
+        best = next(entries)
+        best_score = IMAGE_QUALITY.get(best.get('quality') or '', 0)
+        for img in entries:
+            score = IMAGE_QUALITY.get(img.get('quality') or '', 0)
+            if score > best_score:
+                best, best_score = img, score
+        if not best.get('url'):
+            return images[0]
+        return best
+    except Exception:
+        return images[0]
+
+
+def best_download_url(downloads):
+    """URL of the highest bitrate downloadUrl entry, by its numeric quality or
+    by the bitrate in the URL. None when the list is missing or malformed."""
+    if not downloads or not isinstance(downloads, list):
+        return None
+    try:
+        best = None
+        best_score = -1
+        for item in downloads:
+            entry = item or {}
+            quality = entry.get('quality') or ''
+            if isinstance(quality, str) and quality.isdigit():
+                try:
+                    score = int(quality)
+                except ValueError:
+                    score = 0
+            else:
+                url = entry.get('url') or ''
+                score = 320 if '320' in url else 160 if '160' in url else 96 if '96' in url else 0
+            if score > best_score:
+                best, best_score = item, score
+        return (best or {}).get('url')
+    except Exception:
+        return None
+
+
+def set_primary_artist(obj):
+    """Replace the artists block with a comma separated 'primaryartist'."""
+    block = obj.pop('artists', None)
+    if not block:
+        return
+    try:
+        names = []
+        for a in block.get('primary') or ():
+            if a:
+                name = a.get('name')
+                if name:
+                    names.append(name)
+        if names:
+            obj['primaryartist'] = ', '.join(names)
+    except Exception:
+        pass
+
+
+STEP_TEMPLATES = {
+    'image': (
+        "images = obj.get('image')",
+        "if images and isinstance(images, list):",
+        "    img = best_image(images)",
+        "    if img:",
+        "        obj['image'] = img.get('url') if isinstance(img, dict) else img",
+    ),
+    'search_image': (
+        "images = obj.get('image')",
+        "if images and isinstance(images, list):",
+        "    img = best_image(images)",
+        "    if img and isinstance(img, dict):",
+        "        obj['image'] = img.get('url')",
+        "    elif img and isinstance(img, str):",
+        "        obj['image'] = img",
+    ),
+    'download': (
+        "url = best_download_url(obj.get('downloadUrl'))",
+        "if url:",
+        "    obj[{0!r}] = url",
+    ),
+    'primary_artist': (
+        "set_primary_artist(obj)",
+    ),
+    'drop': (
+        "obj.pop({0!r}, None)",
+    ),
+    'rename': (
+        "if {0!r} in obj and {1!r} not in obj:",
+        "    obj[{1!r}] = obj.pop({0!r})",
+    ),
+}
+
+# How non-dict list items are turned into dicts before the steps run
+COERCE = {
+    'copy': "dict(obj)",
+    'copy_or_empty': "dict(obj or {})",
+    'dict_or_empty': "dict(obj) if isinstance(obj, dict) else {}",
+}
+
+ALBUM_SONG = (
+    ('image',),
+    ('download', 'media_url'),
+    ('drop', 'downloadUrl'),
+    ('primary_artist',),
+    ('drop', 'album'),
+    ('rename', 'url', 'perma_url'),
+    ('rename', 'name', 'song'),
+    ('rename', 'primaryartist', 'primary_artists'),
+)
+
+ALBUM = (
+    ('image',),
+    ('primary_artist',),
+    ('rename', 'name', 'album'),
+    ('rename', 'primaryartist', 'primary_artists'),
+    ('rename', 'url', 'album_url'),
+)
+
+SPECS = {
+    'album': {
+        'shape': 'payload',
+        'lists': (('songs', None, ALBUM_SONG, 'copy_or_empty'),),
+        'root': ALBUM,
+    },
+    'artist_details': {
+        'shape': 'payload',
+        'lists': (
+            ('topSongs', None, (('image',), ('download', 'downloadUrl'), ('primary_artist',)), 'copy'),
+            ('topAlbums', None, (('image',), ('primary_artist',), ('rename', 'url', 'album_url')), 'copy'),
+            ('similarArtists', None, (('image',),), 'copy'),
+        ),
+        'root': (('drop', 'availableLanguages'), ('image',), ('drop', 'singles')),
+    },
+    'artist_songs': {
+        'shape': 'payload',
+        'lists': (('songs', None, ALBUM_SONG, 'copy_or_empty'),),
+        'root': (),
+    },
+    'artist_albums': {
+        'shape': 'payload',
+        'lists': (('albums', 'results', ALBUM, 'copy_or_empty'),),
+        'root': (('drop', 'results'),),
+    },
+    'song_suggestions': {
+        'shape': 'list',
+        'items': ((('image',), ('primary_artist',), ('download', 'downloadUrl')), 'copy'),
+    },
+    'search_playlists': {
+        'shape': 'results',
+        'items': ((('image',), ('rename', 'url', 'playlist_url')), 'copy'),
+    },
+    'search_albums': {
+        'shape': 'results',
+        'items': ((('primary_artist',), ('image',), ('rename', 'url', 'album_url')), 'copy'),
+    },
+    'search_artists': {
+        'shape': 'results',
+        'items': ((('image',),), 'copy'),
+    },
+    'global_search': {
+        'shape': 'sections',
+        'sections': (
+            ('topQuery', (('search_image',),)),
+            ('songs', (('search_image',),)),
+            ('albums', (('search_image',), ('rename', 'artist', 'primaryArtists'),
+                        ('rename', 'url', 'album_url'))),
+            ('playlists', (('search_image',), ('rename', 'url', 'playlist_url'))),
+            ('artists', (('search_image',),)),
+        ),
+    },
+}
+
+
+def _emit_steps(lines, indent, steps):
+    for step in steps:
+        name, args = step[0], step[1:]
+        for line in STEP_TEMPLATES[name]:
+            lines.append(indent + line.format(*args))
+
+
+def _emit_items(lines, indent, source, target, steps, coerce):
+    """Normalize every item of the list in `source` into the list `target`."""
+    lines.append(f"{indent}{target} = []")
+    lines.append(f"{indent}for obj in {source}:")
+    lines.append(f"{indent}    if type(obj) is not dict:")
+    lines.append(f"{indent}        obj = {COERCE[coerce]}")
+    _emit_steps(lines, indent + "    ", steps)
+    lines.append(f"{indent}    {target}.append(obj)")
+
+
+def _emit_body(lines, spec):
+    shape = spec['shape']
+    if shape == 'payload':
+        lines.append("    payload = data.get('data') or {}")
+        for key, fallback, steps, coerce in spec['lists']:
+            source = f"payload.get({key!r}) or []"
+            if fallback:
+                source = f"payload.get({key!r}) or payload.get({fallback!r}) or []"
+            _emit_items(lines, "    ", f"({source})", "items", steps, coerce)
+            lines.append(f"    payload[{key!r}] = items")
+        lines.append("    obj = payload")
+        _emit_steps(lines, "    ", spec['root'])
+        lines.append("    return {'success': bool(data.get('success', True)), 'data': payload}")
+    elif shape == 'list':
+        _emit_items(lines, "    ", "(data.get('data') or [])", "items", *spec['items'])
+        lines.append("    return {'success': bool(data.get('success', True)), 'data': items}")
+    elif shape == 'results':
+        lines.append("    payload = data.get('data') or {}")
+        _emit_items(lines, "    ", "(payload.get('results') or [])", "items", *spec['items'])
+        lines.append("    return {'success': bool(data.get('success', True)), 'data': {")
+        lines.append("        'total': payload.get('total'), 'start': payload.get('start'), 'results': items}}")
+    elif shape == 'sections':
+        lines.append("    result = {'success': bool(data.get('success', True)), 'data': {}}")
+        lines.append("    payload = data.get('data') or {}")
+        for name, steps in spec['sections']:
+            lines.append(f"    section = payload.get({name!r})")
+            lines.append("    if section:")
+            _emit_items(lines, "        ", "(section.get('results') or [])", "items", steps, 'dict_or_empty')
+            lines.append(f"        result['data'][{name!r}] = {{'results': items, 'position': section.get('position')}}")
+        lines.append("    return result")
+    else:
+        raise ValueError(f"Unknown spec shape: {shape}")
+
+
+def compile_spec(name, spec):
+    """Build the normalizer function for one endpoint spec."""
+    lines = [
+        f"def normalize_{name}(data):",
+        "    if not isinstance(data, dict):",
+        "        return {'success': False, 'error': 'Invalid response'}",
+    ]
+    _emit_body(lines, spec)
+    source = "\n".join(lines) + "\n"
+    namespace = {
+        'best_image': best_image,
+        'best_download_url': best_download_url,
+        'set_primary_artist': set_primary_artist,
+    }
+    exec(compile(source, f"<normalize {name}>", "exec"), namespace)
+    func = namespace[f"normalize_{name}"]
+    func.source = source
+    return func
+
+
+COMPILED = {name: compile_spec(name, spec) for name, spec in SPECS.items()}
+
+# What the API calls: the compiled functions, with their CPU time in /metrics
+NORMALIZERS = {name: metrics.cpu_timed(name)(func) for name, func in COMPILED.items()}
@@ -0,0 +1,65 @@
+"""The fields= parameter: keep only the listed keys of every record.
+
+Records are the songs (or albums, playlists, artists) a response lists: the
+items of a top-level list and of the lists under RECORD_KEYS, at any depth
+of the envelope dicts around them. Everything else in the envelope (status,
+counts, album or playlist details) is kept. Routes that return a single song
+project it with project_record().
+
+Projection happens before serialization, and lookups skip the work whose
+result would be dropped anyway: lyrics are only fetched when 'lyrics' is
+requested and media URLs only decrypted when a media URL is. Projected
+responses are built from new dicts, so cached values are never modified.
+"""
+
+RECORD_KEYS = frozenset(("songs", "results", "data", "topSongs", "topAlbums", "similarArtists", "albums"))
+
+MEDIA_FIELDS = frozenset(("media_url", "media_preview_url"))
+
+
+def parse(value):
+    """The set of requested fields, or None when every field is wanted."""
+    if not value:
+        return None
+    fields = frozenset(name.strip() for name in value.split(",") if name.strip())
+    return fields or None
+
+
+def wants_lyrics(fields, lyrics):
+    return bool(lyrics) and (fields is None or "lyrics" in fields)
+
+
+def wants_media(fields):
+    return fields is None or not fields.isdisjoint(MEDIA_FIELDS)
+
+
+def project_record(record, fields):
+    if fields is None or not isinstance(record, dict):
+        return record
+    return {key: value for key, value in record.items() if key in fields}
+
+
+def _project_list(items, fields):
+    return [project_record(item, fields) for item in items]
+
+
+def _project_envelope(envelope, fields):
+    result = {}
+    for key, value in envelope.items():
+        if key in RECORD_KEYS and isinstance(value, list):
+            value = _project_list(value, fields)
+        elif isinstance(value, dict):
+            value = _project_envelope(value, fields)
+        result[key] = value
+    return result
+
+
+def project(response, fields):
+    """Apply fields to the records of a route's response."""
+    if fields is None:
+        return response
+    if isinstance(response, list):
+        return _project_list(response, fields)
+    if isinstance(response, dict):
+        return _project_envelope(response, fields)
+    return response
@@ -0,0 +1,332 @@
+"""In-memory search index over the catalog (catalog.py).
+
+Every song in the catalog and every item of the global search and
+autocomplete results it kept (songs, albums, playlists, artists) is a
+document. Words of the title, and of the album, artists or description, are
+indexed: /song/ and /search/ queries are answered from the index when it
+covers them, and go upstream otherwise. /autocomplete/ suggestions come from
+it too (suggest()).
+
+- Each word of the query must match; the last one also matches as a prefix
+  while it is being typed (no trailing space).
+- Results are ranked by how many query words are in the title, then by
+  popularity: play count for songs, how often an item was returned by global
+  searches for the others.
+- A query is covered when every section of the response has at least
+  SEARCH_INDEX_COVERAGE times as many matches as it returns: the `limit` songs
+  of /song/, or the GLOBAL_SECTION_SIZE results of each /search/ section.
+  Only then is it answered locally.
+
+The layout is kept small so the index can span the whole catalog:
+- postings are array('I') of doc << 1 | in-title bit, per word
+- prefixes are resolved with bisect over the sorted vocabulary, which does
+  what a trie would without a node object per character
+- document keys, kinds and ranks are parallel arrays; the results themselves
+  are read from the catalog only for the documents returned
+
+Every worker has its own index. It is loaded from the catalog in the
+background when the worker first searches. The worker's catalog writer thread
+adds its own batches right away, and every SEARCH_INDEX_REFRESH_INTERVAL
+seconds the rows other workers added since the last read are picked up.
+Until then the same query can be answered locally in one worker and go
+upstream in another. Documents are indexed once, when first seen, and never
+removed: a renamed title matches its old words until the worker restarts, and
+an item's popularity only counts the searches this worker saw after loading it.
+"""
+import os
+import re
+import time
+import heapq
+import bisect
+import logging
+import threading
+from array import array
+
+import catalog
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.environ.get("SEARCH_INDEX_ENABLED", "true").lower() != "false"
+SEARCH_INDEX_COVERAGE = float(os.environ.get("SEARCH_INDEX_COVERAGE", 2))
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.environ.get("SEARCH_INDEX_REFRESH_INTERVAL", 30))
+
+# Results per section of a global search response
+GLOBAL_SECTION_SIZE = 5
+# Vocabulary words a prefix may expand to
+PREFIX_EXPANSION = 256
+
+# Document kinds: catalog songs for /song/, then the global search items
+TRACK = 0
+KINDS = {kind: code for code, kind in enumerate(catalog.SEARCH_KINDS, 1)}
+SECTIONS = (("songs", "song"), ("albums", "album"), ("playlists", "playlist"), ("artists", "artist"))
+# Item kinds suggested by /autocomplete/
+SUGGESTED = frozenset(KINDS[kind] for kind in ("song", "album", "artist"))
+
+# Anything but whitespace and ASCII punctuation, so every script is kept
+WORD_RE = re.compile(r"[^\s!-/:-@\[-`{-~]+")
+
+
+def words(text):
+    return WORD_RE.findall(text.casefold()) if text else []
+
+
+class Index:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._keys = []
+        self._kinds = bytearray()
+        self._ranks = array("q")
+        self._postings = {}
+        self._vocabulary = []
+        self.ready = False
+        # Last catalog rowids read (read_catalog)
+        self.songs_read = 0
+        self.items_read = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _doc(self, kind, key):
+        """(doc, whether it is new)"""
+        doc = self._docs.get((kind, key))
+        if doc is not None:
+            return doc, False
+        doc = self._docs[(kind, key)] = len(self._keys)
+        self._keys.append(key)
+        self._kinds.append(kind)
+        self._ranks.append(0)
+        return doc, True
+
+    def _index(self, doc, title, other):
+        entries = {}
+        for word in words(other):
+            entries[word] = doc << 1
+        for word in words(title):
+            entries[word] = doc << 1 | 1
+        for word, entry in entries.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                self._postings[word] = array("I", (entry,))
+                if self.ready:
+                    bisect.insort(self._vocabulary, word)
+                else:
+                    # Sorted once when loaded (finish_loading)
+                    self._vocabulary.append(word)
+            else:
+                postings.append(entry)
+
+    def add_song(self, id, title, album, artists, play_count):
+        with self._lock:
+            doc, new = self._doc(TRACK, id)
+            if play_count:
+                self._ranks[doc] = play_count
+            if new:
+                self._index(doc, title, f"{album or ''} {artists or ''}")
+
+    def add_item(self, kind, id, title, subtitle, hits=1, only_new=False):
+        """With only_new, items already indexed keep their rank: catalog rows
+        carry total hits, which this worker has counted as they came in."""
+        code = KINDS.get(kind)
+        if code is None:
+            return
+        with self._lock:
+            doc, new = self._doc(code, id)
+            if new or not only_new:
+                self._ranks[doc] += hits
+            if new:
+                self._index(doc, title, subtitle)
+
+    def read_catalog(self):
+        """Add the catalog rows added since the last read."""
+        songs, items = catalog.get_catalog().index_rows(self.songs_read, self.items_read)
+        for rowid, *row in songs:
+            self.add_song(*row)
+            self.songs_read = rowid
+        for rowid, *row in items:
+            self.add_item(*row, only_new=True)
+            self.items_read = rowid
+
+    def finish_loading(self):
+        with self._lock:
+            self._vocabulary.sort()
+            self.ready = True
+
+    def _matches(self, word, prefix):
+        """{doc: in title} of the documents containing word, or a word it
+        is a prefix of."""
+        if not prefix:
+            postings = [self._postings.get(word, ())]
+        else:
+            start = bisect.bisect_left(self._vocabulary, word)
+            end = bisect.bisect_left(self._vocabulary, word + "\U0010ffff", start,
+                                     min(start + PREFIX_EXPANSION, len(self._vocabulary)))
+            postings = [self._postings[w] for w in self._vocabulary[start:end]]
+        found = {}
+        for entries in postings:
+            for entry in entries:
+                doc = entry >> 1
+                found[doc] = found.get(doc, 0) | entry & 1
+        return found
+
+    def search(self, query, kinds=None, limit=None):
+        """[(kind, key), ...] of the documents matching query, best first,
+        optionally only of the given kinds and only the best `limit`."""
+        terms = words(query)
+        if not terms:
+            return []
+        prefix = not query[-1].isspace()
+        with self._lock:
+            matches = [self._matches(term, prefix and i == len(terms) - 1) for i, term in enumerate(terms)]
+            matches.sort(key=len)
+            scores = dict(matches[0])
+            for found in matches[1:]:
+                scores = {doc: score + found[doc] for doc, score in scores.items() if doc in found}
+                if not scores:
+                    return []
+            if kinds is not None:
+                scores = {doc: score for doc, score in scores.items() if self._kinds[doc] in kinds}
+
+            def order(doc):
+                return -scores[doc], -self._ranks[doc], doc
+
+            ranked = sorted(scores, key=order) if limit is None else heapq.nsmallest(limit, scores, key=order)
+            return [(self._kinds[doc], self._keys[doc]) for doc in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": len(self._keys),
+                "words": len(self._vocabulary),
+                "postings": sum(len(postings) for postings in self._postings.values()),
+            }
+
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+
+def _load(index):
+    try:
+        index.read_catalog()
+        logger.info(f"Search index loaded: {len(index)} documents")
+    except Exception as e:
+        logger.error(f"Could not load the search index: {str(e)}")
+    finally:
+        index.finish_loading()
+    # Rows written by the other workers
+    while SEARCH_INDEX_REFRESH_INTERVAL > 0:
+        time.sleep(SEARCH_INDEX_REFRESH_INTERVAL)
+        try:
+            index.read_catalog()
+        except Exception as e:
+            logger.error(f"Could not refresh the search index: {str(e)}")
+
+
+def _ingest(songs, items):
+    """Catalog listener: index the rows of a written batch."""
+    index = _index
+    if index is None or _index_pid != os.getpid():
+        return
+    for id, title, album, _, artists, *_, play_count in songs:
+        index.add_song(id, title, album, artists, play_count)
+    for kind, id, title, subtitle, _, _ in items:
+        index.add_item(kind, id, title, subtitle)
+
+
+catalog.subscribe(_ingest)
+
+
+def get_index():
+    """This worker's index, loading in the background on first use."""
+    global _index, _index_pid
+    pid = os.getpid()
+    if _index is None or _index_pid != pid:
+        with _index_lock:
+            if _index is None or _index_pid != pid:
+                index = Index()
+                _index, _index_pid = index, pid
+                threading.Thread(target=_load, args=(index,), name="search-index", daemon=True).start()
+    return _index
+
+
+def _by_kind(ranked):
+    results = {}
+    for kind, key in ranked:
+        results.setdefault(kind, []).append(key)
+    return results
+
+
+def _covered(results, kind, size):
+    return len(results.get(kind, ())) >= size * SEARCH_INDEX_COVERAGE
+
+
+def _usable(query):
+    return (SEARCH_INDEX_ENABLED and catalog.CATALOG_ENABLED and query
+            and not (query.startswith('http') and 'saavn.com' in query))
+
+
+def search_songs(query, limit):
+    """[(source, album, song), ...] catalog rows of the best `limit` songs
+    for query, or None when the index does not cover it."""
+    if not _usable(query):
+        return None
+    index = get_index()
+    if not index.ready:
+        return None
+    results = _by_kind(index.search(query))
+    if not _covered(results, TRACK, limit):
+        return None
+    ids = results[TRACK][:limit]
+    songs, _ = catalog.get_catalog().search_results(song_ids=ids)
+    if len(songs) < len(ids):
+        return None
+    return [songs[id] for id in ids]
+
+
+def global_search(query):
+    """(top item, [(section, items), ...]) of a global search for query, or
+    None when the index does not cover it. The top item is the best match of
+    any section."""
+    if not _usable(query):
+        return None
+    index = get_index()
+    if not index.ready:
+        return None
+    ranked = index.search(query)
+    results = _by_kind(ranked)
+    if not all(_covered(results, KINDS[kind], GLOBAL_SECTION_SIZE) for _, kind in SECTIONS):
+        return None
+    keys = [(kind, id) for _, kind in SECTIONS for id in results[KINDS[kind]][:GLOBAL_SECTION_SIZE]]
+    _, items = catalog.get_catalog().search_results(item_keys=keys)
+    if len(items) < len(keys):
+        return None
+    sections = [(section, [items[(kind, id)] for id in results[KINDS[kind]][:GLOBAL_SECTION_SIZE]])
+                for section, kind in SECTIONS]
+    code, id = next((code, id) for code, id in ranked if code != TRACK)
+    top = items[(catalog.SEARCH_KINDS[code - 1], id)]
+    return top, sections
+
+
+def suggest(query, limit):
+    """The best `limit` (or fewer) song, album and artist items for a
+    partial query, from earlier global searches and autocompletes."""
+    if not _usable(query):
+        return []
+    index = get_index()
+    if not index.ready:
+        return []
+    keys = [(catalog.SEARCH_KINDS[code - 1], id) for code, id in index.search(query, SUGGESTED, limit)]
+    if not keys:
+        return []
+    _, items = catalog.get_catalog().search_results(item_keys=keys)
+    return [items[key] for key in keys if key in items]
+
+
+def stats():
+    if not (SEARCH_INDEX_ENABLED and catalog.CATALOG_ENABLED):
+        return {"enabled": False}
+    index = _index if _index_pid == os.getpid() else None
+    return dict(index.stats(), enabled=True) if index is not None else {"enabled": True, "ready": False}
@@ -0,0 +1,469 @@
+import os
+import time
+import json
+import socket
+import secrets
+import sqlite3
+import tempfile
+import threading
+import logging
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+# sqlite:///path/to/file.sqlite3 (one host, all workers), redis://[:password@]host:port/db
+# (any Redis-compatible server, for multi-node setups) or "none" to disable.
+DEFAULT_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "jiosaavn-api-cache.sqlite3")
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", DEFAULT_URL)
+
+# After a backend error the tier is skipped for this many seconds
+ERROR_BACKOFF = float(os.environ.get("SHARED_CACHE_ERROR_BACKOFF", 5))
+
+# Deletes KEYS[1] only while it still holds ARGV[1]
+COMPARE_AND_DELETE = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class Backend:
+    """Interface for shared cache stores. Keys are str, values are bytes."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def add(self, key, value, ttl):
+        """Store only if the key does not exist. Returns True when stored."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_if(self, key, value):
+        """Delete the key only if it holds value."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(Backend):
+    """File-backed store shared by every worker process on one host."""
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    @property
+    def conn(self):
+        # sqlite connections must not cross threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            self.conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def get(self, key):
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl),
+        )
+        self._maybe_purge(now)
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_if(self, key, value):
+        self.conn.execute("DELETE FROM cache WHERE key = ? AND value = ?", (key, value))
+
+
+class RedisBackend(Backend):
+    """Minimal RESP client, so any Redis-compatible server works without
+    an extra dependency. One socket per thread and process."""
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url):
+        parts = urllib.parse.urlsplit(url)
+        db = parts.path.strip("/")
+        return cls(
+            host=parts.hostname or "127.0.0.1",
+            port=parts.port or 6379,
+            db=int(db) if db else 0,
+            password=urllib.parse.unquote(parts.password) if parts.password else None,
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if self.password:
+                self._command("AUTH", self.password)
+            if self.db:
+                self._command("SELECT", str(self.db))
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args):
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b"+":
+            return rest.decode()
+        if prefix == b"-":
+            raise RuntimeError(rest.decode())
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f"Unexpected reply from server: {line!r}")
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        try:
+            sock.sendall(self._encode(args))
+            return self._read_reply(reader)
+        except (OSError, ConnectionError):
+            self._reset()
+            raise
+
+    def get(self, key):
+        return self._command("GET", key)
+
+    def set(self, key, value, ttl):
+        self._command("SET", key, value, "PX", max(int(ttl * 1000), 1))
+
+    def add(self, key, value, ttl):
+        return self._command("SET", key, value, "PX", max(int(ttl * 1000), 1), "NX") == "OK"
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+    def delete_if(self, key, value):
+        self._command("EVAL", COMPARE_AND_DELETE, 1, key, value)
+
+
+def backend_from_url(url):
+    if not url or url.lower() == "none":
+        return None
+    scheme = urllib.parse.urlsplit(url).scheme
+    if scheme == "sqlite":
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else url[len("sqlite://"):]
+        return SQLiteBackend(path or DEFAULT_URL[len("sqlite:///"):])
+    if scheme in ("redis", "tcp"):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unsupported shared cache url: {url}")
+
+
+class SharedCache:
+    """Fault-tolerant wrapper: backend errors are logged and treated as misses."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        # Request threads and executor threads count at the same time
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._disabled_until = 0.0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _available(self):
+        return self.backend is not None and time.monotonic() >= self._disabled_until
+
+    def _failed(self, op, e):
+        self._count("errors")
+        self._disabled_until = time.monotonic() + ERROR_BACKOFF
+        logger.warning(f"Shared cache {op} failed, skipping for {ERROR_BACKOFF}s: {str(e)}")
+
+    def get(self, key):
+        """Return (found, value, remaining_ttl)."""
+        if not self._available():
+            return False, None, 0
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            self._failed("get", e)
+            return False, None, 0
+        if raw is None:
+            self._count("misses")
+            return False, None, 0
+        try:
+            envelope = json.loads(raw)
+        except ValueError:
+            self._count("misses")
+            return False, None, 0
+        remaining = envelope["e"] - time.time()
+        if remaining <= 0:
+            self._count("misses")
+            return False, None, 0
+        self._count("hits")
+        return True, envelope["v"], remaining
+
+    def set(self, key, value, ttl):
+        if not self._available():
+            return
+        try:
+            raw = json.dumps({"e": time.time() + ttl, "v": value}, separators=(",", ":")).encode()
+            self.backend.set(key, raw, ttl)
+        except Exception as e:
+            self._failed("set", e)
+
+    def delete(self, key):
+        if not self._available():
+            return
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            self._failed("delete", e)
+
+    def acquire(self, key, ttl):
+        """Take a short-lived lock. Returns the token to release it with, or
+        None when another holder has it. When the backend is unavailable the
+        caller is allowed to proceed as if it held the lock."""
+        token = f"{os.getpid()}:{secrets.token_hex(8)}".encode()
+        if not self._available():
+            return token
+        try:
+            return token if self.backend.add(key, token, ttl) else None
+        except Exception as e:
+            self._failed("acquire", e)
+            return token
+
+    def release(self, key, token):
+        """Release a lock taken with acquire(). A lock that expired and was
+        taken by another holder is left alone."""
+        if not self._available():
+            return
+        try:
+            self.backend.delete_if(key, token)
+        except Exception as e:
+            self._failed("release", e)
+
+    def locked(self, key):
+        if not self._available():
+            return False
+        try:
+            return self.backend.get(key) is not None
+        except Exception as e:
+            self._failed("locked", e)
+            return False
+
+    def stats(self):
+        with self._lock:
+            hits, misses, errors = self.hits, self.misses, self.errors
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "errors": errors,
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache():
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                try:
+                    backend = backend_from_url(SHARED_CACHE_URL)
+                except Exception as e:
+                    logger.error(f"Shared cache disabled, could not open {SHARED_CACHE_URL}: {str(e)}")
+                    backend = None
+                _shared = SharedCache(backend)
+    return _shared
+
+
+class StandInServer:
+    """Tiny in-memory Redis-compatible server (PING, GET, SET [PX|EX] [NX], DEL,
+    AUTH, SELECT, and EVAL of COMPARE_AND_DELETE) for local development and for exercising RedisBackend
+    without a real Redis installation."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(128)
+        self.address = self._sock.getsockname()
+        self._closed = False
+
+    @property
+    def url(self):
+        return f"redis://{self.address[0]}:{self.address[1]}/0"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def serve_forever(self):
+        while not self._closed:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        self._sock.close()
+
+    def _handle(self, client):
+        reader = client.makefile("rb")
+        try:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int(reader.readline()[1:-2])
+                    args.append(reader.read(length + 2)[:-2])
+                client.sendall(self._dispatch(args))
+        except (OSError, ValueError):
+            pass
+        finally:
+            client.close()
+
+    def _dispatch(self, args):
+        cmd = args[0].upper()
+        now = time.time()
+        with self._lock:
+            if cmd == b"PING":
+                return b"+PONG\r\n"
+            if cmd in (b"AUTH", b"SELECT"):
+                return b"+OK\r\n"
+            if cmd == b"GET":
+                entry = self._data.get(args[1])
+                if entry is None or (entry[1] is not None and entry[1] <= now):
+                    self._data.pop(args[1], None)
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if cmd == b"SET":
+                key, value, expires_at, nx = args[1], args[2], None, False
+                options = [a.upper() for a in args[3:]]
+                for i, opt in enumerate(options):
+                    if opt == b"PX":
+                        expires_at = now + int(options[i + 1]) / 1000
+                    elif opt == b"EX":
+                        expires_at = now + int(options[i + 1])
+                    elif opt == b"NX":
+                        nx = True
+                existing = self._data.get(key)
+                if nx and existing and (existing[1] is None or existing[1] > now):
+                    return b"$-1\r\n"
+                self._data[key] = (value, expires_at)
+                return b"+OK\r\n"
+            if cmd == b"DEL":
+                removed = sum(1 for key in args[1:] if self._data.pop(key, None) is not None)
+                return b":%d\r\n" % removed
+            if cmd == b"EVAL" and args[1] == COMPARE_AND_DELETE.encode():
+                entry = self._data.get(args[3])
+                if entry is None or entry[0] != args[4] or (entry[1] is not None and entry[1] <= now):
+                    return b":0\r\n"
+                del self._data[args[3]]
+                return b":1\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    server = StandInServer(port=int(os.environ.get("PORT", 6379)))
+    print(f"Stand-in shared cache server listening on {server.url}")
+    print(f"Run the API with SHARED_CACHE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Also coalesce across worker processes through a lock in the shared cache
+SHARED_LOCKS = os.environ.get("SINGLEFLIGHT_SHARED", "true").lower() != "false"
+# How long another worker may hold a key before we fetch it ourselves
+LOCK_TTL = float(os.environ.get("SINGLEFLIGHT_LOCK_TTL", 15))
+POLL_INTERVAL = float(os.environ.get("SINGLEFLIGHT_POLL_INTERVAL", 0.05))
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Group:
+    """Collapse concurrent calls for the same key into a single execution.
+    The first caller (the leader) runs the function; everyone arriving while
+    it is in flight waits and receives the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.coalesced_remote = 0
+
+    def do(self, key, fn, peek=None, shared=None):
+        """Run fn() once per in-flight key.
+        - peek: returns (found, value) from a cache other workers fill
+        - shared: SharedCache used to hold a cross-worker lock on the key
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn, peek, shared)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _run(self, key, fn, peek, shared):
+        if not (SHARED_LOCKS and shared is not None and peek is not None):
+            return self._execute(fn)
+        lock_key = f"lock:{key}"
+        token = shared.acquire(lock_key, LOCK_TTL)
+        if token:
+            try:
+                return self._execute(fn)
+            finally:
+                shared.release(lock_key, token)
+        # Another worker is fetching this key: wait for its result to land
+        deadline = time.monotonic() + LOCK_TTL
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            found, value = peek()
+            if found:
+                with self._lock:
+                    self.coalesced_remote += 1
+                return value
+            if not shared.locked(lock_key):
+                break
+        return self._execute(fn)
+
+    def _execute(self, fn):
+        with self._lock:
+            self.executions += 1
+        return fn()
+
+    async def do_async(self, key, fn, peek=None, shared=None):
+        """Coroutine version of do(): fn is an async callable and waiters are
+        other tasks on the same event loop. peek and shared are sync callables
+        and run in the default executor. When the leader is cancelled (say by
+        its own wait_for), its waiters are not: one of them runs fn again."""
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        with self._lock:
+            self.calls += 1
+        while key in calls:
+            future = calls[key]
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled, not us: one of the waiters leads
+
+        future = loop.create_future()
+        calls[key] = future
+        try:
+            value = await self._run_async(loop, key, fn, peek, shared)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            calls.pop(key, None)
+
+    async def _run_async(self, loop, key, fn, peek, shared):
+        if not (SHARED_LOCKS and shared is not None and peek is not None):
+            return await self._execute_async(fn)
+        lock_key = f"lock:{key}"
+        token = await loop.run_in_executor(None, shared.acquire, lock_key, LOCK_TTL)
+        if token:
+            try:
+                return await self._execute_async(fn)
+            finally:
+                await loop.run_in_executor(None, shared.release, lock_key, token)
+        deadline = time.monotonic() + LOCK_TTL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            found, value = await loop.run_in_executor(None, peek)
+            if found:
+                with self._lock:
+                    self.coalesced_remote += 1
+                return value
+            if not await loop.run_in_executor(None, shared.locked, lock_key):
+                break
+        return await self._execute_async(fn)
+
+    async def _execute_async(self, fn):
+        with self._lock:
+            self.executions += 1
+        return await fn()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_remote": self.coalesced_remote,
+                "in_flight": len(self._calls) + sum(len(c) for c in self._async_calls.values()),
+            }
+
+
+_group = Group()
+
+
+def do(key, fn, peek=None, shared=None):
+    return _group.do(key, fn, peek=peek, shared=shared)
+
+
+async def do_async(key, fn, peek=None, shared=None):
+    return await _group.do_async(key, fn, peek=peek, shared=shared)
+
+
+def stats():
+    return _group.stats()
+
+
+def _metric_samples():
+    counts = _group.stats()
+    return [
+        (metrics.SINGLEFLIGHT_CALLS, ("executed",), counts["executions"]),
+        (metrics.SINGLEFLIGHT_CALLS, ("coalesced",), counts["coalesced"]),
+        (metrics.SINGLEFLIGHT_CALLS, ("coalesced_remote",), counts["coalesced_remote"]),
+    ]
+
+
+metrics.register_collector(_metric_samples)
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+# Settings are read at import time: point every backend at the stub and keep
+# the files the API writes out of the shared temp dir, before any module of
+# the API is imported
+stub = StubUpstream().start()
+_scratch = tempfile.mkdtemp(prefix="jiosaavn-api-tests-")
+os.environ.update(JIOSAAVN_BASE_URL=stub.url, WORKER_BASE_URL=stub.url, VERCEL_BASE_URL=stub.url)
+os.environ.setdefault("SHARED_CACHE_URL", "sqlite:///" + os.path.join(_scratch, "cache.sqlite3"))
+os.environ.setdefault("CATALOG_PATH", os.path.join(_scratch, "catalog.sqlite3"))
+os.environ.setdefault("METRICS_DIR", os.path.join(_scratch, "metrics"))
+os.environ.setdefault("UPSTREAM_CASSETTE_MODE", "off")
+
+
+def pytest_unconfigure(config):
+    stub.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_local_cache():
+    """Empty the in-process tier; tests use their own IDs for the shared one."""
+    import cache
+    for entries in cache._caches.values():
+        entries.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def run(coro):
+    """Run a coroutine on a new event loop, closing its upstream session."""
+    import upstream
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await upstream.close_async_session()
+    return asyncio.run(main())
+
+
+async def asgi_get(path, headers=()):
+    """(status, headers, json body) of a GET through the ASGI app."""
+    status, response_headers, body = await asgi_request(path, headers)
+    return status, response_headers, json.loads(body) if body else None
+
+
+async def asgi_request(path, headers=()):
+    """(status, headers, raw body) of a GET through the ASGI app."""
+    import asgi
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers], "client": ("127.0.0.1", 1)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    response_headers = {k.decode().lower(): v.decode() for k, v in start["headers"]}
+    return start["status"], response_headers, body
@@ -0,0 +1,62 @@
+import pytest
+
+import catalog
+
+
+def song(id, **fields):
+    return {"id": id, "song": f"Song {id}", "album": "Album", "primary_artists": "A, B",
+            "primary_artists_id": "a1,b1", **fields}
+
+
+def write(db, songs, now, source=catalog.DETAILS, album_id=None, album=None):
+    db.write([("songs", (songs, source, album_id, album), now)])
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = catalog.Catalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(catalog, "_catalog", db)
+    monkeypatch.setattr(catalog, "_refreshing", set())
+    return db
+
+
+def test_details_rows_are_served_without_lyrics(db):
+    write(db, [song("c1", lyrics="la la")], 1000.0)
+    found = db.songs(["c1", "c2"], now=1001.0)
+    assert list(found) == ["c1"]
+    data, updated_at = found["c1"]
+    assert "lyrics" not in data and data["song"] == "Song c1" and updated_at == 1000.0
+    assert db.conn.execute("SELECT count(*) FROM song_artists WHERE song_id = 'c1'").fetchone() == (2,)
+
+
+def test_other_sources_never_replace_details(db):
+    write(db, [song("c1")], 1000.0)
+    write(db, [song("c1", song="Renamed"), song("c2")], 1001.0, "album", "al1", "Album")
+    found = db.songs(["c1", "c2"], now=1002.0)
+    assert list(found) == ["c1"] and found["c1"][0]["song"] == "Song c1"
+    write(db, [song("c2")], 1003.0)
+    assert set(db.songs(["c1", "c2"], now=1004.0)) == {"c1", "c2"}
+
+
+def test_old_rows_are_not_served(db, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_MAX_AGE", 100)
+    write(db, [song("c1")], 1000.0)
+    assert db.songs(["c1"], now=1099.0)
+    assert not db.songs(["c1"], now=1101.0)
+
+
+def test_due_ids_are_handed_out_once(db, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_REFRESH_AGE", 0)
+    monkeypatch.setattr(catalog, "CATALOG_MAX_AGE", 10 ** 10)
+    write(db, [song("c1")], 1.0)
+    songs, due = catalog.get_songs(["c1"])
+    assert list(songs) == ["c1"] and due == ["c1"]
+    assert catalog.get_songs(["c1"]) == (songs, [])
+    catalog.refreshed(due)
+    assert catalog.get_songs(["c1"])[1] == ["c1"]
+
+
+def test_queued_writes_reach_the_database(db):
+    catalog.add_songs([song("c1"), {"song": "no id"}, None])
+    assert catalog.flush()
+    assert list(db.songs(["c1"])) == ["c1"]
@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import fast_json
+from conftest import ROOT, asgi_request, run
+
+PAYLOAD = {"status": True, "b": [1, 2.5, None, False], "a": {"z": "Tum Hi Ho", "y": "तुम ही हो ©"}}
+
+
+def test_jsonify_shape():
+    assert fast_json.stdlib_dumps(PAYLOAD) == json.dumps(
+        PAYLOAD, sort_keys=True, separators=(",", ":")).encode()
+    assert fast_json.stdlib_dumps(PAYLOAD).isascii()
+
+
+@pytest.mark.skipif(fast_json.orjson is None, reason="orjson is not installed")
+def test_orjson_matches_stdlib():
+    assert json.loads(fast_json.orjson_dumps(PAYLOAD)) == PAYLOAD
+    ascii_only = {"z": [1, {"b": "x", "a": None}], "a": "y"}
+    assert fast_json.orjson_dumps(ascii_only) == fast_json.stdlib_dumps(ascii_only)
+
+
+@pytest.mark.parametrize("value", [{"big": 2 ** 70}, {1: "int key"}, {"s": "\ud800"}])
+def test_values_orjson_rejects_fall_back(value):
+    assert fast_json.dumps(value) == fast_json.stdlib_dumps(value)
+
+
+def test_both_engines_send_the_same_body(client):
+    path = "/song/get-multiple/?ids=fj1,fj2&lyrics=true"
+    assert client.get(path).data == run(asgi_request(path))[2]
+
+
+@pytest.mark.parametrize("setting, encoder", [
+    ("stdlib", "stdlib"),
+    ("auto", "stdlib" if fast_json.orjson is None else "orjson"),
+])
+def test_json_encoder_setting(setting, encoder):
+    # Read at import time, so checked in a fresh interpreter
+    env = dict(os.environ, JSON_ENCODER=setting)
+    output = subprocess.run([sys.executable, "-c", "import fast_json; print(fast_json.ENCODER)"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == encoder
@@ -0,0 +1,40 @@
+import pytest
+
+import helper
+
+
+def legacy_format(string):
+    """helper.format before the single-pass decoder."""
+    return string.encode().decode().replace("&quot;", "'").replace("&amp;", "&").replace("&#039;", "'")
+
+
+@pytest.mark.parametrize("text", [
+    "Tum Hi Ho",
+    "Kesariya (From &quot;Brahmastra&quot;)",
+    "Rock &amp; Roll",
+    "Don&#039;t Stop",
+    "Don&amp;#039;t Stop",
+    "&amp;quot;twice&amp;quot;",
+    "Salim &amp; Sulaiman, Shreya Ghoshal &amp; Sonu Nigam",
+    "A & B; C&D",
+])
+def test_matches_the_old_chained_replace(text):
+    assert helper.format(text) == legacy_format(text)
+
+
+def test_decodes_named_and_numeric_entities():
+    assert helper.format("&copy; 2023 T&#8209;Series &amp; Zee&trade;") == "© 2023 T‑Series & Zee™"
+    assert helper.format("&#x915;&#X93E;&nbsp;&lt;3&gt;") == "का <3>"
+    # Unknown and out of range entities are left as they are
+    assert helper.format("&foo; &#99999999999; &#xZZ;") == "&foo; &#99999999999; &#xZZ;"
+
+
+def test_text_without_entities_is_returned_as_is():
+    text = "Channa Mereya " * 10
+    assert helper.format(text) is text
+
+
+def test_format_fields():
+    song = {"song": "Don&#039;t", "album": "Plain", "singers": "A &amp; B", "other": "&amp;"}
+    helper.format_fields(song, ("song", "album", "singers"))
+    assert song == {"song": "Don't", "album": "Plain", "singers": "A & B", "other": "&amp;"}
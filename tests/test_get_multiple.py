@@ -0,0 +1,71 @@
+import time
+import asyncio
+import threading
+
+import cache
+import catalog
+import jiosaavn
+import jiosaavn_async
+from conftest import asgi_get, run
+
+
+def test_x_cache_for_multiple_songs(client):
+    url = "/song/get-multiple/?ids=gm1,gm2"
+    assert client.get(url).headers["X-Cache"] == "revalidated"
+    assert client.get("/song/get-multiple/?ids=gm1,gm2,gm1").headers["X-Cache"] == "fresh"
+
+    url = "/song/get-multiple/?ids=agm1,agm2"
+    _, headers, _ = run(asgi_get(url))
+    assert headers["x-cache"] == "revalidated"
+    _, headers, body = run(asgi_get("/song/get-multiple/?ids=agm1,agm2,agm1"))
+    assert headers["x-cache"] == "fresh"
+    assert [song["id"] for song in body["songs"]] == ["agm1", "agm2", "agm1"]
+
+
+def test_async_lookups_stay_off_the_event_loop(monkeypatch):
+    loop_thread = threading.current_thread()
+    blocking = []
+
+    def watch(func):
+        def wrapper(*args, **kwargs):
+            if threading.current_thread() is loop_thread:
+                blocking.append(func.__name__)
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(cache, "lookup", watch(cache.lookup))
+    monkeypatch.setattr(cache, "store", watch(cache.store))
+    monkeypatch.setattr(catalog, "get_songs", watch(catalog.get_songs))
+    ids = [f"loop{i}" for i in range(120)]
+    found = run(jiosaavn_async.get_songs_by_ids(ids, False))
+    assert sorted(found) == sorted(ids)
+    assert blocking == []
+
+
+def test_chunks_share_one_deadline(client, monkeypatch):
+    monkeypatch.setattr(jiosaavn, "SONG_DETAILS_CHUNK_SIZE", 2)
+    monkeypatch.setattr(jiosaavn, "SONG_DETAILS_DEADLINE", 0.3)
+    fetch, afetch = jiosaavn._fetch_song_details, jiosaavn_async._fetch_song_details
+
+    def slow(song_ids, timeout, media=True):
+        if "slow" in song_ids[0]:
+            time.sleep(1)
+        return fetch(song_ids, timeout, media)
+
+    async def aslow(song_ids, timeout, media=True):
+        if "slow" in song_ids[0]:
+            await asyncio.sleep(1)
+        return await afetch(song_ids, timeout, media)
+    monkeypatch.setattr(jiosaavn, "_fetch_song_details", slow)
+    monkeypatch.setattr(jiosaavn_async, "_fetch_song_details", aslow)
+
+    def flask_get(url):
+        return client.get(url).get_json()
+
+    for get, prefix in ((flask_get, "dl"), (lambda url: run(asgi_get(url))[2], "adl")):
+        ids = [f"{prefix}{i}" for i in range(6)] + [f"{prefix}slow{i}" for i in range(2)]
+        started = time.monotonic()
+        body = get(f"/song/get-multiple/?ids={','.join(ids)}")
+        assert time.monotonic() - started < 0.8
+        assert [song["id"] for song in body["songs"]] == ids[:6]
+        assert body["failed_ids"] == ids[6:]
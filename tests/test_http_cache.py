@@ -0,0 +1,74 @@
+import gzip
+import json
+
+import pytest
+
+import http_cache
+from conftest import asgi_request, run, stub
+
+
+def flask_get(client):
+    def get(path, headers=()):
+        response = client.get(path, headers=list(headers))
+        return response.status_code, {k.lower(): v for k, v in response.headers.items()}, response.data
+    return get
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def get(request, client):
+    if request.param == "flask":
+        return flask_get(client)
+    return lambda path, headers=(): run(asgi_request(path, headers))
+
+
+def test_conditional_get(get):
+    path = f"/playlist/?query={stub.url}/featured/saavn-etag/etagpl1"
+    status, headers, body = get(path)
+    assert status == 200 and json.loads(body)["songs"]
+    tag = headers["etag"]
+    assert headers["cache-control"].startswith("public, max-age=")
+
+    status, headers, body = get(path, [("If-None-Match", tag)])
+    assert (status, body) == (304, b"")
+    assert headers["etag"] == tag and "cache-control" in headers
+
+    assert get(path, [("If-None-Match", f"W/{tag}")])[0] == 304
+    assert get(path, [("If-None-Match", f'"other", {tag}')])[0] == 304
+    assert get(path, [("If-None-Match", '"other"')])[0] == 200
+
+
+def test_conditional_get_of_compressed_variant(get):
+    path = f"/playlist/?query={stub.url}/featured/saavn-etag/etagpl2"
+    plain_tag = get(path)[1]["etag"]
+    status, headers, body = get(path, [("Accept-Encoding", "gzip")])
+    assert status == 200 and headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body))["songs"]
+    gzip_tag = headers["etag"]
+    assert gzip_tag != plain_tag
+    assert get(path, [("Accept-Encoding", "gzip"), ("If-None-Match", gzip_tag)])[0] == 304
+    assert get(path, [("Accept-Encoding", "gzip"), ("If-None-Match", plain_tag)])[0] == 200
+
+
+def test_text_search_gets_the_search_ttl(get):
+    # Built from cached songs, but the hits themselves are a live search
+    for _ in range(2):
+        status, headers, body = get("/result/?query=ttl%20search")
+        assert status == 200 and json.loads(body)
+        directive, _, max_age = headers["cache-control"].partition(", max-age=")
+        assert directive == "public" and 110 < int(max_age) <= 120
+
+
+def test_cache_control_of_uncached_responses(get):
+    # Errors read no cached data: clients revalidate them every time
+    assert get("/song/get/?id=")[1]["cache-control"] == "no-cache"
+    assert get("/stats/")[1]["cache-control"] == "no-store"
+
+
+def test_not_modified():
+    assert http_cache.not_modified("*", "abc")
+    assert http_cache.not_modified('"abc"', "abc")
+    assert http_cache.not_modified('W/"abc"', "abc")
+    assert http_cache.not_modified('"x", "abc"', "abc")
+    assert not http_cache.not_modified('"abcd"', "abc")
+    assert not http_cache.not_modified("", "abc")
+    assert not http_cache.not_modified(None, "abc")
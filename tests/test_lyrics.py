@@ -0,0 +1,97 @@
+import time
+import asyncio
+
+import requests
+
+import helper
+import jiosaavn
+import jiosaavn_async
+from conftest import asgi_get, run
+
+
+def _timeout(id, timeout=None):
+    raise requests.exceptions.Timeout(f"lyrics of {id} timed out")
+
+
+async def _atimeout(id, timeout=None):
+    _timeout(id)
+
+
+def test_failed_lyrics_are_not_cached_for_multiple_songs(client, monkeypatch):
+    url = "/song/get-multiple/?ids=lyr1,lyr2&lyrics=true"
+    with monkeypatch.context() as m:
+        m.setattr(jiosaavn, "get_lyrics", _timeout)
+        response = client.get(url)
+        assert [song["lyrics"] for song in response.get_json()["songs"]] == [None, None]
+        assert "public" not in response.headers.get("Cache-Control", "")
+    response = client.get(url)
+    assert [song["lyrics"] for song in response.get_json()["songs"]] == [
+        "Lyrics of lyr1<br>second line", "Lyrics of lyr2<br>second line"]
+
+
+def test_failed_lyrics_are_not_cached_for_playlists(monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(jiosaavn, "get_lyrics", _timeout)
+        playlist = jiosaavn.get_playlist("lyrpl1", True)
+        assert all(song["lyrics"] is None for song in playlist["songs"])
+    playlist = jiosaavn.get_playlist("lyrpl1", True)
+    assert all(song["lyrics"] for song in playlist["songs"])
+
+
+def test_failed_lyrics_are_not_cached_async(monkeypatch):
+    url = "/song/get-multiple/?ids=alyr1,alyr2&lyrics=true"
+    with monkeypatch.context() as m:
+        m.setattr(jiosaavn_async, "get_lyrics", _atimeout)
+        _, headers, body = run(asgi_get(url))
+        assert [song["lyrics"] for song in body["songs"]] == [None, None]
+        assert "public" not in headers.get("cache-control", "")
+        playlist = run(jiosaavn_async.get_playlist("alyrpl1", True))
+        assert all(song["lyrics"] is None for song in playlist["songs"])
+    _, _, body = run(asgi_get(url))
+    assert all(song["lyrics"] for song in body["songs"])
+    playlist = run(jiosaavn_async.get_playlist("alyrpl1", True))
+    assert all(song["lyrics"] for song in playlist["songs"])
+
+
+def test_failed_lyrics_of_a_single_song_on_both_engines(client, monkeypatch):
+    """Both engines return the song with lyrics None, uncached."""
+    def flask_get(url):
+        response = client.get(url)
+        return {k.lower(): v for k, v in response.headers.items()}, response.get_json()
+
+    def asgi(url):
+        _, headers, body = run(asgi_get(url))
+        return headers, body
+
+    for get, song_id in ((flask_get, "lyrs1"), (asgi, "alyrs1")):
+        url = f"/song/get/?id={song_id}&lyrics=true"
+        with monkeypatch.context() as m:
+            m.setattr(jiosaavn, "get_lyrics", _timeout)
+            m.setattr(jiosaavn_async, "get_lyrics", _atimeout)
+            headers, body = get(url)
+            assert body["id"] == song_id and body["lyrics"] is None
+            assert "public" not in headers["cache-control"]
+        assert get(url)[1]["lyrics"] == f"Lyrics of {song_id}<br>second line"
+
+
+def test_lyrics_of_a_long_playlist_share_one_deadline(monkeypatch):
+    monkeypatch.setattr(helper, "LYRICS_TIMEOUT", 0.1)
+    monkeypatch.setattr(helper, "LYRICS_DEADLINE_SLACK", 0.05)
+
+    def slow(id, timeout=None):
+        time.sleep(0.08)
+        return f"Lyrics of {id}"
+
+    async def aslow(id, timeout=None):
+        await asyncio.sleep(0.08)
+        return f"Lyrics of {id}"
+    monkeypatch.setattr(jiosaavn, "get_lyrics", slow)
+    monkeypatch.setattr(jiosaavn_async, "get_lyrics", aslow)
+
+    # 40 songs 8 at a time take 0.4 s: past the deadline, whatever the count
+    for fetch_lyrics in (helper.fetch_lyrics, lambda songs: run(jiosaavn_async.fetch_lyrics(songs))):
+        songs = [{"id": f"long{i}", "has_lyrics": "true"} for i in range(40)]
+        started = time.monotonic()
+        fetch_lyrics(songs)
+        assert time.monotonic() - started < 0.3
+        assert songs[0]["lyrics"] == "Lyrics of long0" and songs[-1]["lyrics"] is None
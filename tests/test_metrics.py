@@ -0,0 +1,51 @@
+import os
+import json
+
+import pytest
+
+import metrics
+
+LABELS = ["http://metrics.test", "page", "200"]
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write_snapshot(directory, pid, started, count, in_flight=0):
+    snapshot = {"values": [[metrics.UPSTREAM_RESPONSES, LABELS, count],
+                           [metrics.UPSTREAM_IN_FLIGHT, LABELS[:1], in_flight]], "histograms": []}
+    (directory / f"{pid}-{started}.json").write_text(json.dumps(snapshot))
+
+
+def responses(total):
+    return total["values"].get((metrics.UPSTREAM_RESPONSES, tuple(LABELS)), 0)
+
+
+def in_flight(total):
+    return total["values"].get((metrics.UPSTREAM_IN_FLIGHT, tuple(LABELS[:1])), 0)
+
+
+def test_snapshot_of_a_reused_pid_is_kept(metrics_dir):
+    # A worker exited, and a new one got its pid before the next scrape
+    pid = os.getppid()
+    write_snapshot(metrics_dir, pid, 1, 5, in_flight=2)
+    write_snapshot(metrics_dir, pid, 2, 3, in_flight=1)
+    total = metrics.collect()
+    assert responses(total) == 8
+    assert in_flight(total) == 1
+    assert set(os.listdir(metrics_dir)) == {"dead.json", "lock", f"{os.getpid()}-{metrics._started}.json",
+                                            f"{pid}-2.json"}
+    assert responses(metrics.collect()) == 8
+
+
+def test_retire_folds_the_snapshots_of_an_exited_worker(metrics_dir):
+    pid = os.getppid()
+    write_snapshot(metrics_dir, pid, 1, 4, in_flight=3)
+    metrics.retire(pid)
+    assert not (metrics_dir / f"{pid}-1.json").exists()
+    total = metrics.collect()
+    assert responses(total) == 4
+    assert in_flight(total) == 0
@@ -0,0 +1,68 @@
+import os
+import json
+
+import pytest
+
+import normalize
+import legacy_normalize
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+        return json.loads(f.read())
+
+
+def transform(obj, fn):
+    obj = fn(obj)
+    if isinstance(obj, dict):
+        return {key: transform(value, fn) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [transform(item, fn) for item in obj]
+    return obj
+
+
+def no_images(obj):
+    if isinstance(obj, dict):
+        return {key: [] if key in ("image", "downloadUrl") else value for key, value in obj.items()}
+    return obj
+
+
+def one_item_lists(obj):
+    return obj[:1] if isinstance(obj, list) else obj
+
+
+def null_strings(obj):
+    return None if isinstance(obj, str) and obj and obj[0] in "0123456789" else obj
+
+
+def first_keys_dropped(obj):
+    return {key: value for i, (key, value) in enumerate(obj.items()) if i % 3} if isinstance(obj, dict) else obj
+
+
+VARIANTS = {
+    "fixture": lambda payload: payload,
+    "no images": lambda payload: transform(payload, no_images),
+    "one item lists": lambda payload: transform(payload, one_item_lists),
+    "numbers as null": lambda payload: transform(payload, null_strings),
+    "keys dropped": lambda payload: transform(payload, first_keys_dropped),
+    "empty": lambda payload: {},
+    "failure": lambda payload: {"success": False, "message": "not found"},
+}
+
+
+def outcome(fn, payload):
+    try:
+        return fn(payload)
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+@pytest.mark.parametrize("name", sorted(normalize.SPECS))
+def test_compiled_matches_legacy(name, variant):
+    legacy = getattr(legacy_normalize, f"_normalize_{name}")
+    make = VARIANTS[variant]
+    expected = outcome(legacy, make(fixture(name)))
+    assert outcome(normalize.COMPILED[name], make(fixture(name))) == expected
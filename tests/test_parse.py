@@ -0,0 +1,59 @@
+import json
+
+import pytest
+import requests
+
+import jiosaavn
+
+
+def response(content):
+    r = requests.models.Response()
+    r._content = content
+    r.encoding = "utf-8"
+    return r
+
+
+def legacy_parse(r, repair_from_titles=False):
+    """What the responses were parsed with before _parse_payload."""
+    text = r.text.encode().decode('unicode-escape')
+    if repair_from_titles:
+        text = jiosaavn.FROM_TITLE_PATTERN.sub(r"(From '\1')", text)
+    return json.loads(text)
+
+
+SONG = {
+    "id": "s1", "song": "Kesariya (From &quot;Brahmastra&quot;)", "album": "Brahmastra",
+    "primary_artists": "Arijit Singh", "image": "https://c.saavncdn.com/871/Kesariya-Hindi-2022-150x150.jpg",
+    "encrypted_media_url": "ID2ieOjCrwfgWvL5sXl4B1ImC5QfbsDyMYTrDf4xR/B3mBHlWu2O9vTVbldtVP+ELz7C1wjw9Zr9NrOG3rEYW",
+    "has_lyrics": "true", "320kbps": "true", "duration": "268",
+}
+
+PAYLOADS = [
+    json.dumps({"s1": SONG, "s2": dict(SONG, id="s2")}).encode(),
+    # Unicode escapes, including non-Latin scripts
+    json.dumps({"title": "Tum Hi Ho – तुम ही हो", "n": 1, "ok": True, "x": None}).encode(),
+    # Strings escaped twice upstream
+    b'{"path": "a\\\\/b", "nl": "one\\\\ntwo", "amp": "R\\\\u0026B"}',
+    b'{"list": ["\\\\u00e9t\\u00e9", {"k\\\\u00e9y": "v"}], "plain": "abc"}',
+    # Raw UTF-8 and escaped backslashes take the old path
+    '{"title": "été"}'.encode(),
+    b'{"title": "back\\\\\\\\slash"}',
+]
+
+
+@pytest.mark.parametrize("content", PAYLOADS)
+def test_parse_matches_legacy(content):
+    assert jiosaavn._load_legacy_json(response(content)) == legacy_parse(response(content))
+
+
+AUTOCOMPLETE = [
+    b'{"songs": {"data": [{"title": "Naatu Naatu (From \\"RRR\\")", "id": "1"}]}}',
+    b'{"songs": {"data": [{"title": "Jhoome Jo Pathaan (From \\"Pathaan\\")", '
+    b'"more_info": {"album": "Pathaan (From \\"Pathaan\\")"}}]}, "albums": {"data": []}}',
+    json.dumps({"songs": {"data": [{"title": "Kesariya – From Brahmastra"}]}}).encode(),
+]
+
+
+@pytest.mark.parametrize("content", AUTOCOMPLETE)
+def test_autocomplete_parse_matches_legacy(content):
+    assert jiosaavn._load_autocomplete_json(response(content)) == legacy_parse(response(content), True)
@@ -0,0 +1,54 @@
+import copy
+
+import pytest
+
+import helper
+import jiosaavn
+import jiosaavn_async
+import projection
+from conftest import asgi_get, run
+
+
+def test_project_keeps_the_envelope():
+    response = {"status": True, "total_found": 2,
+                "songs": [{"id": "1", "song": "a", "album": "x"}, {"id": "2", "song": "b"}],
+                "data": {"results": [{"id": "3", "name": "c"}], "total": 1}}
+    original = copy.deepcopy(response)
+    fields = projection.parse("id, song,")
+    assert fields == {"id", "song"}
+    assert projection.project(response, fields) == {
+        "status": True, "total_found": 2,
+        "songs": [{"id": "1", "song": "a"}, {"id": "2", "song": "b"}],
+        "data": {"results": [{"id": "3"}], "total": 1}}
+    assert response == original
+    assert projection.project(response, projection.parse("")) is response
+
+
+def test_wants():
+    assert not projection.wants_lyrics({"id"}, True)
+    assert projection.wants_lyrics({"id", "lyrics"}, True)
+    assert not projection.wants_lyrics(None, False)
+    assert projection.wants_media(None) and projection.wants_media({"media_url"})
+    assert not projection.wants_media({"id", "song"})
+
+
+@pytest.fixture
+def no_lyrics_or_media(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("not requested")
+
+    async def afail(*args, **kwargs):
+        fail()
+    monkeypatch.setattr(jiosaavn, "get_lyrics", fail)
+    monkeypatch.setattr(jiosaavn_async, "get_lyrics", afail)
+    monkeypatch.setattr(helper, "decrypt_url", fail)
+    monkeypatch.setattr(helper, "decrypt_urls", fail)
+
+
+def test_fields_skip_lyrics_and_media(client, no_lyrics_or_media):
+    url = "/song/get-multiple/?ids=pj1,pj2&lyrics=true&fields=id,song"
+    body = client.get(url).get_json()
+    assert [song["id"] for song in body["songs"]] == ["pj1", "pj2"]
+    assert [sorted(song) for song in body["songs"]] == [["id", "song"], ["id", "song"]]
+    _, _, async_body = run(asgi_get(url.replace("pj", "apj")))
+    assert [sorted(song) for song in async_body["songs"]] == [["id", "song"], ["id", "song"]]
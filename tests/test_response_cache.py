@@ -0,0 +1,53 @@
+import gzip
+import json
+
+import pytest
+
+import http_cache
+import jiosaavn
+import jiosaavn_async
+from conftest import asgi_request, run, stub
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def get(request, client):
+    if request.param == "flask":
+        def flask_get(path, headers=()):
+            response = client.get(path, headers=list(headers))
+            return {k.lower(): v for k, v in response.headers.items()}, response.data
+        return flask_get, "flask"
+    return lambda path, headers=(): run(asgi_request(path, headers))[1:], "asgi"
+
+
+def test_repeats_are_served_serialized_and_compressed_once(get, monkeypatch):
+    get, engine = get
+    path = f"/playlist/?query={stub.url}/featured/saavn-rc/rc{engine}"
+    headers, body = get(path)
+    assert json.loads(body)["songs"] and headers["vary"] == "Accept-Encoding"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the route ran again")
+
+    async def afail(*args, **kwargs):
+        fail()
+    monkeypatch.setattr(jiosaavn, "get_playlist", fail)
+    monkeypatch.setattr(jiosaavn_async, "get_playlist", afail)
+    compressed = []
+    compress = http_cache.compress
+    monkeypatch.setattr(http_cache, "compress", lambda data, encoding: compressed.append(encoding) or compress(data, encoding))
+
+    assert get(path)[1] == body
+    for _ in range(2):
+        headers, gzipped = get(path, [("Accept-Encoding", "gzip")])
+        assert headers["content-encoding"] == "gzip"
+        assert gzip.decompress(gzipped) == body
+    assert compressed == ["gzip"]
+    assert len(gzipped) * 3 < len(body)
+
+
+def test_small_bodies_are_not_compressed(get):
+    get, engine = get
+    headers, body = get(f"/song/get/?id=rcsmall{engine}&fields=id", [("Accept-Encoding", "gzip")])
+    assert len(body) < http_cache.COMPRESS_MIN_SIZE
+    assert "content-encoding" not in headers and "vary" not in headers
+    assert json.loads(body) == {"id": f"rcsmall{engine}"}
@@ -0,0 +1,71 @@
+import catalog
+import search_index
+
+
+def build(docs, ready):
+    index = search_index.Index()
+    index.ready = ready
+    for id, title, album, artists, plays in docs:
+        index.add_song(id, title, album, artists, plays)
+    if not ready:
+        index.finish_loading()
+    return index
+
+
+DOCS = [
+    ("s1", "Tum Hi Ho", "Aashiqui 2", "Arijit Singh", 900),
+    ("s2", "Tum Se Hi", "Jab We Met", "Mohit Chauhan", 500),
+    ("s3", "Channa Mereya", "Ae Dil Hai Mushkil", "Arijit Singh", 700),
+    ("s4", "Tujhe Kitna Chahne Lage", "Kabir Singh", "Arijit Singh", 800),
+]
+
+
+def test_bulk_load_matches_incremental_adds():
+    loaded = build(DOCS, ready=False)
+    incremental = build(DOCS, ready=True)
+    assert loaded._vocabulary == sorted(loaded._vocabulary)
+    assert loaded._vocabulary == incremental._vocabulary
+    for query in ("tum", "tum ", "arijit", "ar", "singh tu", "hi ho", "zz"):
+        assert loaded.search(query) == incremental.search(query)
+
+
+def test_words_added_after_loading_stay_sorted():
+    index = build(DOCS[:2], ready=False)
+    index.add_song("s5", "Zara Zara", "Rehnaa Hai Terre Dil Mein", "Bombay Jayashri", 10)
+    assert index._vocabulary == sorted(index._vocabulary)
+    assert index.search("zar") == [(search_index.TRACK, "s5")]
+
+
+def test_ranking():
+    index = build(DOCS, ready=False)
+    # Title matches first, then by play count
+    assert [key for _, key in index.search("arijit")] == ["s1", "s4", "s3"]
+    assert [key for _, key in index.search("tum")] == ["s1", "s2"]
+    assert [key for _, key in index.search("tum", limit=1)] == ["s1"]
+    assert index.search("tum ") == index.search("tum")
+    assert index.search("tu ") == []
+
+
+def song(id, title, album, artists, plays):
+    return {"id": id, "song": title, "album": album, "primary_artists": artists, "play_count": plays}
+
+
+def test_rows_of_other_workers_are_read_from_the_catalog(tmp_path, monkeypatch):
+    db = catalog.Catalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(catalog, "_catalog", db)
+    item = {"type": "album", "id": "al1", "title": "Aashiqui 2"}
+    db.write([("songs", ([song(*doc) for doc in DOCS[:2]], catalog.DETAILS, None, None), 1.0),
+              ("search_items", ([item, item],), 1.0)])
+    index = search_index.Index()
+    index.read_catalog()
+    index.finish_loading()
+    # Written by this worker: indexed by _ingest, its hit counted once
+    index.add_item("album", "al2", "Aashiqui", "", 1)
+    db.write([("songs", ([song(*DOCS[2])], catalog.DETAILS, None, None), 2.0),
+              ("search_items", ([dict(item, id="al2", title="Aashiqui")],), 2.0)])
+    assert index.search("channa") == []
+    index.read_catalog()
+    assert index.search("channa") == [(search_index.TRACK, "s3")]
+    album = search_index.KINDS["album"]
+    assert index.search("aashiqui", {album}) == [(album, "al1"), (album, "al2")]
+    assert [index._ranks[index._docs[(album, id)]] for id in ("al1", "al2")] == [2, 1]
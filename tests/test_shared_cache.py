@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+import shared_cache
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared(request, tmp_path):
+    if request.param == "sqlite":
+        yield shared_cache.SharedCache(shared_cache.SQLiteBackend(str(tmp_path / "cache.sqlite3")))
+        return
+    server = shared_cache.StandInServer().start()
+    yield shared_cache.SharedCache(shared_cache.RedisBackend.from_url(server.url))
+    server.close()
+
+
+def test_lock_is_exclusive(shared):
+    token = shared.acquire("lock:a", 5)
+    assert token
+    assert shared.acquire("lock:a", 5) is None
+    shared.release("lock:a", token)
+    assert shared.acquire("lock:a", 5)
+
+
+def test_expired_holder_does_not_release_the_next_holder(shared):
+    first = shared.acquire("lock:b", 0.05)
+    time.sleep(0.1)
+    second = shared.acquire("lock:b", 5)
+    assert second and second != first
+    shared.release("lock:b", first)
+    assert shared.locked("lock:b")
+    assert shared.acquire("lock:b", 5) is None
+    shared.release("lock:b", second)
+    assert not shared.locked("lock:b")
@@ -0,0 +1,42 @@
+import asyncio
+
+import singleflight
+
+
+def test_cancelled_leader_does_not_cancel_its_waiters():
+    group = singleflight.Group()
+    started = []
+
+    async def fetch():
+        started.append(1)
+        await asyncio.sleep(0.2)
+        return "value"
+
+    async def main():
+        leader = asyncio.ensure_future(asyncio.wait_for(group.do_async("k", fetch), 0.05))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.do_async("k", fetch))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(main())
+    assert isinstance(leader, asyncio.TimeoutError)
+    assert follower == "value"
+    assert len(started) == 2 and group.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_leaves_the_leader_running():
+    group = singleflight.Group()
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return "value"
+
+    async def main():
+        leader = asyncio.ensure_future(group.do_async("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(asyncio.wait_for(group.do_async("k", fetch), 0.02))
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    leader, waiter = asyncio.run(main())
+    assert leader == "value" and isinstance(waiter, asyncio.TimeoutError)
+    assert group.stats()["executions"] == 1
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import cache
+import http_cache
+from conftest import asgi_request, run, stub
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def get(request, client, monkeypatch):
+    """Async GET through one engine, without the response cache in front,
+    with search results fresh for 0.3 s and served stale for a minute after."""
+    monkeypatch.setattr(http_cache, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setitem(cache._caches, "search", cache.TTLCache("search", 0.3, 100, stale_ttl=60))
+    if request.param == "flask":
+        async def flask_get(path):
+            response = client.get(path)
+            return {k.lower(): v for k, v in response.headers.items()}
+        return flask_get, "flask"
+
+    async def asgi_get(path):
+        return (await asgi_request(path))[1]
+    return asgi_get, "asgi"
+
+
+def test_stale_entry_is_served_then_refreshed(get):
+    get, engine = get
+    path = f"/song/?query=swr%20{engine}&limit=3"
+    search = cache.get_cache("search")
+
+    # One event loop throughout, so the ASGI engine's refresh task can finish
+    async def scenario():
+        assert (await get(path))["x-cache"] == "revalidated"
+        assert (await get(path))["x-cache"] == "fresh"
+        await asyncio.sleep(0.35)
+
+        upstream_calls = stub.requests
+        headers = await get(path)
+        assert headers["x-cache"] == "stale"
+        assert headers["cache-control"] == "public, max-age=0, stale-while-revalidate=60"
+        # Refreshed once in the background, however many requests see it stale
+        await get(path)
+        for _ in range(500):
+            if search.stats()["refreshes"]:
+                break
+            await asyncio.sleep(0.01)
+        assert search.stats()["refreshes"] == 1
+        assert stub.requests > upstream_calls
+        assert (await get(path))["x-cache"] == "fresh"
+
+    run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import shared_cache
+import typeahead
+from conftest import asgi_get, run, stub
+
+
+@pytest.fixture(autouse=True)
+def debounce(monkeypatch):
+    monkeypatch.setattr(typeahead, "AUTOCOMPLETE_DEBOUNCE", 0.1)
+
+
+def test_older_request_is_dropped():
+    async def burst():
+        first = asyncio.ensure_future(typeahead.settle("1.1.1.1|a"))
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(typeahead.settle("1.1.1.1|a"))
+        other_client = asyncio.ensure_future(typeahead.settle("2.2.2.2|a"))
+        return await asyncio.gather(first, second, other_client)
+    assert run(burst()) == [False, True, True]
+
+
+def test_newer_request_in_another_worker_wins():
+    async def burst():
+        first = asyncio.ensure_future(typeahead.settle("3.3.3.3|a"))
+        await asyncio.sleep(0.02)
+        # What settle() leaves in the shared tier from another worker
+        shared_cache.get_shared_cache().set(typeahead._shared_key("3.3.3.3|a"), "other", 1)
+        return await first
+    assert run(burst()) is False
+
+
+def test_burst_costs_one_upstream_call():
+    headers = [("User-Agent", "burst-test"), ("X-Forwarded-For", "4.4.4.4")]
+
+    async def burst():
+        tasks = []
+        for query in ("qzv", "qzvx", "qzvxw"):
+            tasks.append(asyncio.ensure_future(asgi_get(f"/autocomplete/?query={query}", headers)))
+            await asyncio.sleep(0.02)
+        return await asyncio.gather(*tasks)
+
+    before = stub.requests
+    responses = run(burst())
+    assert stub.requests - before == 1
+    assert [status for status, _, _ in responses] == [200, 200, 200]
+    assert responses[-1][2]["data"]["results"]
@@ -0,0 +1,84 @@
+import time
+import threading
+import contextvars
+
+import pytest
+import requests
+
+import health
+import upstream
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, tag):
+        self.tag = tag
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    """A backend that is hedged after 10ms, answered by fake_send."""
+    url = "http://hedge.test/api.php"
+    monkeypatch.setattr(health.for_url(url), "hedge_delay", lambda: 0.01)
+    calls = []
+
+    def use(fake_send):
+        def send(backend, url, kwargs):
+            calls.append(threading.current_thread().name)
+            return fake_send(len(calls))
+        monkeypatch.setattr(upstream, "_send", send)
+        return url, calls
+    return use
+
+
+def test_slow_attempt_is_hedged(hedged):
+    url, calls = hedged(lambda n: time.sleep(1 if n == 1 else 0) or Response(n))
+    start = time.monotonic()
+    assert upstream._get(url, {"timeout": 5}).tag == 2
+    assert time.monotonic() - start < 0.5
+    assert len(calls) == 2
+
+
+def test_hedged_wait_is_bounded_by_the_timeout(hedged):
+    url, _ = hedged(lambda n: time.sleep(1) or Response(n))
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        upstream._get(url, {"timeout": 0.1})
+    assert time.monotonic() - start < 0.5
+
+
+def test_no_hedge_while_the_pool_is_busy(hedged):
+    url, calls = hedged(lambda n: time.sleep(0.05) or Response(n))
+    _, slots = upstream._get_hedge_executor()
+    taken = 0
+    while slots.acquire(blocking=False):
+        taken += 1
+    try:
+        assert upstream._get(url, {"timeout": 5}).tag == 1
+    finally:
+        for _ in range(taken):
+            slots.release()
+    assert calls == [threading.current_thread().name]
+
+
+def test_hedged_attempts_see_the_callers_context(hedged):
+    seen = []
+    url, _ = hedged(lambda n: seen.append(request_id.get()) or time.sleep(0.05) or Response(n))
+    request_id.set("r1")
+    upstream._get(url, {"timeout": 5})
+    assert seen and set(seen) == {"r1"}
+
+
+def test_no_hedge_that_could_not_finish_in_time(hedged):
+    # 15ms leave less than the 10ms hedge delay once it has passed: the single
+    # attempt keeps requests' per-operation timeout
+    url, calls = hedged(lambda n: time.sleep(0.05) or Response(n))
+    assert upstream._get(url, {"timeout": 0.015}).tag == 1
+    assert upstream._get(url, {"timeout": (0.005, 0.01)}).tag == 2
+    assert len(calls) == 2
@@ -0,0 +1,96 @@
+"""Per-request phase timings for the Server-Timing header.
+
+A request that is being timed (SERVER_TIMING=true, or ?debug=timing) gets a
+list in a context variable; phase() appends (name, seconds) to it. For every
+other request the variable is None and phase() returns a shared no-op
+context manager, so instrumented code pays one context variable lookup.
+
+Phases:
+- upstream: waiting for upstream HTTP responses
+- decode: unicode-escape decoding and unescaping of api.php payloads
+- parse: json.loads of upstream payloads
+- decrypt: media URL decryption
+- lyrics: fetching lyrics
+- jsonify: serializing the response
+- compress: gzip/brotli encoding of the response
+Phases can nest (lyrics includes its upstream calls) and concurrent calls
+are summed, so they do not have to add up to the total.
+"""
+import os
+import json
+import time
+import contextlib
+import contextvars
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+PHASES = ("upstream", "decode", "parse", "decrypt", "lyrics", "jsonify", "compress")
+
+_phases = contextvars.ContextVar("timing_phases", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class _Phase:
+    __slots__ = ("phases", "name", "start")
+
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.phases.append((self.name, time.perf_counter() - self.start))
+
+
+def phase(name):
+    phases = _phases.get()
+    if phases is None:
+        return _NOOP
+    return _Phase(phases, name)
+
+
+def begin(debug=False):
+    """Start timing the current request when enabled; returns whether it is."""
+    if SERVER_TIMING or debug:
+        _phases.set([])
+        return True
+    _phases.set(None)
+    return False
+
+
+def end():
+    _phases.set(None)
+
+
+def active():
+    return _phases.get() is not None
+
+
+def summary(total):
+    """{phase: {"ms": milliseconds, "count": calls}} plus the total."""
+    result = {}
+    for name, seconds in _phases.get() or ():
+        entry = result.setdefault(name, {"ms": 0.0, "count": 0})
+        entry["ms"] += seconds * 1000
+        entry["count"] += 1
+    for entry in result.values():
+        entry["ms"] = round(entry["ms"], 3)
+    result["total"] = {"ms": round(total * 1000, 3), "count": 1}
+    return result
+
+
+def header(summary):
+    """Server-Timing header value for a summary()."""
+    return ", ".join(
+        f'{name};dur={entry["ms"]}' + (f';desc="{entry["count"]} calls"' if entry["count"] > 1 else "")
+        for name, entry in summary.items()
+    )
+
+
+def debug_body(body, summary):
+    """Wrap a serialized JSON body as {"response": ..., "timing": ...}
+    without parsing it again."""
+    timing_json = json.dumps(summary, sort_keys=True, separators=(",", ":"))
+    return b'{"response":' + body.rstrip() + b',"timing":' + timing_json.encode() + b'}\n'
@@ -0,0 +1,87 @@
+"""Burst collapsing for /autocomplete/ on the ASGI engine.
+
+A search box sends a request per keystroke. Requests that can be answered
+without upstream (cached prefixes, or prefixes the search index covers) are
+answered right away. The others first wait AUTOCOMPLETE_DEBOUNCE seconds: if
+the same client sent a newer request in the meantime, the older one is only
+answered from the index and never reaches upstream, so a burst of keystrokes
+costs one upstream call, for its last prefix.
+
+Clients are told apart by address and User-Agent. Each request leaves a
+random token as the client's latest in this worker and in the shared cache
+tier, so a burst spread over several workers is collapsed too.
+
+The Flask engine does not debounce: a sync worker would be blocked for the
+whole wait, and a client's next keystroke is usually queued behind it rather
+than seen by it.
+"""
+import os
+import asyncio
+import secrets
+import threading
+from collections import OrderedDict
+
+import shared_cache
+
+AUTOCOMPLETE_DEBOUNCE = float(os.environ.get("AUTOCOMPLETE_DEBOUNCE", 0.05))
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# Clients whose latest request is remembered
+MAX_CLIENTS = 10000
+
+_latest = OrderedDict()
+_lock = threading.Lock()
+_collapsed = 0
+
+
+def client_key(address, user_agent):
+    return f"{address or ''}|{user_agent or ''}"
+
+
+def _shared_key(client):
+    return f"typeahead:{client}"
+
+
+def _begin(client):
+    token = secrets.token_hex(8)
+    with _lock:
+        _latest[client] = token
+        _latest.move_to_end(client)
+        if len(_latest) > MAX_CLIENTS:
+            _latest.popitem(last=False)
+    shared_cache.get_shared_cache().set(_shared_key(client), token, AUTOCOMPLETE_DEBOUNCE + 1)
+    return token
+
+
+def _is_latest(client, token):
+    global _collapsed
+    found, latest, _ = shared_cache.get_shared_cache().get(_shared_key(client))
+    with _lock:
+        if _latest.get(client, token) == token and (not found or latest == token):
+            return True
+        _collapsed += 1
+        return False
+
+
+async def settle(client):
+    """Wait out the debounce. False when a newer request from the client
+    arrived meanwhile, in any worker."""
+    if AUTOCOMPLETE_DEBOUNCE <= 0:
+        return True
+    loop = asyncio.get_running_loop()
+    token = await loop.run_in_executor(None, _begin, client)
+    await asyncio.sleep(AUTOCOMPLETE_DEBOUNCE)
+    return await loop.run_in_executor(None, _is_latest, client, token)
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return AUTOCOMPLETE_LIMIT
+    return min(max(limit, 1), AUTOCOMPLETE_MAX_LIMIT)
+
+
+def stats():
+    return {"clients": len(_latest), "collapsed": _collapsed}
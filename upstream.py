@@ -0,0 +1,489 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+import contextvars
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import health
+import metrics
+import cassette
+import timing
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing. Every gunicorn worker gets its own session, so the totals per
+# host are roughly workers * UPSTREAM_POOL_MAXSIZE open sockets.
+POOL_CONNECTIONS = int(os.environ.get("UPSTREAM_POOL_CONNECTIONS", 10))
+POOL_MAXSIZE = int(os.environ.get("UPSTREAM_POOL_MAXSIZE", 20))
+POOL_BLOCK = os.environ.get("UPSTREAM_POOL_BLOCK", "false").lower() == "true"
+KEEP_ALIVE = os.environ.get("UPSTREAM_KEEP_ALIVE", "true").lower() != "false"
+MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", 0))
+# The asyncio engine multiplexes many requests per worker, so it gets its own
+# (much larger) limits. 0 means unlimited per host.
+ASYNC_POOL_LIMIT = int(os.environ.get("UPSTREAM_ASYNC_POOL_LIMIT", 1000))
+ASYNC_POOL_LIMIT_PER_HOST = int(os.environ.get("UPSTREAM_ASYNC_POOL_LIMIT_PER_HOST", 0))
+ASYNC_KEEPALIVE_TIMEOUT = float(os.environ.get("UPSTREAM_ASYNC_KEEPALIVE_TIMEOUT", 30))
+# Send a second copy of a request that is slower than the backend's recent p95
+HEDGE = os.environ.get("UPSTREAM_HEDGE", "true").lower() != "false"
+HEDGE_WORKERS = int(os.environ.get("UPSTREAM_HEDGE_WORKERS", 32))
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+_hedge_executor = None
+_hedge_slots = None
+_hedge_executor_pid = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=POOL_BLOCK,
+        max_retries=MAX_RETRIES,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not KEEP_ALIVE:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def get_session():
+    """Return the session of the current worker process.
+    The session is rebuilt after a fork (gunicorn preload_app=True) so that
+    workers never share sockets with the master process.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+                logger.info(f"Upstream session created for worker {pid}")
+    return _session
+
+
+def _get_hedge_executor():
+    """(executor, semaphore of its idle threads) of this worker process."""
+    global _hedge_executor, _hedge_slots, _hedge_executor_pid
+    pid = os.getpid()
+    if _hedge_executor is None or _hedge_executor_pid != pid:
+        with _hedge_executor_lock:
+            if _hedge_executor is None or _hedge_executor_pid != pid:
+                _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS,
+                                                     thread_name_prefix="upstream-hedge")
+                _hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+                _hedge_executor_pid = pid
+    return _hedge_executor, _hedge_slots
+
+
+def _submit(backend, url, kwargs):
+    """Send on an idle hedge thread, in a copy of the caller's context (for
+    timing phases and failure flags). None when every thread is busy: the
+    request is not queued behind others."""
+    executor, slots = _get_hedge_executor()
+    if not slots.acquire(blocking=False):
+        return None
+    future = executor.submit(contextvars.copy_context().run, _send, backend, url, kwargs)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def _discard(future):
+    """Drop an attempt that lost: cancel it if it has not started, or return
+    its connection to the pool as soon as it completes."""
+    if future.cancel():
+        return
+
+    def close(done):
+        try:
+            done.result().close()
+        except Exception:
+            pass
+    future.add_done_callback(close)
+
+
+def _budget(timeout):
+    """Total seconds a hedged request may take with requests' timeout=
+    argument: the number itself, the sum of a (connect, read) tuple, or None
+    for no limit."""
+    if isinstance(timeout, tuple):
+        return None if None in timeout else sum(timeout)
+    return timeout
+
+
+def _send(backend, url, kwargs):
+    start = time.monotonic()
+    metrics.inc(metrics.UPSTREAM_IN_FLIGHT, (backend.host,))
+    try:
+        response = get_session().get(url, **kwargs)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        backend.record_failure()
+        _record_error(backend, url, "timeout" if isinstance(e, requests.exceptions.Timeout) else "connection")
+        raise
+    except BaseException:
+        backend.record_neutral()
+        raise
+    finally:
+        metrics.inc(metrics.UPSTREAM_IN_FLIGHT, (backend.host,), -1)
+    elapsed = time.monotonic() - start
+    if health.is_failure_status(response.status_code):
+        backend.record_failure()
+    else:
+        backend.record_success(elapsed)
+    _record_response(backend, url, response.status_code, elapsed)
+    return response
+
+
+def endpoint_kind(url):
+    """Low-cardinality name of an upstream endpoint for metrics: the __call of
+    api.php requests, the route of /api/ requests with IDs replaced, or
+    'page' for song/album/playlist pages."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.path.endswith('/api.php'):
+        for key, value in urllib.parse.parse_qsl(parts.query):
+            if key == '__call':
+                return value
+        return 'api.php'
+    if parts.path.startswith('/api/'):
+        segments = parts.path[len('/api/'):].strip('/').split('/')
+        if len(segments) > 1 and segments[0] in ('artists', 'songs'):
+            segments[1] = '{id}'
+        return '/api/' + '/'.join(segments)
+    return 'page'
+
+
+def _record_response(backend, url, status, elapsed):
+    if not metrics.METRICS_ENABLED:
+        return
+    kind = endpoint_kind(url)
+    metrics.observe(metrics.UPSTREAM_DURATION, (backend.host, kind), elapsed)
+    metrics.inc(metrics.UPSTREAM_RESPONSES, (backend.host, kind, str(status)))
+
+
+def _record_error(backend, url, error):
+    if metrics.METRICS_ENABLED:
+        metrics.inc(metrics.UPSTREAM_ERRORS, (backend.host, endpoint_kind(url), error))
+
+
+def _check_circuit(backend, url):
+    try:
+        backend.before_request()
+    except health.CircuitOpenError:
+        _record_error(backend, url, "circuit_open")
+        raise
+
+
+def _first_good(futures, backend, hedged, deadline):
+    """Wait until deadline for the first successful response among futures.
+    A failed attempt only counts once the other one has failed too."""
+    pending = set(futures)
+    response = error = None
+    try:
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    continue
+                if not health.is_failure_status(response.status_code):
+                    if future is hedged:
+                        backend.record_hedge_win()
+                    return response
+    finally:
+        for future in pending:
+            _discard(future)
+    if response is not None:
+        return response
+    if error is not None and not pending:
+        raise error
+    raise requests.exceptions.Timeout(f"No response from {backend.host} in time")
+
+
+def get(url, **kwargs):
+    """Drop-in replacement for requests.get that reuses pooled connections.
+    Requests to a backend whose circuit is open fail fast with
+    health.CircuitOpenError; requests slower than the backend's recent p95
+    are hedged with a second copy and the first good answer wins.
+    With UPSTREAM_CASSETTE_MODE=replay responses come from the cassette.
+
+    timeout= keeps its requests meaning (per connect and per read) for a
+    single attempt. Once a request is hedged, it also bounds the whole call,
+    as _budget() counts it: requests.exceptions.Timeout is raised when
+    neither attempt answered in time. A request is only hedged while more
+    than the hedge delay is left of that budget.
+    """
+    if cassette.REPLAYING:
+        return _replay(url)
+    with timing.phase('upstream'):
+        response = _get(url, kwargs)
+    if cassette.RECORDING and not health.is_failure_status(response.status_code):
+        cassette.record(url, response)
+    return response
+
+
+def _get(url, kwargs):
+    backend = health.for_url(url)
+    _check_circuit(backend, url)
+    delay = backend.hedge_delay() if HEDGE else None
+    budget = _budget(kwargs.get('timeout'))
+    # A second copy sent after delay needs about delay to answer too
+    if delay is None or (budget is not None and budget <= 2 * delay):
+        return _send(backend, url, kwargs)
+
+    # Hedging must not add latency: with no idle hedge thread the request is
+    # sent inline, and the attempts never get longer than the timeout allows
+    first = _submit(backend, url, kwargs)
+    if first is None:
+        return _send(backend, url, kwargs)
+    deadline = None if budget is None else time.monotonic() + budget
+    done, _ = wait([first], timeout=delay)
+    if done or (deadline is not None and deadline - time.monotonic() <= delay):
+        return first.result()
+    second = _submit(backend, url, kwargs)
+    if second is None:
+        return _first_good([first], backend, None, deadline)
+    backend.record_hedge()
+    return _first_good([first, second], backend, second, deadline)
+
+
+class AsyncResponse:
+    """The subset of requests.Response used by jiosaavn, for aiohttp results.
+    raise_for_status() raises requests' HTTPError so callers can share their
+    error handling between the sync and async engines.
+    """
+
+    def __init__(self, url, status_code, reason, headers, content, encoding):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 500:
+            kind = "Client Error"
+        elif 500 <= self.status_code < 600:
+            kind = "Server Error"
+        else:
+            return
+        raise requests.exceptions.HTTPError(
+            f"{self.status_code} {kind}: {self.reason} for url: {self.url}", response=self)
+
+
+def _replay(url):
+    status, reason, headers, content, encoding = cassette.lookup(url)
+    return AsyncResponse(url, status, reason, headers, content, encoding)
+
+
+_async_sessions = {}
+_async_stats = {"requests": 0, "connections": 0, "reused": 0}
+
+
+def _build_async_session():
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        _async_stats["requests"] += 1
+
+    async def on_connection_create_end(session, ctx, params):
+        _async_stats["connections"] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        _async_stats["reused"] += 1
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    connector = aiohttp.TCPConnector(
+        limit=ASYNC_POOL_LIMIT,
+        limit_per_host=ASYNC_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=ASYNC_KEEPALIVE_TIMEOUT,
+        force_close=not KEEP_ALIVE,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=[trace],
+        headers={"User-Agent": requests.utils.default_user_agent()},
+    )
+
+
+def get_async_session():
+    """Return the aiohttp session bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = _build_async_session()
+        _async_sessions[loop] = session
+        logger.info(f"Async upstream session created for worker {os.getpid()}")
+    return session
+
+
+async def close_async_session():
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def _asend(backend, url, timeout, data):
+    import aiohttp
+
+    session = get_async_session()
+    start = time.monotonic()
+    metrics.inc(metrics.UPSTREAM_IN_FLIGHT, (backend.host,))
+    try:
+        async with session.get(
+            url,
+            data=data,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            content = await response.read()
+            result = AsyncResponse(
+                str(response.url), response.status, response.reason,
+                response.headers, content, response.charset)
+    except asyncio.TimeoutError as e:
+        backend.record_failure()
+        _record_error(backend, url, "timeout")
+        raise requests.exceptions.Timeout(f"Request to {url} timed out") from e
+    except aiohttp.ClientError as e:
+        backend.record_failure()
+        _record_error(backend, url, "connection")
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except BaseException:
+        backend.record_neutral()
+        raise
+    finally:
+        metrics.inc(metrics.UPSTREAM_IN_FLIGHT, (backend.host,), -1)
+    elapsed = time.monotonic() - start
+    if health.is_failure_status(result.status_code):
+        backend.record_failure()
+    else:
+        backend.record_success(elapsed)
+    _record_response(backend, url, result.status_code, elapsed)
+    return result
+
+
+async def aget(url, timeout=None, data=None):
+    """Async counterpart of get(). Transport errors are raised as requests
+    exceptions so both engines handle failures the same way. Circuit breaking
+    and hedging work as in get(); the losing copy of a hedged request is
+    cancelled."""
+    if cassette.REPLAYING:
+        return _replay(url)
+    with timing.phase('upstream'):
+        response = await _aget(url, timeout, data)
+    if cassette.RECORDING and not health.is_failure_status(response.status_code):
+        cassette.record(url, response)
+    return response
+
+
+async def _aget(url, timeout, data):
+    backend = health.for_url(url)
+    _check_circuit(backend, url)
+    delay = backend.hedge_delay() if HEDGE else None
+    if delay is None:
+        return await _asend(backend, url, timeout, data)
+
+    first = asyncio.ensure_future(_asend(backend, url, timeout, data))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+    backend.record_hedge()
+    second = asyncio.ensure_future(_asend(backend, url, timeout, data))
+    pending = {first, second}
+    response = error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    response = task.result()
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    continue
+                if not health.is_failure_status(response.status_code):
+                    if task is second:
+                        backend.record_hedge_win()
+                    return response
+    finally:
+        for task in pending:
+            task.cancel()
+    if response is not None:
+        return response
+    raise error
+
+
+def pool_stats():
+    """Per-host connection pool statistics for the current worker.
+    - requests: requests sent through the pool
+    - connections: new TCP/TLS connections opened (pool misses)
+    - reused: requests served on an existing connection (pool hits)
+    """
+    session = _session
+    hosts = {}
+    if session is not None and _session_pid == os.getpid():
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}"
+                if pool.port and pool.port not in (80, 443):
+                    host = f"{host}:{pool.port}"
+                entry = hosts.setdefault(host, {"requests": 0, "connections": 0, "idle": 0})
+                entry["requests"] += pool.num_requests
+                entry["connections"] += pool.num_connections
+                entry["idle"] += pool.pool.qsize() if pool.pool is not None else 0
+    total_requests = 0
+    total_connections = 0
+    for entry in hosts.values():
+        entry["reused"] = max(entry["requests"] - entry["connections"], 0)
+        entry["hit_ratio"] = round(entry["reused"] / entry["requests"], 4) if entry["requests"] else 0.0
+        total_requests += entry["requests"]
+        total_connections += entry["connections"]
+    total_reused = max(total_requests - total_connections, 0)
+    return {
+        "pid": os.getpid(),
+        "pool_connections": POOL_CONNECTIONS,
+        "pool_maxsize": POOL_MAXSIZE,
+        "keep_alive": KEEP_ALIVE,
+        "requests": total_requests,
+        "connections": total_connections,
+        "reused": total_reused,
+        "hit_ratio": round(total_reused / total_requests, 4) if total_requests else 0.0,
+        "hosts": hosts,
+        "async": dict(_async_stats),
+        "backends": health.stats(),
+    }